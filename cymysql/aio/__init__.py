@@ -1,3 +1,10 @@
 from .connections import AsyncConnection, connect
 from .pool import create_pool
-from .cursors import AsyncCursor, AsyncDictCursor
+from .cursors import (
+    AsyncCursor, AsyncDictCursor, AsyncSSCursor, AsyncSSDictCursor,
+    AsyncLazyRowCursor, AsyncSSLazyRowCursor, AsyncRowMappingCursor, AsyncSSRowMappingCursor,
+    AsyncNamedTupleCursor, AsyncSSNamedTupleCursor, AsyncTypedCursor, AsyncSSTypedCursor,
+)
+from .loader import Loader
+from .routing import AsyncRouter
+from .singleflight import SingleFlight
@@ -1,3 +1,4 @@
+import random
 import sys
 import ssl
 import asyncio
@@ -7,15 +8,17 @@ from ..connections import (
     byte2int,
     int2bytes,
     pack_int24,
+    _command_packets,
     _xor,
 )
 from .cursors import AsyncCursor
-from ..charset import  charset_by_name
+from ..charset import  charset_by_name, encoding_by_charset
 from ..packet import MysqlPacket
+from ..query import QueryBuffer
 from .result import AsyncMySQLResult
 from .socketwrapper import AsyncSocketWrapper
 from ..constants import CLIENT, COMMAND
-from ..err import InterfaceError
+from ..err import InterfaceError, OperationalError
 
 
 class AsyncConnection(Connection):
@@ -29,25 +32,55 @@ class AsyncConnection(Connection):
         self.last_usage = self.loop.time()
 
     def _connect(self):
-        self.socket = AsyncSocketWrapper(self._get_socket(), self.compress)
+        self.socket = AsyncSocketWrapper(
+            self._get_socket(), self.compress, self._compress_level(), self.compression_threshold
+        )
 
     async def _initialize(self):
         self.socket.setblocking(False)
         await self._get_server_information()
         await self._request_authentication()
-        await self.set_charset(self.charset)
-
-        await self.autocommit(False)
-
-        if self.sql_mode is not None:
-            c = self.cursor()
-            c.execute("SET sql_mode=%s", (self.sql_mode,))
-
-        if self.init_command is not None:
-            c = self.cursor()
-            c.execute(self.init_command)
-
-            self.commit()
+        await self._bootstrap(False)
+
+    async def _bootstrap(self, autocommit):
+        await self.query(self._bootstrap_query(autocommit))
+        while self._result.has_next:
+            await self.next_result()
+        self._result = None
+        self.encoding = encoding_by_charset(self.charset)
+        self._session_charset = self.charset
+
+    async def _reconnect(self):
+        ''' Open a new session and restore the state of the lost one '''
+        in_trans = bool(self.server_status is not None and self.get_transaction_status())
+        autocommit = bool(self.server_status is not None and self.get_autocommit())
+        self._close_socket()
+        if self.db:
+            self.client_flag |= CLIENT.CONNECT_WITH_DB
+        attempt = 0
+        while True:
+            try:
+                self._connect()
+                self.socket.setblocking(False)
+                await self._get_server_information()
+                await self._request_authentication()
+                break
+            except OperationalError:
+                self._close_socket()
+                attempt += 1
+                if attempt >= self.reconnect_attempts:
+                    raise
+                await asyncio.sleep(random.uniform(
+                    0, min(self.reconnect_max_delay, self.reconnect_delay * 2 ** attempt)
+                ))
+        await self._bootstrap(autocommit)
+        self.reconnects += 1
+        for listener in self.reconnect_listeners:
+            listener(self)
+        if in_trans:
+            raise OperationalError(
+                2013, "Lost connection to MySQL server, the transaction was rolled back"
+            )
 
     async def close(self):
         ''' Send the quit message and close the socket '''
@@ -60,13 +93,15 @@ class AsyncConnection(Connection):
 
     async def autocommit(self, value):
         ''' Set whether or not to commit after every execute() '''
+        if self.server_status is not None and self.get_autocommit() == bool(value):
+            return
         if value:
             q = "SET AUTOCOMMIT = 1"
         else:
             q = "SET AUTOCOMMIT = 0"
         try:
             await self._execute_command(COMMAND.COM_QUERY, q)
-            await self.read_packet()
+            await self._read_ok_packet()
         except:
             exc, value, tb = sys.exc_info()
             self.errorhandler(None, exc, value)
@@ -75,7 +110,8 @@ class AsyncConnection(Connection):
         ''' Commit changes to stable storage '''
         try:
             await self._execute_command(COMMAND.COM_QUERY, "COMMIT")
-            await self.read_packet()
+            await self._read_ok_packet()
+            self._end_cached_transaction()
         except:
             exc, value, tb = sys.exc_info()
             self.errorhandler(None, exc, value)
@@ -84,7 +120,8 @@ class AsyncConnection(Connection):
         ''' Roll back the current transaction '''
         try:
             await self._execute_command(COMMAND.COM_QUERY, "ROLLBACK")
-            await self.read_packet()
+            await self._read_ok_packet()
+            self._end_cached_transaction()
         except:
             exc, value, tb = sys.exc_info()
             self.errorhandler(None, exc, value)
@@ -104,15 +141,52 @@ class AsyncConnection(Connection):
         if self.socket is not None:
             await self.close()
 
+    async def select_db(self, db):
+        ''' Set current db with COM_INIT_DB '''
+        if self.session_track and db == self.db:
+            return
+        try:
+            await self._execute_command(COMMAND.COM_INIT_DB, db)
+            await self._read_ok_packet()
+            self.db = db
+        except:
+            exc, value, tb = sys.exc_info()
+            self.errorhandler(None, exc, value)
+
     # The following methods are INTERNAL USE ONLY (called from Cursor)
-    async def query(self, sql):
+    def _redundant_result(self):
+        result = AsyncMySQLResult(self)
+        result.affected_rows = 0
+        return result
+
+    def _cached_result(self, entry):
+        result = AsyncMySQLResult(self)
+        result.description = entry.description
+        result.rest_rows = entry.rows
+        result.rest_row_index = 0
+        result.has_result = True
+        return result
+
+    async def query(self, sql, unbuffered=False, row_reader=None):
+        if self._is_redundant(sql):
+            self._result = self._redundant_result()
+            return
+        key = self._cache_key(sql, unbuffered)
+        if key is not None:
+            entry = self.query_cache.get(key)
+            if entry is not None:
+                self._result = self._cached_result(entry)
+                return
+            # the cache keeps rows as tuples
+            row_reader = None
         await self._execute_command(COMMAND.COM_QUERY, sql)
-        self._result = AsyncMySQLResult(self)
-        await self._result.read_result()
+        self._result = AsyncMySQLResult(self, row_reader)
+        await self._result.read_result(unbuffered)
+        self._cache_result(key, sql)
 
-    async def next_result(self):
-        self._result = AsyncMySQLResult(self)
-        await self._result.read_result()
+    async def next_result(self, unbuffered=False, row_reader=None):
+        self._result = AsyncMySQLResult(self, row_reader)
+        await self._result.read_result(unbuffered)
 
     def affected_rows(self):
         if self._result:
@@ -132,28 +206,33 @@ class AsyncConnection(Connection):
         return False
 
     async def ping(self, reconnect=True):
-        ''' Check if the server is alive '''
+        ''' Check if the server is alive, reconnect and restore the session if not '''
         try:
             await self._execute_command(COMMAND.COM_PING, "")
+            pkt = await self._read_ok_packet()
         except:
             if reconnect:
-                self._connect()
+                await self._reconnect()
                 return await self.ping(False)
             else:
                 exc, value, tb = sys.exc_info()
                 self.errorhandler(None, exc, value)
                 return
 
-        pkt = await self.read_packet()
         return pkt.is_ok_packet()
 
     async def set_charset(self, charset):
+        if charset == self._session_charset:
+            return
         try:
             if charset:
+                self._check_bytes_literal(charset)
                 await self._execute_command(COMMAND.COM_QUERY, "SET NAMES %s" %
                                       self.escape(charset))
-                await self.read_packet()
+                await self._read_ok_packet()
                 self.charset = charset
+                self.encoding = encoding_by_charset(charset)
+                self._session_charset = charset
         except:
             exc, value, tb = sys.exc_info()
             self.errorhandler(None, exc, value)
@@ -163,6 +242,12 @@ class AsyncConnection(Connection):
         and return a MysqlPacket type that represents the results."""
         return MysqlPacket(await self.socket.recv_packet(self.loop), self.charset, self.encoding)
 
+    async def _read_ok_packet(self):
+        pkt = await self.read_packet()
+        if pkt.is_ok_packet():
+            self._update_session_state(pkt, pkt.read_ok_packet(self.session_track)[2])
+        return pkt
+
     async def _request_authentication(self):
         if self.user is None:
             raise ValueError("Did not specify a username")
@@ -200,6 +285,9 @@ class AsyncConnection(Connection):
         if self.server_capabilities & CLIENT.PLUGIN_AUTH:
             data += self.auth_plugin_name.encode(self.encoding) + int2bytes(0)
 
+        if self.server_capabilities & CLIENT.ZSTD_COMPRESSION_ALGORITHM:
+            data += int2bytes(self.zstd_compression_level)
+
         data = pack_int24(len(data)) + int2bytes(next_packet) + data
         next_packet += 2
 
@@ -226,12 +314,16 @@ class AsyncConnection(Connection):
         if not self.socket:
             self.errorhandler(None, InterfaceError, (-1, 'socket not found'))
 
-        sql = sql.encode(self.encoding)
+        if isinstance(sql, QueryBuffer):
+            packet = sql.packet(command)
+            if packet is not None:
+                await self.socket.send_packet(packet, self.loop)
+                return
+            sql = sql.statement()
+        elif isinstance(sql, str):
+            sql = sql.encode(self.encoding)
 
-        if len(sql) + 1 > 0xffffff:
-            raise ValueError('Sending query packet is too large')
-        prelude = struct.pack('<i', len(sql)+1) + int2bytes(command)
-        await self.socket.send_packet(prelude + sql, self.loop)
+        await self.socket.send_packets(_command_packets(command, sql), self.loop)
 
     async def _caching_sha2_authentication2(self, auth_packet, next_packet):
         # https://dev.mysql.com/doc/dev/mysql-server/latest/page_caching_sha2_authentication_exchanges.html
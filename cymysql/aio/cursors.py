@@ -1,6 +1,11 @@
-import weakref
 import sys
 from ..cursors import Cursor
+from ..err import ProgrammingError
+from ..query import build_query
+from ..rows import (
+    LazyRow, RowLayout, RowMapping, dict_row_reader, lazy_row_reader, row_mapping_reader,
+    namedtuple_row_reader, namedtuple_row_type, RowPlan, row_plan_reader,
+)
 
 
 class AsyncCursor(Cursor):
@@ -38,14 +43,14 @@ class AsyncCursor(Cursor):
 
     async def nextset(self):
         ''' Get the next query set '''
-        if self._executed:
+        if self._executed_query:
             await self.fetchall()
         del self.messages[:]
 
         if not self._result or not self._result.has_next:
             return None
         connection = self._get_db()
-        await connection.next_result()
+        await connection.next_result(self._unbuffered, self._row_reader)
         self._do_get_result()
         return True
 
@@ -54,22 +59,14 @@ class AsyncCursor(Cursor):
         self._rowcount = None
 
         conn = self._get_db()
-        if hasattr(conn, '_last_execute_cursor') and not conn._last_execute_cursor() is None:
-            await conn._last_execute_cursor()._flush()
+        last = conn._last_execute_cursor()
+        if last is not None:
+            await last._flush()
 
         del self.messages[:]
 
         if args is not None:
-            if isinstance(args, (tuple, list)):
-                escaped_args = tuple(conn.escape(arg) for arg in args)
-            elif isinstance(args, dict):
-                escaped_args = dict((key, conn.escape(val)) for (key, val) in args.items())
-            else:
-                # If it's not a dictionary let's try escaping it anyways.
-                # Worst case it will throw a Value error
-                escaped_args = conn.escape(args)
-
-            query = query % escaped_args
+            query = build_query(query, args, conn.escape, conn.encoding)
 
         try:
             await self._query(query)
@@ -79,8 +76,9 @@ class AsyncCursor(Cursor):
             self.messages.append((exc, value))
             self.errorhandler(exc, value)
 
-        self._executed = query
-        conn._last_execute_cursor = weakref.ref(self)
+        self._executed_query = self._last_query
+        if last is not self:
+            conn._last_execute_cursor = self._weakref
 
     async def executemany(self, query, args):
         ''' Run several data against one query '''
@@ -125,7 +123,12 @@ class AsyncCursor(Cursor):
         """
         conn = self._get_db()
         for index, arg in enumerate(args):
-            q = "SET @_%s_%d=%s" % (procname, index, conn.escape(arg))
+            q = "SET @_%s_%d=" % (procname, index)
+            value = conn.escape(arg)
+            if isinstance(value, bytes):
+                q = q.encode(conn.encoding) + value
+            else:
+                q += value
             self._query(q)
             self.nextset()
 
@@ -153,7 +156,7 @@ class AsyncCursor(Cursor):
         result = []
         for i in range(size):
             r = await self._result.fetchone()
-            if not r:
+            if r is None:
                 break
             result.append(r)
         return result
@@ -166,21 +169,79 @@ class AsyncCursor(Cursor):
         result = []
 
         r = await self._result.fetchone()
-        while r:
+        while r is not None:
             result.append(r)
             r = await self._result.fetchone()
 
         return result
 
+    async def fetchmany_numpy(self, size=None):
+        ''' Fetch several rows as a dict of NumPy arrays, see cymysql.columnar '''
+        self._check_executed()
+        if self._result is None or not self._result.has_result:
+            return None
+        columns = self._columns()
+        await self._result.fetch_columns(columns, size or self.arraysize)
+        return columns.to_numpy()
+
+    async def fetch_numpy(self):
+        ''' Fetch all the rows as a dict of NumPy arrays, see cymysql.columnar '''
+        self._check_executed()
+        if self._result is None or not self._result.has_result:
+            return None
+        columns = self._columns()
+        await self._result.fetch_columns(columns)
+        return columns.to_numpy()
+
+    async def fetch_arrow_batches(self, batch_size=65536):
+        '''
+        Yield the rest of the rows as pyarrow.RecordBatch objects of up
+        to batch_size rows, see cymysql.columnar
+        '''
+        self._check_executed()
+        if self._result is None or not self._result.has_result:
+            return
+        while True:
+            columns = self._columns(True)
+            if not await self._result.fetch_columns(columns, batch_size):
+                break
+            yield columns.to_arrow()
+
+    async def fetch_json(self, objects=True):
+        '''
+        Fetch all the rows as UTF-8 JSON, an array of objects or of arrays,
+        see cymysql.jsonrows
+        '''
+        self._check_executed()
+        if self._result is None or not self._result.has_result:
+            return None
+        rows = self._json_rows(objects)
+        await self._result.fetch_json(rows)
+        return rows.take(True)
+
+    async def stream_json(self, batch_size=1000, objects=True):
+        '''
+        Yield the rest of the rows as pieces of a UTF-8 JSON array of up
+        to batch_size rows, see cymysql.jsonrows
+        '''
+        self._check_executed()
+        if self._result is None or not self._result.has_result:
+            return
+        rows = self._json_rows(objects)
+        while await self._result.fetch_json(rows, batch_size):
+            yield rows.take()
+        yield rows.take(True)
+
     async def _query(self, q):
         conn = self._get_db()
-        self._last_executed = q
-        await conn.query(q)
+        self._last_query = q
+        await conn.query(q, self._unbuffered, self._row_reader)
         self._do_get_result()
 
 
 class AsyncDictCursor(AsyncCursor):
     """A cursor which returns results as a dictionary"""
+    _row_reader = staticmethod(dict_row_reader)
 
     async def execute(self, query, args=None):
         result = await super().execute(query, args)
@@ -188,6 +249,12 @@ class AsyncDictCursor(AsyncCursor):
             self._fields = [field[0] for field in self.description]
         return result
 
+    def _dict_rows(self, rows):
+        # rows of the query cache are tuples
+        if rows and type(rows[0]) is not dict:
+            return tuple([dict(zip(self._fields, r)) for r in rows])
+        return tuple(rows)
+
     async def fetchone(self):
         ''' Fetch the next row '''
         self._check_executed()
@@ -196,21 +263,228 @@ class AsyncDictCursor(AsyncCursor):
         r = await super().fetchone()
         if not r:
             return None
-        return dict(zip(self._fields, r))
+        if type(r) is not dict:
+            return dict(zip(self._fields, r))
+        return r
 
     async def fetchmany(self, size=None):
         ''' Fetch several rows '''
         self._check_executed()
         if self._result is None:
             return None
-        result = [dict(zip(self._fields, r)) for r in await super().fetchmany(size)]
-        return tuple(result)
+        return self._dict_rows(await super().fetchmany(size))
 
     async def fetchall(self):
         ''' Fetch all the rows '''
         self._check_executed()
         if self._result is None:
             return None
-        return tuple([
-            dict(zip(self._fields, r)) for r in await super().fetchall()
-        ])
+        return self._dict_rows(await super().fetchall())
+
+
+class AsyncSSCursor(AsyncCursor):
+    '''
+    An unbuffered cursor.  Rows are read from the server as they are
+    fetched, the connection can not run other statements until the
+    result is read to the end.
+    '''
+    _unbuffered = True
+
+
+class AsyncSSDictCursor(AsyncDictCursor):
+    """An unbuffered cursor which returns results as a dictionary"""
+    _unbuffered = True
+
+
+class AsyncLazyRowCursor(AsyncCursor):
+    """
+    A cursor which returns rows as cymysql.rows.LazyRow, decoding a column
+    when it is first read
+    """
+    _row_reader = staticmethod(lazy_row_reader)
+
+    def _do_get_result(self):
+        super()._do_get_result()
+        self._layout = None
+
+    def _lazy_row(self, row):
+        # rows of the query cache are tuples of decoded values
+        if row is None or isinstance(row, LazyRow):
+            return row
+        if self._layout is None:
+            self._layout = RowLayout([field[0] for field in self.description])
+        return LazyRow.from_values(self._layout, row)
+
+    async def fetchone(self):
+        ''' Fetch the next row '''
+        return self._lazy_row(await super().fetchone())
+
+    async def fetchmany(self, size=None):
+        ''' Fetch several rows '''
+        rows = await super().fetchmany(size)
+        if rows is None:
+            return None
+        return [self._lazy_row(r) for r in rows]
+
+    async def fetchall(self):
+        ''' Fetch all the rows '''
+        rows = await super().fetchall()
+        if rows is None:
+            return None
+        return [self._lazy_row(r) for r in rows]
+
+
+class AsyncSSLazyRowCursor(AsyncLazyRowCursor):
+    """An unbuffered cursor which returns rows as cymysql.rows.LazyRow"""
+    _unbuffered = True
+
+
+class AsyncRowMappingCursor(AsyncCursor):
+    """
+    A cursor which returns rows as cymysql.rows.RowMapping, read only
+    mappings sharing the column names of the result
+    """
+    _row_reader = staticmethod(row_mapping_reader)
+
+    def _do_get_result(self):
+        super()._do_get_result()
+        self._layout = None
+
+    def _mapping(self, row):
+        # rows of the query cache are tuples
+        if row is None or isinstance(row, RowMapping):
+            return row
+        if self._layout is None:
+            self._layout = RowLayout([field[0] for field in self.description])
+        return RowMapping(self._layout, row)
+
+    async def fetchone(self):
+        ''' Fetch the next row '''
+        return self._mapping(await super().fetchone())
+
+    async def fetchmany(self, size=None):
+        ''' Fetch several rows '''
+        rows = await super().fetchmany(size)
+        if rows is None:
+            return None
+        return [self._mapping(r) for r in rows]
+
+    async def fetchall(self):
+        ''' Fetch all the rows '''
+        rows = await super().fetchall()
+        if rows is None:
+            return None
+        return [self._mapping(r) for r in rows]
+
+
+class AsyncSSRowMappingCursor(AsyncRowMappingCursor):
+    """An unbuffered cursor which returns rows as cymysql.rows.RowMapping"""
+    _unbuffered = True
+
+
+class AsyncNamedTupleCursor(AsyncCursor):
+    """
+    A cursor which returns rows as namedtuples, of a type made once per
+    tuple of column names, see cymysql.rows.namedtuple_row_type
+    """
+    _row_reader = staticmethod(namedtuple_row_reader)
+
+    def _named(self, rows):
+        # rows of the query cache are plain tuples
+        if rows and type(rows[0]) is tuple:
+            make = namedtuple_row_type(tuple([field[0] for field in self.description]))._make
+            return [make(r) for r in rows]
+        return rows
+
+    async def fetchone(self):
+        ''' Fetch the next row '''
+        r = await super().fetchone()
+        if type(r) is tuple:
+            return self._named([r])[0]
+        return r
+
+    async def fetchmany(self, size=None):
+        ''' Fetch several rows '''
+        return self._named(await super().fetchmany(size))
+
+    async def fetchall(self):
+        ''' Fetch all the rows '''
+        return self._named(await super().fetchall())
+
+
+class AsyncSSNamedTupleCursor(AsyncNamedTupleCursor):
+    """An unbuffered cursor which returns rows as namedtuples"""
+    _unbuffered = True
+
+
+class AsyncTypedCursor(AsyncCursor):
+    """
+    A cursor which builds rows with the row_factory given to execute(),
+    called with the columns matching its parameters by name, see
+    cymysql.rows.RowPlan.  The factory and converters are kept for later
+    queries, without a factory rows are tuples.
+    """
+    row_factory = None
+    converters = None
+
+    async def execute(self, query, args=None, row_factory=None, converters=None):
+        ''' Execute a query, building its rows with row_factory '''
+        if row_factory is not None:
+            self.row_factory = row_factory
+            self.converters = converters
+            self._row_reader = row_plan_reader(row_factory, converters)
+        return await super().execute(query, args)
+
+    def _do_get_result(self):
+        super()._do_get_result()
+        self._plan = None
+
+    async def _check_plan(self):
+        plan = self._result.read_row
+        if isinstance(plan, RowPlan) and plan.missing:
+            # read the rows of an unbuffered result, ready for the next query
+            await self._result.read_rest_rowdata_packet()
+            self.errorhandler(ProgrammingError, (-1, "no column for %s of %r" % (
+                ', '.join(plan.missing), self.row_factory
+            )))
+
+    async def _query(self, q):
+        await super()._query(q)
+        await self._check_plan()
+
+    async def nextset(self):
+        ''' Get the next query set '''
+        if not await super().nextset():
+            return None
+        await self._check_plan()
+        return True
+
+    def _typed(self, rows):
+        # rows of the query cache are tuples
+        if self.row_factory is None or not rows or isinstance(self._result.read_row, RowPlan):
+            return rows
+        if self._plan is None:
+            self._plan = RowPlan(
+                self.row_factory, [field[0] for field in self.description], None, self.converters
+            )
+        return [self._plan.make(r) for r in rows]
+
+    async def fetchone(self):
+        ''' Fetch the next row '''
+        r = await super().fetchone()
+        if r is None:
+            return None
+        return self._typed([r])[0]
+
+    async def fetchmany(self, size=None):
+        ''' Fetch several rows '''
+        return self._typed(await super().fetchmany(size))
+
+    async def fetchall(self):
+        ''' Fetch all the rows '''
+        return self._typed(await super().fetchall())
+
+
+class AsyncSSTypedCursor(AsyncTypedCursor):
+    """An unbuffered cursor which builds rows with a row_factory"""
+    _unbuffered = True
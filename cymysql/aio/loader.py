@@ -0,0 +1,92 @@
+import asyncio
+
+
+class Loader(object):
+    """Batch point lookups made by many tasks into one query.
+
+    query takes the keys as its only argument, usually as
+    ``WHERE id IN %s``.  Keys passed to load() are collected until the
+    next iteration of the event loop, or for delay seconds, or until
+    max_batch_size distinct keys are waiting, then the query runs once on
+    a connection of the pool and each caller gets the row whose column
+    key, an index or a name of the description, equals its key.  With
+    many=True callers get the list of all such rows instead.
+    """
+
+    def __init__(self, pool, query, key=0, max_batch_size=100, delay=0,
+                 many=False, cursor=None):
+        self.pool = pool
+        self.query = query
+        self.key = key
+        self.max_batch_size = max_batch_size
+        self.delay = delay
+        self.many = many
+        self.cursor = cursor
+        self.batches = 0
+        self.loads = 0
+        self._batch = {}
+        self._handle = None
+
+    def load(self, key):
+        """Return a future of the row, or list of rows, of key."""
+        self.loads += 1
+        future = self._batch.get(key)
+        if future is not None:
+            return future
+        loop = asyncio.get_event_loop()
+        future = self._batch[key] = loop.create_future()
+        if len(self._batch) >= self.max_batch_size:
+            self._dispatch()
+        elif self._handle is None:
+            if self.delay:
+                self._handle = loop.call_later(self.delay, self._dispatch)
+            else:
+                self._handle = loop.call_soon(self._dispatch)
+        return future
+
+    async def load_many(self, keys):
+        return list(await asyncio.gather(*[self.load(key) for key in keys]))
+
+    def _dispatch(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        batch, self._batch = self._batch, {}
+        if batch:
+            self.batches += 1
+            asyncio.ensure_future(self._run(batch))
+
+    def _key_index(self, description, rows):
+        ''' Return the index of the key column in rows '''
+        names = [d[0] for d in description]
+        if rows and isinstance(rows[0], dict):
+            return names[self.key] if isinstance(self.key, int) else self.key
+        return self.key if isinstance(self.key, int) else names.index(self.key)
+
+    async def _run(self, batch):
+        try:
+            async with self.pool.acquire() as conn:
+                cur = conn.cursor(self.cursor)
+                await cur.execute(self.query, (tuple(batch), ))
+                rows = await cur.fetchall()
+            index = self._key_index(cur.description, rows)
+            results = {}
+            for row in rows:
+                if self.many:
+                    results.setdefault(row[index], []).append(row)
+                else:
+                    results.setdefault(row[index], row)
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except BaseException:
+            # cancelled, or the loop is stopping, the callers must not wait forever
+            for future in batch.values():
+                future.cancel()
+            raise
+        default = [] if self.many else None
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(results.get(key, default))
@@ -6,24 +6,28 @@ import collections
 import warnings
 
 from .connections import connect
+from .loader import Loader
+from .singleflight import SingleFlight
 from .context import (_PoolContextManager, _PoolConnectionContextManager,
                     _PoolAcquireContextManager)
 
 
 def create_pool(minsize=1, maxsize=10, pool_recycle=-1,
-                loop=None, **kwargs):
+                loop=None, single_flight=False, **kwargs):
     coro = _create_pool(minsize=minsize, maxsize=maxsize,
-                        pool_recycle=pool_recycle, loop=loop, **kwargs)
+                        pool_recycle=pool_recycle, loop=loop,
+                        single_flight=single_flight, **kwargs)
     return _PoolContextManager(coro)
 
 
 async def _create_pool(minsize=1, maxsize=10, pool_recycle=-1,
-                       loop=None, **kwargs):
+                       loop=None, single_flight=False, **kwargs):
     if loop is None:
         loop = asyncio.get_event_loop()
 
     pool = Pool(minsize=minsize, maxsize=maxsize,
-                pool_recycle=pool_recycle, loop=loop, **kwargs)
+                pool_recycle=pool_recycle, loop=loop,
+                single_flight=single_flight, **kwargs)
     if minsize > 0:
         async with pool._cond:
             await pool._fill_free_pool(False)
@@ -31,9 +35,14 @@ async def _create_pool(minsize=1, maxsize=10, pool_recycle=-1,
 
 
 class Pool(asyncio.AbstractServer):
-    """Connection pool"""
+    """Connection pool
 
-    def __init__(self, minsize, maxsize, pool_recycle, loop, **kwargs):
+    With single_flight=True, fetchall() runs identical read only queries
+    made at the same time once, see SingleFlight.
+    """
+
+    def __init__(self, minsize, maxsize, pool_recycle, loop,
+                 single_flight=False, **kwargs):
         if minsize < 0:
             raise ValueError("minsize should be zero or greater")
         if maxsize < minsize and maxsize != 0:
@@ -49,6 +58,8 @@ class Pool(asyncio.AbstractServer):
         self._closing = False
         self._closed = False
         self._recycle = pool_recycle
+        self._reconnects = 0
+        self.single_flight = SingleFlight(self) if single_flight else None
 
     @property
     def minsize(self):
@@ -66,12 +77,25 @@ class Pool(asyncio.AbstractServer):
     def freesize(self):
         return len(self._free)
 
+    @property
+    def reconnects(self):
+        """Number of times pool's connections were transparently reconnected."""
+        return self._reconnects
+
+    def _on_reconnect(self, conn):
+        self._reconnects += 1
+
+    async def _connect(self):
+        conn = await connect(loop=self._loop, **self._conn_kwargs)
+        conn.reconnect_listeners.append(self._on_reconnect)
+        return conn
+
     async def clear(self):
         """Close all free connections in pool."""
         async with self._cond:
             while self._free:
                 conn = self._free.popleft()
-                await conn.ensure_closed()
+                await conn.close()
             self._cond.notify()
 
     @property
@@ -100,7 +124,7 @@ class Pool(asyncio.AbstractServer):
         self.close()
 
         for conn in list(self._used):
-            conn.close()
+            conn._close_socket()
             self._terminated.add(conn)
 
         self._used.clear()
@@ -153,7 +177,7 @@ class Pool(asyncio.AbstractServer):
             if (self._recycle > -1 and
                   self._loop.time() - conn.last_usage > self._recycle):
                 self._free.pop()
-                conn.close()
+                await conn.close()
             else:
                 self._free.rotate()
             n += 1
@@ -161,8 +185,7 @@ class Pool(asyncio.AbstractServer):
         while self.size < self.minsize:
             self._acquiring += 1
             try:
-                conn = await connect(loop=self._loop,
-                                     **self._conn_kwargs)
+                conn = await self._connect()
                 # raise exception if pool is closing
                 self._free.append(conn)
                 self._cond.notify()
@@ -174,14 +197,29 @@ class Pool(asyncio.AbstractServer):
         if override_min and (not self.maxsize or self.size < self.maxsize):
             self._acquiring += 1
             try:
-                conn = await connect(loop=self._loop,
-                                     **self._conn_kwargs)
+                conn = await self._connect()
                 # raise exception if pool is closing
                 self._free.append(conn)
                 self._cond.notify()
             finally:
                 self._acquiring -= 1
 
+    async def fetchall(self, query, args=None, cursor=None):
+        """Execute query on a connection of the pool and return all rows."""
+        if self.single_flight is not None:
+            return await self.single_flight.fetchall(query, args, cursor)
+        return await self._fetchall(query, args, cursor)
+
+    def loader(self, query, **kwargs):
+        """Return a Loader batching the lookups of query, see Loader."""
+        return Loader(self, query, **kwargs)
+
+    async def _fetchall(self, query, args, cursor):
+        async with self.acquire() as conn:
+            cur = conn.cursor(cursor)
+            await cur.execute(query, args)
+            return await cur.fetchall()
+
     async def _wakeup(self):
         async with self._cond:
             self._cond.notify()
@@ -199,18 +237,26 @@ class Pool(asyncio.AbstractServer):
             self._terminated.remove(conn)
             return fut
         assert conn in self._used, (conn, self._used)
-        self._used.remove(conn)
-        if not conn.closed:
-            in_trans = conn.get_transaction_status()
-            if in_trans:
-                conn.close()
-                return fut
+        if conn.closed:
+            self._used.remove(conn)
+            return fut
+        return self._loop.create_task(self._release(conn))
+
+    async def _release(self, conn):
+        # connections do not autocommit, so a SELECT leaves a transaction
+        # open, it is rolled back before the connection is reused
+        try:
             if self._closing:
-                conn.close()
-            else:
-                self._free.append(conn)
-            fut = self._loop.create_task(self._wakeup())
-        return fut
+                await conn.close()
+            elif conn.get_transaction_status():
+                await conn.rollback()
+        except Exception:
+            conn._close_socket()
+        finally:
+            self._used.discard(conn)
+        if not conn.closed:
+            self._free.append(conn)
+        await self._wakeup()
 
     def __enter__(self):
         raise RuntimeError(
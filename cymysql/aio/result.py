@@ -1,4 +1,5 @@
 from ..packet import MysqlPacket, FieldDescriptorPacket
+from ..compact import CompactRows
 from ..result import MySQLResult
 
 from ..constants import SERVER_STATUS
@@ -11,7 +12,7 @@ class AsyncMySQLResult(MySQLResult):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-    async def read_result(self):
+    async def read_result(self, unbuffered=False):
         self.first_packet = MysqlPacket(
             await self.connection.socket.recv_packet(self.connection.loop),
             self.connection.charset,
@@ -21,20 +22,31 @@ class AsyncMySQLResult(MySQLResult):
         if self.first_packet.is_ok_packet():
             (self.affected_rows, self.insert_id,
                 self.server_status, self.warning_count,
-                self.message) = self.first_packet.read_ok_packet()
+                self.message) = self.first_packet.read_ok_packet(self.connection.session_track)
+            self.connection._update_session_state(self.first_packet, self.server_status)
+            self.has_next = (self.server_status & SERVER_MORE_RESULTS_EXISTS)
             self.has_result = False
         else:
             self.field_count = ord(self.first_packet.read(1))
             await self._get_descriptions()
+            if self.row_reader is not None:
+                self.read_row = self.row_reader(self.fields, self.connection.conv, self.connection.encoding)
             self.has_result = True
-            await self.read_rest_rowdata_packet()
+            if not unbuffered:
+                await self.read_rest_rowdata_packet()
 
     async def read_rest_rowdata_packet(self):
         """Read rest rowdata packets for each data row in the result set."""
         if (not self.has_result) or (self.rest_rows is not None):
             return
-        rest_rows = []
         decoder = self.connection.conv
+        compact = self.connection.compact_results
+        if compact:
+            rest_rows = CompactRows(
+                self.fields, decoder, self.connection.charset, self.connection.encoding, self.read_row
+            )
+        else:
+            rest_rows = []
         while True:
             packet = MysqlPacket(
                 await self.connection.socket.recv_packet(self.connection.loop),
@@ -45,9 +57,15 @@ class AsyncMySQLResult(MySQLResult):
             if is_eof:
                 self.warning_count = warning_count
                 self.server_status = server_status
+                self.connection.server_status = server_status
                 self.has_next = (server_status & SERVER_MORE_RESULTS_EXISTS)
                 break
-            rest_rows.append(packet.read_decode_data(self.fields, decoder))
+            if compact:
+                rest_rows.append_packet(packet.get_all_data())
+            elif self.read_row is None:
+                rest_rows.append(packet.read_decode_data(self.fields, decoder))
+            else:
+                rest_rows.append(self.read_row(packet))
         self.rest_rows = rest_rows
         self.rest_row_index = 0
 
@@ -85,11 +103,100 @@ class AsyncMySQLResult(MySQLResult):
             if is_eof:
                 self.warning_count = warning_count
                 self.server_status = server_status
+                self.connection.server_status = server_status
                 self.has_next = (server_status & SERVER_MORE_RESULTS_EXISTS)
                 self.rest_rows = []
                 return None
+            if self.read_row is not None:
+                return self.read_row(packet)
             return packet.read_decode_data(self.fields, self.connection.conv)
         elif len(self.rest_rows) != self.rest_row_index:
             self.rest_row_index += 1
             return self.rest_rows[self.rest_row_index - 1]
         return None
+
+    async def fetch_columns(self, columns, size=-1):
+        """Read the next size rows, all if size is negative, into the
+        column buffers of cymysql.columnar, return the number of rows."""
+        if not self.has_result:
+            return 0
+        kinds, values, masks = columns.kinds, columns.values, columns.masks
+        decoders, buffers = columns.decoders, columns.buffers
+        if self.rest_rows is not None:
+            end = len(self.rest_rows)
+            if size >= 0:
+                end = min(end, self.rest_row_index + size)
+            if isinstance(self.rest_rows, CompactRows):
+                for i in range(self.rest_row_index, end):
+                    self.rest_rows.packet(i).read_columns(kinds, values, masks, decoders, buffers)
+            else:
+                for row in self.rest_rows[self.rest_row_index:end]:
+                    columns.append_row(row)
+            n = end - self.rest_row_index
+            self.rest_row_index = end
+            return n
+        n = 0
+        while n != size:
+            packet = MysqlPacket(
+                await self.connection.socket.recv_packet(self.connection.loop),
+                self.connection.charset,
+                self.connection.encoding,
+            )
+            is_eof, warning_count, server_status = packet.is_eof_and_status()
+            if is_eof:
+                self.warning_count = warning_count
+                self.server_status = server_status
+                self.connection.server_status = server_status
+                self.has_next = (server_status & SERVER_MORE_RESULTS_EXISTS)
+                self.rest_rows = []
+                self.rest_row_index = 0
+                break
+            packet.read_columns(kinds, values, masks, decoders, buffers)
+            n += 1
+        return n
+
+    async def fetch_json(self, rows, size=-1):
+        """Write the next size rows, all if size is negative, to the
+        cymysql.jsonrows.JsonRows rows, return the number of rows."""
+        if not self.has_result:
+            return 0
+        n = 0
+        buffer, kinds, prefixes = rows.buffer, rows.kinds, rows.prefixes
+        suffix, encodings = rows.suffix, rows.encodings
+        if self.rest_rows is not None:
+            end = len(self.rest_rows)
+            if size >= 0:
+                end = min(end, self.rest_row_index + size)
+            if isinstance(self.rest_rows, CompactRows):
+                for i in range(self.rest_row_index, end):
+                    self.rest_rows.packet(i).read_json(
+                        buffer, kinds, prefixes, suffix, encodings, rows.rows > 0
+                    )
+                    rows.rows += 1
+            else:
+                for row in self.rest_rows[self.rest_row_index:end]:
+                    rows.append_row(row)
+            n = end - self.rest_row_index
+            self.rest_row_index = end
+            return n
+        comma = rows.rows > 0
+        while n != size:
+            packet = MysqlPacket(
+                await self.connection.socket.recv_packet(self.connection.loop),
+                self.connection.charset,
+                self.connection.encoding,
+            )
+            is_eof, warning_count, server_status = packet.is_eof_and_status()
+            if is_eof:
+                self.warning_count = warning_count
+                self.server_status = server_status
+                self.connection.server_status = server_status
+                self.has_next = (server_status & SERVER_MORE_RESULTS_EXISTS)
+                self.rest_rows = []
+                self.rest_row_index = 0
+                break
+            packet.read_json(buffer, kinds, prefixes, suffix, encodings, comma)
+            comma = True
+            n += 1
+        rows.rows += n
+        return n
@@ -0,0 +1,205 @@
+import time
+
+from ..routing import LatencyWeightedPolicy, RoutingCursor, is_connection_error, is_read_only
+from ..err import OperationalError, ProgrammingError
+from .context import _PoolAcquireContextManager
+
+
+class AsyncRoutingCursor(RoutingCursor):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc, value, traceback):
+        await self.close()
+
+    async def __anext__(self):
+        ret = await self.fetchone()
+        if ret is not None:
+            return ret
+        else:
+            raise StopAsyncIteration  # noqa
+
+    def _check_executed(self):
+        if self._cursor is None:
+            raise ProgrammingError(-1, "execute() first")
+
+    async def execute(self, query, args=None):
+        return await self.router._execute(self, query, args)
+
+    async def executemany(self, query, args):
+        node, conn = await self.router._primary_node()
+        return await self._get_cursor(node, conn).executemany(query, args)
+
+    async def callproc(self, procname, args=()):
+        node, conn = await self.router._primary_node()
+        return await self._get_cursor(node, conn).callproc(procname, args)
+
+    async def nextset(self):
+        self._check_executed()
+        return await self._cursor.nextset()
+
+    async def fetchone(self):
+        self._check_executed()
+        return await self._cursor.fetchone()
+
+    async def fetchmany(self, size=None):
+        self._check_executed()
+        return await self._cursor.fetchmany(size)
+
+    async def fetchall(self):
+        self._check_executed()
+        return await self._cursor.fetchall()
+
+    async def close(self):
+        self._cursors = {}
+        self._cursor = None
+
+
+class AsyncRoutingConnection(object):
+    """
+    A connection like object handed out by AsyncRouter.acquire().
+
+    It holds a primary connection from the first statement that needs one
+    until it is released.  Replica connections are taken from their pool
+    for a single statement, the result is read before they are released.
+    Statements of unbuffered cursors, whose rows are read after execute(),
+    go to the primary.
+    """
+
+    def __init__(self, router, causal_token=None):
+        self.router = router
+        self.causal_token = causal_token
+        self._primary = None
+
+    async def _primary_node(self):
+        if self._primary is None:
+            self._primary = await self.router.primary.acquire()
+        return 'primary', self._primary
+
+    def in_transaction(self):
+        return bool(self._primary is not None and self._primary.get_transaction_status())
+
+    def choose(self, query):
+        ''' Return the node query should be sent to '''
+        if not self.router.replicas or self.in_transaction() or not is_read_only(query):
+            return 'primary'
+        return self.router.policy.choose(list(range(len(self.router.replicas))))
+
+    def _update_causal_token(self):
+        if self._primary is not None and self._primary.causal_token is not None:
+            self.causal_token, self._primary.causal_token = self._primary.causal_token, None
+
+    async def _wait_for_causal_token(self, node, conn):
+        ''' Wait until the replica has applied causal_token, return False on timeout '''
+        token = self.causal_token
+        if token is None or self.router._replica_tokens.get(node) == token:
+            return True
+        cur = conn.cursor()
+        await cur.execute(
+            "SELECT WAIT_FOR_EXECUTED_GTID_SET(%s, %s)", (token, self.router.gtid_wait_timeout)
+        )
+        (timed_out, ) = await cur.fetchone()
+        if timed_out:
+            return False
+        self.router._replica_tokens[node] = token
+        return True
+
+    def _unbuffered(self, cursor, pool):
+        cursorclass = cursor.cursorclass or pool._conn_kwargs.get('cursorclass')
+        return bool(cursorclass is not None and cursorclass._unbuffered)
+
+    async def _execute(self, cursor, query, args):
+        node = self.choose(query)
+        if node != 'primary' and self._unbuffered(cursor, self.router.replicas[node]):
+            node = 'primary'
+        if node != 'primary':
+            pool = self.router.replicas[node]
+            start = time.monotonic()
+            try:
+                conn = await pool.acquire()
+            except (OperationalError, OSError) as e:
+                if not is_connection_error(e):
+                    raise
+                self.router.policy.record_failure(node)
+            else:
+                try:
+                    if not conn.get_autocommit():
+                        await conn.autocommit(True)
+                    if (
+                        not self.router.causal_reads
+                        or await self._wait_for_causal_token(node, conn)
+                    ):
+                        result = await cursor._get_cursor(node, conn).execute(query, args)
+                        self.router.policy.record(node, time.monotonic() - start)
+                        return result
+                except (OperationalError, OSError) as e:
+                    if not is_connection_error(e):
+                        raise
+                    self.router.policy.record_failure(node)
+                    conn._close_socket()
+                finally:
+                    await pool.release(conn)
+        node, conn = await self._primary_node()
+        result = await cursor._get_cursor(node, conn).execute(query, args)
+        self._update_causal_token()
+        return result
+
+    def cursor(self, cursor=None):
+        ''' Create a new cursor which routes statements '''
+        return AsyncRoutingCursor(self, cursor)
+
+    async def autocommit(self, value):
+        node, conn = await self._primary_node()
+        await conn.autocommit(value)
+
+    async def commit(self):
+        if self._primary is not None:
+            await self._primary.commit()
+            self._update_causal_token()
+
+    async def rollback(self):
+        if self._primary is not None:
+            await self._primary.rollback()
+
+    ProgrammingError = ProgrammingError
+
+
+class AsyncRouter(object):
+    """Route statements between a primary pool and replica pools.
+
+    causal_reads needs a primary pool created with track_gtids=True.
+    """
+
+    def __init__(self, primary, replicas=(), policy=None,
+                 causal_reads=False, gtid_wait_timeout=1):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.policy = policy if policy is not None else LatencyWeightedPolicy()
+        self.causal_reads = causal_reads
+        self.gtid_wait_timeout = gtid_wait_timeout
+        self._replica_tokens = {}
+
+    def acquire(self, causal_token=None):
+        """Acquire a routing connection.
+
+        causal_token is a GTID set from an earlier routing connection the
+        replicas have to wait for.
+        """
+        return _PoolAcquireContextManager(self._acquire(causal_token), self)
+
+    async def _acquire(self, causal_token):
+        return AsyncRoutingConnection(self, causal_token)
+
+    async def release(self, conn):
+        """Release the primary connection held by conn."""
+        if conn._primary is not None:
+            primary, conn._primary = conn._primary, None
+            await self.primary.release(primary)
+
+    def close(self):
+        for pool in [self.primary] + self.replicas:
+            pool.close()
+
+    async def wait_closed(self):
+        for pool in [self.primary] + self.replicas:
+            await pool.wait_closed()
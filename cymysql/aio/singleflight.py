@@ -0,0 +1,64 @@
+import asyncio
+
+from ..routing import is_read_only
+
+
+class SingleFlight(object):
+    """Coalesce identical read only queries run through a pool.
+
+    While a query is executing, callers of fetchall() with the same query,
+    arguments and cursor class wait for it instead of taking a connection
+    of their own, and all of them get its rows.  The list is copied for
+    each caller, the rows themselves are shared.
+
+    executions counts the queries run, coalesced the calls answered by an
+    execution another caller started, that is the executions saved.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.executions = 0
+        self.coalesced = 0
+        self._flights = {}
+
+    @property
+    def in_flight(self):
+        return len(self._flights)
+
+    def key(self, query, args=None, cursor=None):
+        ''' Return the key of a query, None if it must not be coalesced '''
+        if not is_read_only(query):
+            return None
+        # 1, 1.0 and True are equal but not escaped alike
+        if isinstance(args, dict):
+            args = tuple((k, type(v), v) for k, v in sorted(args.items()))
+        elif isinstance(args, (tuple, list)):
+            args = tuple((type(v), v) for v in args)
+        else:
+            args = (type(args), args)
+        key = (query, args, cursor)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    async def _run(self, key, query, args, cursor):
+        try:
+            return await self.pool._fetchall(query, args, cursor)
+        finally:
+            del self._flights[key]
+
+    async def fetchall(self, query, args=None, cursor=None):
+        key = self.key(query, args, cursor)
+        if key is None:
+            self.executions += 1
+            return await self.pool._fetchall(query, args, cursor)
+        flight = self._flights.get(key)
+        if flight is None:
+            self.executions += 1
+            flight = self._flights[key] = asyncio.ensure_future(self._run(key, query, args, cursor))
+        else:
+            self.coalesced += 1
+        # a cancelled caller leaves the execution to the others
+        return list(await asyncio.shield(flight))
@@ -1,9 +1,4 @@
-import zlib
-try:
-    import pyzstd
-except ImportError:
-    pyzstd = None
-from ..socketwrapper import SocketWrapper
+from ..socketwrapper import SocketWrapper, MAX_PACKET_LENGTH
 from ..err import OperationalError
 
 def pack_int24(n):
@@ -19,68 +14,81 @@ class AsyncSocketWrapper(SocketWrapper):
         super().__init__(*args, **kwargs)
 
     async def recv(self, size, loop):
-        r = b''
-        while size:
-            recv_data = await loop.sock_recv(self._sock, size)
-            if not recv_data:
+        recv_data = await loop.sock_recv(self._sock, size)
+        if len(recv_data) == size:
+            return recv_data
+        if not recv_data:
+            raise OperationalError(2013, "Lost connection to MySQL server during query")
+        buf = bytearray(size)
+        view = memoryview(buf)
+        pos = len(recv_data)
+        view[:pos] = recv_data
+        while pos < size:
+            n = await loop.sock_recv_into(self._sock, view[pos:])
+            if not n:
                 raise OperationalError(2013, "Lost connection to MySQL server during query")
-            size -= len(recv_data)
-            r += recv_data
-        return r
+            pos += n
+        return bytes(buf)
 
     async def recv_uncompress_packet(self, loop):
         return await self.recv(unpack_uint24(await self.recv(4, loop)), loop)
 
+    async def _recv_compressed_frame(self, loop):
+        header = await self.recv(7, loop)
+        return self._decompress_frame(header, await self.recv(unpack_uint24(header), loop))
+
     async def _recv_from_decompressed(self, size, loop):
-        if len(self._decompressed) < size:
-            compressed_length = unpack_uint24(await self.recv(3, loop))
-            await self.recv(1)  # compressed sequence
-            uncompressed_length = unpack_uint24(await self.recv(3, loop))
-            data = await self.recv(compressed_length, loop)
-            if uncompressed_length != 0:
-                if self._compress == "zlib":
-                    data = zlib.decompress(data)
-                elif self._compress == "zstd":
-                    data = pyzstd.decompress(data)
-                assert len(data) == uncompressed_length
-            self._decompressed += data
-        recv_data, self._decompressed = self._decompressed[:size], self._decompressed[size:]
-        return recv_data
+        pos = self._decompressed_pos
+        available = len(self._decompressed) - pos
+        if available >= size:
+            self._decompressed_pos = pos + size
+            if pos == 0 and size == available:
+                return self._decompressed
+            return self._decompressed[pos:pos + size]
+        # only the requested bytes are copied out of the following frames
+        chunks = [self._decompressed[pos:]]
+        self._decompressed = b''
+        size -= available
+        while True:
+            data = await self._recv_compressed_frame(loop)
+            if len(data) >= size:
+                break
+            chunks.append(data)
+            size -= len(data)
+        self._decompressed = data
+        self._decompressed_pos = size
+        chunks.append(data[:size] if size < len(data) else data)
+        return b''.join(chunks)
 
-    async def recv_packet(self, loop):
-        """Read entire mysql packet."""
-        recv_data = b''
+    async def _recv_payload(self, size, loop):
         if self._compress:
-            ln = unpack_uint24(await self._recv_from_decompressed(4, loop))
-            recv_data = await self._recv_from_decompressed(ln, loop)
-        else:
-            while True:
-                ln = int.from_bytes((await self.recv(4, loop))[:3], "little")
-                recv_data += await self.recv(ln, loop)
-                if recv_data[:3] != b'\xff\xff\xff':
-                    break
+            return await self._recv_from_decompressed(size, loop)
+        return await self.recv(size, loop)
 
-        return recv_data
+    async def recv_payload(self, size, loop):
+        """Read size bytes of the (decompressed) packet stream."""
+        return await self._recv_payload(size, loop)
+
+    async def recv_packet(self, loop):
+        """Read entire mysql packet."""
+        ln = unpack_uint24(await self._recv_payload(4, loop))
+        recv_data = await self._recv_payload(ln, loop)
+        if ln < MAX_PACKET_LENGTH:
+            return recv_data
+        chunks = [recv_data]
+        while ln == MAX_PACKET_LENGTH:
+            ln = unpack_uint24(await self._recv_payload(4, loop))
+            chunks.append(await self._recv_payload(ln, loop))
+        return b''.join(chunks)
 
     async def send_uncompress_packet(self, data, loop):
         await loop.sock_sendall(self._sock, data)
 
     async def send_packet(self, data, loop):
         if self._compress:
-            uncompressed_length = len(data)
-            if uncompressed_length < 50:
-                compressed = data
-                compressed_length = len(compressed)
-                uncompressed_length = 0
-            else:
-                if self._compress == "zlib":
-                    compressed = zlib.compress(data)
-                elif self._compress == "pyzstd":
-                    compressed = pyzstd.compress(data)
-                compressed_length = len(compressed)
-                if len(data) < compressed_length:
-                    compressed = data
-                    compressed_length = len(compressed)
-                    uncompressed_length = 0
-            data = pack_int24(compressed_length) + b'\x00' + pack_int24(uncompressed_length) + compressed
+            data = self._compress_packets(data)
         await loop.sock_sendall(self._sock, data)
+
+    async def send_packets(self, packets, loop):
+        """Send several packets together, in one compressed frame if they fit."""
+        await self.send_packet(b''.join(packets), loop)
@@ -0,0 +1,637 @@
+'''
+Client side cache of query results.
+
+A QueryCache keeps the decoded rows and the description of read only
+SELECT statements.  Pass it to connect() as query_cache, or to a pool
+which passes it on to its connections, to share it:
+
+    cache = QueryCache(max_bytes=64 << 20, ttl=30)
+    conn = cymysql.connect(host="db", query_cache=cache)
+    conn.autocommit(True)
+    cur = conn.cursor()
+    cur.execute("SELECT region, SUM(total) FROM orders GROUP BY region")
+    cur.execute("SELECT region, SUM(total) FROM orders GROUP BY region")  # cached
+
+Statements run inside a transaction are neither cached nor answered from
+the cache.  Connections do not autocommit by default and open one with
+their first statement, turn autocommit on to use the cache.
+
+Entries are keyed by the statement with its escaped arguments, whitespace
+outside quoted strings collapsed, plus the server, user, database,
+charset and decoders of the connection.  They expire ttl seconds after
+they are stored and the least recently used entries are evicted once the
+approximate size of all rows exceeds max_bytes.
+
+Each entry is tagged with the tables its statement reads from.  Statements
+which modify data invalidate the tags of the tables they name, and again
+when their transaction ends, as other connections may have cached the rows
+committed before it.  Writes made by other clients are only seen once the
+entries expire.  Call invalidate() with table names to drop entries
+explicitly.
+
+MappedQueryCache stores the results in files of a directory instead, in a
+compact binary row format which is memory mapped read only.  Processes
+sharing the directory, like the workers of an application server, share
+one copy of each result and find it again after a restart:
+
+    cache = MappedQueryCache("/var/cache/app/queries", ttl=300)
+'''
+import collections
+import collections.abc
+import datetime
+import decimal
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+from cymysql.constants import SERVER_STATUS
+from cymysql.converters import decoders
+from cymysql.routing import is_read_only
+
+NORMALIZE_REGEX = re.compile(
+    rb"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`[^`]*`)|\s+", re.DOTALL
+)
+NON_DETERMINISTIC_REGEX = re.compile(
+    r"\b(?:NOW|SYSDATE|CUR(?:DATE|TIME)|CURRENT_(?:DATE|TIME|TIMESTAMP|USER)|"
+    r"LOCAL(?:TIME|TIMESTAMP)|UTC_(?:DATE|TIME|TIMESTAMP)|UNIX_TIMESTAMP|RAND|"
+    r"UUID(?:_SHORT)?|CONNECTION_ID|LAST_INSERT_ID|FOUND_ROWS|ROW_COUNT|USER|"
+    r"SESSION_USER|SYSTEM_USER|DATABASE|SCHEMA|SLEEP|SQL_NO_CACHE)\b|@",
+    re.IGNORECASE
+)
+TABLE_NAME = r"(?:`[^`]+`|\w+)(?:\s*\.\s*(?:`[^`]+`|\w+))?"
+TABLE_NAME_REGEX = re.compile(TABLE_NAME)
+TABLE_ALIAS = (
+    r"(?:\s+(?:AS\s+)?(?!(?:JOIN|INNER|LEFT|RIGHT|CROSS|NATURAL|STRAIGHT_JOIN|WHERE|GROUP|"
+    r"ORDER|LIMIT|HAVING|ON|USING|UNION|FOR|LOCK|WINDOW|SET|VALUES|VALUE|SELECT|PARTITION|"
+    r"USE|IGNORE|FORCE)\b)\w+)?"
+)
+TABLE_LIST = r"(%s%s(?:\s*,\s*%s%s)*)" % (TABLE_NAME, TABLE_ALIAS, TABLE_NAME, TABLE_ALIAS)
+READ_TABLES_REGEX = re.compile(r"\b(?:FROM|JOIN)\s+" + TABLE_LIST, re.IGNORECASE)
+WRITE_TABLES_REGEX = re.compile(
+    r"\b(?:INTO(?:\s+TABLE)?|UPDATE(?:\s+LOW_PRIORITY)?(?:\s+IGNORE)?|FROM|JOIN|TRUNCATE(?:\s+TABLE)?|"
+    r"(?:CREATE|DROP|ALTER|RENAME)\s+(?:TEMPORARY\s+)?TABLE(?:\s+IF\s+(?:NOT\s+)?EXISTS)?)\s+"
+    + TABLE_LIST, re.IGNORECASE
+)
+
+# rows sampled to estimate the size of a large result
+SIZE_SAMPLE = 100
+# characters of a statement searched for the tables it writes, which precede its values
+STATEMENT_HEAD = 4096
+
+
+def _decode(sql):
+    if isinstance(sql, str):
+        return sql
+    return bytes(sql).decode('utf-8', 'replace')
+
+
+def _head(sql):
+    ''' Return the first STATEMENT_HEAD characters of sql, decoded '''
+    if isinstance(sql, str):
+        return sql[:STATEMENT_HEAD]
+    if hasattr(sql, 'statement'):
+        sql = sql.statement()
+    return bytes(sql[:STATEMENT_HEAD]).decode('utf-8', 'replace')
+
+
+def _table_name(name):
+    return name.rsplit('.', 1)[-1].strip().strip('`').lower()
+
+
+def tables(sql, regex=READ_TABLES_REGEX):
+    ''' Return the names of the tables sql reads from, without database '''
+    return frozenset(
+        _table_name(TABLE_NAME_REGEX.match(name.strip()).group(0))
+        for names in regex.findall(_decode(sql)) for name in names.split(',')
+    )
+
+
+def decoders_key(conv):
+    ''' Return a key of the decoders conv which is the same in every process '''
+    if conv is decoders:
+        return None
+    return tuple(sorted(
+        (type_code, getattr(f, '__module__', None) or '', getattr(f, '__qualname__', None) or repr(f))
+        for type_code, f in conv.items()
+    ))
+
+
+def _sizeof_row(row):
+    return sys.getsizeof(row) + sum(map(sys.getsizeof, row))
+
+
+def sizeof_rows(rows):
+    ''' Estimate the memory taken by rows, from a sample if there are many '''
+    if len(rows) <= SIZE_SAMPLE:
+        return sys.getsizeof(rows) + sum(map(_sizeof_row, rows))
+    step = len(rows) // SIZE_SAMPLE
+    sample = sum(map(_sizeof_row, rows[::step][:SIZE_SAMPLE]))
+    return sys.getsizeof(rows) + sample * len(rows) // SIZE_SAMPLE
+
+
+CacheEntry = collections.namedtuple(
+    'CacheEntry', ['description', 'rows', 'size', 'expires', 'tags']
+)
+
+
+class QueryCache(object):
+    '''
+    An LRU cache of result sets bounded by max_bytes, entries expire after
+    ttl seconds.  ttl may also be a callable which returns the number of
+    seconds for a statement, None to not cache it.  Results larger than
+    max_entry_bytes are not cached.
+    '''
+
+    def __init__(self, max_bytes=64 << 20, ttl=60, max_entry_bytes=None, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 4 if max_entry_bytes is None else max_entry_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._tags = {}
+        self._decoders_keys = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def cacheable(self, sql):
+        ''' Return True if the result of sql may be cached '''
+        if not is_read_only(_head(sql)):
+            return False
+        sql = _decode(sql)
+        return is_read_only(sql) and NON_DETERMINISTIC_REGEX.search(sql) is None
+
+    def key(self, connection, sql):
+        '''
+        Return the cache key of sql run on connection, None if its result
+        can not be cached.
+        '''
+        if connection.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+            return None
+        if not self.cacheable(sql):
+            return None
+        if isinstance(sql, str):
+            sql = sql.encode(connection.encoding)
+        sql = NORMALIZE_REGEX.sub(lambda m: m.group(1) or b' ', bytes(sql)).strip()
+        conv = connection.conv
+        cached = self._decoders_keys.get(id(conv))
+        if cached is None or cached[0] is not conv:
+            cached = self._decoders_keys[id(conv)] = (conv, decoders_key(conv))
+        return (
+            connection.host, connection.port, connection.user, connection.db,
+            connection.charset, cached[1], sql,
+        )
+
+    def get(self, key):
+        ''' Return the entry of key, None if there is none or it expired '''
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires <= self.clock():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, description, rows, ttl=None, tags=None):
+        ''' Cache the rows of key, tagged with the tables of the statement by default '''
+        if ttl is None:
+            ttl = self.ttl(key[-1]) if callable(self.ttl) else self.ttl
+        if ttl is None or ttl <= 0:
+            return None
+        size = sizeof_rows(rows) + len(key[-1])
+        if size > self.max_entry_bytes:
+            return None
+        if tags is None:
+            tags = tables(key[-1])
+        entry = CacheEntry(description, rows, size, self.clock() + ttl, frozenset(tags))
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self.size += size
+            for tag in entry.tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+        return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.size -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate(self, *tags):
+        ''' Drop the entries of the given tables '''
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag.lower(), ())):
+                    self._remove(key)
+
+    def invalidate_statement(self, sql):
+        '''
+        Drop the entries of the tables a data modifying statement names,
+        return the names.  Only the head of a long write is searched.
+        '''
+        text = _head(sql)
+        if is_read_only(text):
+            if len(sql) <= len(text):
+                return frozenset()
+            # a long read, unless a later statement writes
+            text = _decode(sql)
+            if is_read_only(text):
+                return frozenset()
+        names = tables(text, WRITE_TABLES_REGEX)
+        self.invalidate(*names)
+        return names
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self.size = 0
+
+
+# value types of the mapped row format
+(_NONE, _INT, _BIGINT, _FLOAT, _STR, _BYTES, _DECIMAL, _DATE, _DATETIME,
+    _TIMEDELTA, _TIME, _SET, _JSON) = range(13)
+
+_HEADER = struct.Struct('<4sBdII')  # magic, version, expires, rows, meta length
+_MAGIC = b'CYRC'
+_VERSION = 1
+_OFFSETS = struct.Struct('<QQ')
+_LENGTH = struct.Struct('<BI')
+_INT64 = struct.Struct('<Bq')
+_FLOAT64 = struct.Struct('<Bd')
+_DATE_STRUCT = struct.Struct('<BHBB')
+_DATETIME_STRUCT = struct.Struct('<BHBBBBBI')
+_TIMEDELTA_STRUCT = struct.Struct('<BiiI')
+_TIME_STRUCT = struct.Struct('<BBBBI')
+
+
+def _pack_bytes(type_code, data):
+    return _LENGTH.pack(type_code, len(data)) + data
+
+
+def _pack_value(value):
+    ''' Encode one value of a row in the mapped format '''
+    t = type(value)
+    if value is None:
+        return b'\x00'
+    elif t is int:
+        if -(1 << 63) <= value < (1 << 63):
+            return _INT64.pack(_INT, value)
+        return _pack_bytes(_BIGINT, str(value).encode('ascii'))
+    elif t is float:
+        return _FLOAT64.pack(_FLOAT, value)
+    elif t is str:
+        return _pack_bytes(_STR, value.encode('utf-8', 'surrogatepass'))
+    elif t is bytes or t is bytearray:
+        return _pack_bytes(_BYTES, value)
+    elif t is decimal.Decimal:
+        return _pack_bytes(_DECIMAL, str(value).encode('ascii'))
+    elif t is datetime.datetime and value.tzinfo is None:
+        return _DATETIME_STRUCT.pack(
+            _DATETIME, value.year, value.month, value.day,
+            value.hour, value.minute, value.second, value.microsecond
+        )
+    elif t is datetime.date:
+        return _DATE_STRUCT.pack(_DATE, value.year, value.month, value.day)
+    elif t is datetime.timedelta:
+        return _TIMEDELTA_STRUCT.pack(_TIMEDELTA, value.days, value.seconds, value.microseconds)
+    elif t is datetime.time and value.tzinfo is None:
+        return _TIME_STRUCT.pack(_TIME, value.hour, value.minute, value.second, value.microsecond)
+    elif t is set:
+        return _pack_bytes(_SET, ','.join(sorted(value)).encode('utf-8'))
+    elif t is dict or t is list:
+        return _pack_bytes(_JSON, json.dumps(value).encode('utf-8'))
+    raise TypeError("%s values can not be stored in a mapped cache" % (t.__name__, ))
+
+
+def _pack_value_row(row):
+    return b''.join([_pack_value(value) for value in row])
+
+
+def _unpack_row(buf, pos, end):
+    row = []
+    append = row.append
+    while pos < end:
+        t = buf[pos]
+        if t == _NONE:
+            append(None)
+            pos += 1
+        elif t == _INT:
+            append(_INT64.unpack_from(buf, pos)[1])
+            pos += 9
+        elif t == _FLOAT:
+            append(_FLOAT64.unpack_from(buf, pos)[1])
+            pos += 9
+        elif t == _DATE:
+            append(datetime.date(*_DATE_STRUCT.unpack_from(buf, pos)[1:]))
+            pos += _DATE_STRUCT.size
+        elif t == _DATETIME:
+            append(datetime.datetime(*_DATETIME_STRUCT.unpack_from(buf, pos)[1:]))
+            pos += _DATETIME_STRUCT.size
+        elif t == _TIMEDELTA:
+            append(datetime.timedelta(*_TIMEDELTA_STRUCT.unpack_from(buf, pos)[1:]))
+            pos += _TIMEDELTA_STRUCT.size
+        elif t == _TIME:
+            append(datetime.time(*_TIME_STRUCT.unpack_from(buf, pos)[1:]))
+            pos += _TIME_STRUCT.size
+        else:
+            length = _LENGTH.unpack_from(buf, pos)[1]
+            pos += _LENGTH.size
+            data = buf[pos:pos + length]
+            pos += length
+            if t == _STR:
+                append(data.decode('utf-8', 'surrogatepass'))
+            elif t == _BYTES:
+                append(data)
+            elif t == _BIGINT:
+                append(int(data))
+            elif t == _DECIMAL:
+                append(decimal.Decimal(data.decode('ascii')))
+            elif t == _SET:
+                append(set(data.decode('utf-8').split(',')))
+            elif t == _JSON:
+                append(json.loads(data))
+            else:
+                raise ValueError("Corrupt mapped cache entry")
+    return tuple(row)
+
+
+class MappedRows(collections.abc.Sequence):
+    '''
+    The rows of a mapped cache entry, each row is decoded from the
+    memory map when it is accessed.
+    '''
+
+    def __init__(self, buf, offsets_pos, data_pos, count):
+        self._buf = buf
+        self._offsets_pos = offsets_pos
+        self._data_pos = data_pos
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("row index out of range")
+        start, end = _OFFSETS.unpack_from(self._buf, self._offsets_pos + 8 * index)
+        return _unpack_row(self._buf, self._data_pos + start, self._data_pos + end)
+
+
+def _read_header(buf):
+    magic, version, expires, count, meta_length = _HEADER.unpack_from(buf)
+    if magic != _MAGIC or version != _VERSION:
+        raise ValueError("Not a mapped cache entry")
+    meta = json.loads(bytes(buf[_HEADER.size:_HEADER.size + meta_length]))
+    return expires, count, _HEADER.size + meta_length, meta
+
+
+def _read_tags(path):
+    ''' Return the tags in the header of the entry file path, or None if it can not be read '''
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(_HEADER.size)
+            magic, version, expires, count, meta_length = _HEADER.unpack(header)
+            if magic != _MAGIC or version != _VERSION:
+                return None
+            return frozenset(json.loads(f.read(meta_length))['tags'])
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+
+
+class MappedQueryCache(QueryCache):
+    '''
+    A QueryCache whose entries are files in directory, written in a
+    compact binary row format and memory mapped read only, so processes
+    using the same directory share one copy of each result in the page
+    cache and find it again after a restart.  Files are replaced
+    atomically, expired ones are rewritten by the next miss.  Entries
+    holding values of types the format does not know are not stored.
+    max_bytes bounds the size of the directory, the files written first
+    are removed first.  The sizes and tags of the files are kept in
+    memory and the directory is scanned again every scan_interval
+    seconds for the files of other processes, which invalidate() removes
+    once they are scanned.  The memory maps of the last max_maps files
+    read are kept open, the others are closed once the rows read from
+    them are released.
+    '''
+    suffix = '.cyrc'
+
+    def __init__(self, directory, max_bytes=256 << 20, ttl=60, max_entry_bytes=None, clock=time.time,
+                 max_maps=64, scan_interval=60):
+        super(MappedQueryCache, self).__init__(max_bytes, ttl, max_entry_bytes, clock)
+        self.directory = directory
+        self.max_maps = max_maps
+        self.scan_interval = scan_interval
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._maps = collections.OrderedDict()
+        # path: (size, expires or None if written by another process, tags), oldest first
+        self._index = collections.OrderedDict()
+        # tag: paths of the entries tagged with it
+        self._tags = {}
+        self._total = 0
+        self._scanned = None
+        self._scan()
+
+    def __len__(self):
+        return len(self._index)
+
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key[:-1]).encode('utf-8') + b'\0' + key[-1])
+        return os.path.join(self.directory, digest.hexdigest() + self.suffix)
+
+    def _files(self):
+        return [
+            entry for entry in os.scandir(self.directory)
+            if entry.name.endswith(self.suffix) and entry.is_file()
+        ]
+
+    def _open(self, path):
+        ''' Return the memory map of path, reusing the last one if the file did not change '''
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(path)
+            return None
+        with self._lock:
+            cached = self._maps.get(path)
+            if cached is not None and cached[0] == (st.st_ino, st.st_mtime_ns):
+                self._maps.move_to_end(path)
+                return cached[1]
+        with open(path, 'rb') as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with self._lock:
+            self._maps[path] = ((st.st_ino, st.st_mtime_ns), buf)
+            self._maps.move_to_end(path)
+            while len(self._maps) > self.max_maps:
+                # unmapped when the last rows read from it are released
+                self._maps.popitem(last=False)
+        return buf
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            buf = self._open(path)
+            if buf is not None:
+                expires, count, offsets_pos, meta = _read_header(buf)
+        except (OSError, ValueError):
+            buf = None
+        if buf is None or expires <= self.clock():
+            self.misses += 1
+            return None
+        self.hits += 1
+        description = tuple(tuple(d) for d in meta['description'])
+        rows = MappedRows(buf, offsets_pos, offsets_pos + 8 * (count + 1), count)
+        return CacheEntry(description, rows, len(buf), expires, frozenset(meta['tags']))
+
+    def put(self, key, description, rows, ttl=None, tags=None):
+        if ttl is None:
+            ttl = self.ttl(key[-1]) if callable(self.ttl) else self.ttl
+        if ttl is None or ttl <= 0:
+            return None
+        try:
+            data = [_pack_value_row(row) for row in rows]
+        except TypeError:
+            return None
+        if tags is None:
+            tags = tables(key[-1])
+        meta = json.dumps({'description': description, 'tags': sorted(tags)}).encode('utf-8')
+        offsets = [0]
+        for row in data:
+            offsets.append(offsets[-1] + len(row))
+        size = _HEADER.size + len(meta) + 8 * len(offsets) + offsets[-1]
+        if size > self.max_entry_bytes:
+            return None
+        expires = self.clock() + ttl
+        path = self._path(key)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, expires, len(data), len(meta)))
+                f.write(meta)
+                f.write(struct.pack('<%dQ' % len(offsets), *offsets))
+                f.writelines(data)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return None
+        with self._lock:
+            self._forget(path)
+            self._add(path, (size, expires, frozenset(tags)))
+            self._evict()
+        return CacheEntry(description, rows, size, expires, frozenset(tags))
+
+    def _scan(self):
+        '''
+        Index the files of the directory by age, removing the expired
+        ones this process wrote
+        '''
+        now = self.clock()
+        files = []
+        for entry in self._files():
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime_ns, entry.path, st.st_size))
+        files.sort()
+        with self._lock:
+            known = dict(self._index)
+        entries = []
+        for mtime, path, size in files:
+            entry = known.get(path)
+            if entry is None or entry[0] != size:
+                # written by another process, only the tags of the header are read
+                tags = _read_tags(path)
+                if tags is None:
+                    continue
+                entry = (size, None, tags)
+            entries.append((path, entry))
+        with self._lock:
+            self._index = collections.OrderedDict()
+            self._tags = {}
+            self._total = 0
+            for path, entry in entries:
+                if entry[1] is not None and entry[1] <= now:
+                    self._unlink(path)
+                else:
+                    self._add(path, entry)
+            self._scanned = time.monotonic()
+
+    def _evict(self):
+        ''' Remove the oldest files until max_bytes is met '''
+        if time.monotonic() - self._scanned >= self.scan_interval:
+            self._scan()
+        while self._total > self.max_bytes and self._index:
+            self._unlink(next(iter(self._index)))
+
+    def _add(self, path, entry):
+        self._index[path] = entry
+        self._total += entry[0]
+        for tag in entry[2]:
+            self._tags.setdefault(tag, set()).add(path)
+
+    def _forget(self, path):
+        entry = self._index.pop(path, None)
+        if entry is not None:
+            self._total -= entry[0]
+            for tag in entry[2]:
+                paths = self._tags.get(tag)
+                if paths is not None:
+                    paths.discard(path)
+                    if not paths:
+                        del self._tags[tag]
+        self._maps.pop(path, None)
+
+    def _unlink(self, path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        with self._lock:
+            self._forget(path)
+
+    def invalidate(self, *tags):
+        with self._lock:
+            paths = set()
+            for tag in tags:
+                paths.update(self._tags.get(tag.lower(), ()))
+        for path in paths:
+            self._unlink(path)
+
+    def clear(self):
+        for entry in self._files():
+            self._unlink(entry.path)
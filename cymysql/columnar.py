@@ -0,0 +1,271 @@
+'''
+Fetch results column by column into NumPy arrays.
+
+Cursor.fetch_numpy() and Cursor.fetchmany_numpy(size) return a dict of
+arrays keyed by column name:
+
+    cur = conn.cursor(SSCursor)
+    cur.execute("SELECT id, price, created FROM orders")
+    while True:
+        chunk = cur.fetchmany_numpy(100000)
+        if not len(chunk["id"]):
+            break
+        ...
+
+Integer columns become int64 (uint64 for UNSIGNED BIGINT), FLOAT and
+DOUBLE float64, DATETIME and TIMESTAMP datetime64[us] and DATE
+datetime64[D].  These cells are parsed from the row packets straight
+into typed buffers, no Python object is created for them.  Columns
+holding NULLs, or zero dates, are numpy.ma.MaskedArray with those cells
+masked.  Other columns are object arrays of the values the connection's
+decoders return, None for NULL.
+
+Cursor.fetch_arrow_batches(batch_size) yields pyarrow.RecordBatch
+objects of the same columns, with UTF-8 and binary string columns copied
+from the packets into the data buffers of large_string and large_binary
+arrays, DECIMAL columns as decimal128 and TIME as duration:
+
+    cur = conn.cursor(SSCursor)
+    cur.execute("SELECT * FROM orders")
+    with pyarrow.parquet.ParquetWriter("orders.parquet", schema) as writer:
+        for batch in cur.fetch_arrow_batches(100000):
+            writer.write_batch(batch)
+
+Unbuffered cursors fill the arrays from the packets as they are read, so
+only one batch is held in memory.  Buffered cursors have decoded the rows
+at execute() and copy them.  Results of the query cache have no field
+packets, their columns are typed from the cursor description, without
+the UNSIGNED flag and the character set of the columns.
+'''
+import array
+import collections.abc
+import datetime
+import functools
+
+from cymysql.constants import FIELD_TYPE, FLAG
+from cymysql.converters import convert_characters, convert_json
+
+KIND_OBJECT = 0
+KIND_INT = 1
+KIND_UINT = 2
+KIND_FLOAT = 3
+KIND_DATETIME = 4
+KIND_DATE = 5
+KIND_BYTES = 6
+
+INT_TYPES = frozenset([
+    FIELD_TYPE.TINY, FIELD_TYPE.SHORT, FIELD_TYPE.INT24, FIELD_TYPE.LONG,
+    FIELD_TYPE.LONGLONG, FIELD_TYPE.YEAR,
+])
+FLOAT_TYPES = frozenset([FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE])
+DATETIME_TYPES = frozenset([FIELD_TYPE.DATETIME, FIELD_TYPE.TIMESTAMP])
+TEXT_TYPES = frozenset([
+    FIELD_TYPE.VARCHAR, FIELD_TYPE.JSON, FIELD_TYPE.ENUM, FIELD_TYPE.SET,
+    FIELD_TYPE.TINY_BLOB, FIELD_TYPE.MEDIUM_BLOB, FIELD_TYPE.LONG_BLOB, FIELD_TYPE.BLOB,
+    FIELD_TYPE.VAR_STRING, FIELD_TYPE.STRING,
+])
+
+_TYPECODES = {
+    KIND_INT: 'q', KIND_UINT: 'Q', KIND_FLOAT: 'd', KIND_DATETIME: 'q', KIND_DATE: 'q', KIND_BYTES: 'q',
+}
+_DTYPES = {
+    KIND_INT: 'int64', KIND_UINT: 'uint64', KIND_FLOAT: 'float64',
+    KIND_DATETIME: 'datetime64[us]', KIND_DATE: 'datetime64[D]',
+}
+_EPOCH = datetime.datetime(1970, 1, 1)
+_EPOCH_DATE = _EPOCH.date()
+
+
+def column_kind(field, raw_text=False):
+    '''
+    Return the KIND_* a column of field is stored as.  With raw_text,
+    binary and UTF-8 string columns are kept as bytes, KIND_BYTES.
+    '''
+    if field.type_code in INT_TYPES:
+        if field.type_code == FIELD_TYPE.LONGLONG and field.flags & FLAG.UNSIGNED:
+            return KIND_UINT
+        return KIND_INT
+    elif field.type_code in FLOAT_TYPES:
+        return KIND_FLOAT
+    elif field.type_code in DATETIME_TYPES:
+        return KIND_DATETIME
+    elif field.type_code in (FIELD_TYPE.DATE, FIELD_TYPE.NEWDATE):
+        return KIND_DATE
+    elif (
+        raw_text and field.type_code in TEXT_TYPES
+        and (field.charset == 'binary' or field.encoding in ('utf8', 'ascii'))
+    ):
+        return KIND_BYTES
+    return KIND_OBJECT
+
+
+def _identity(value):
+    return value
+
+
+def column_decoder(field, decoders, encoding, default=_identity):
+    ''' Return the decoder of field as a function of the value only '''
+    decoder = decoders.get(field.type_code)
+    if decoder is None:
+        return default
+    if decoder in (convert_characters, convert_json):
+        return functools.partial(decoder, encoding=encoding, field=field)
+    return decoder
+
+
+class DescriptionField(object):
+    '''
+    The attributes of a field Columns uses, taken from a column of a
+    cursor description for results which have no field packets
+    '''
+    flags = 0
+    charset = None
+    encoding = None
+
+    def __init__(self, column):
+        self.name = column[0]
+        self.type_code = column[1]
+        self.length = column[3] or 0
+        self.scale = column[5] or 0
+
+
+class Columns(object):
+    '''
+    The buffers rows are read into, one per field.  values are array.array
+    for the typed kinds and lists for KIND_OBJECT, masks are array.array
+    of one byte per row, set for NULL cells.  KIND_BYTES cells are
+    appended to a bytearray of buffers, values holds the offset of the
+    end of each cell after a leading 0.
+    '''
+
+    def __init__(self, fields, decoders, encoding, raw_text=False):
+        self.fields = fields
+        self.encoding = encoding
+        self.names = [field.name for field in fields]
+        self.kinds = [column_kind(field, raw_text) for field in fields]
+        self.values = [
+            [] if kind == KIND_OBJECT else array.array(_TYPECODES[kind])
+            for kind in self.kinds
+        ]
+        self.buffers = [bytearray() if kind == KIND_BYTES else None for kind in self.kinds]
+        for kind, values in zip(self.kinds, self.values):
+            if kind == KIND_BYTES:
+                values.append(0)
+        self.masks = [array.array('b') for field in fields]
+        self.decoders = [column_decoder(field, decoders, encoding) for field in fields]
+
+    def __len__(self):
+        return len(self.masks[0]) if self.masks else 0
+
+    def append_row(self, row):
+        ''' Append a row of decoded values, a sequence or a mapping by name '''
+        if isinstance(row, collections.abc.Mapping):
+            row = row.values()
+        for value, kind, values, mask, field, buffer in zip(
+            row, self.kinds, self.values, self.masks, self.fields, self.buffers
+        ):
+            if kind == KIND_BYTES:
+                if value is not None:
+                    if isinstance(value, (set, frozenset)):
+                        value = ','.join(value)
+                    if isinstance(value, str):
+                        # binary columns a decoder made text of
+                        value = value.encode(self.encoding if field.charset == 'binary' else 'utf8')
+                    buffer += value
+                values.append(len(buffer))
+                mask.append(value is None)
+                continue
+            if kind != KIND_OBJECT and not isinstance(value, (int, float, datetime.date)):
+                # NULL, or a zero date the decoder left as a string
+                values.append(0)
+                mask.append(1)
+                continue
+            mask.append(0)
+            if kind == KIND_DATETIME:
+                delta = value - _EPOCH
+                value = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+            elif kind == KIND_DATE:
+                value = (value - _EPOCH_DATE).days
+            values.append(value)
+
+    def to_numpy(self):
+        ''' Return the columns as a dict of arrays by name '''
+        import numpy as np
+        arrays = {}
+        for name, kind, values, mask in zip(self.names, self.kinds, self.values, self.masks):
+            if kind == KIND_OBJECT:
+                column = np.empty(len(values), dtype=object)
+                column[:] = values
+            else:
+                if not values:
+                    arrays[name] = np.empty(0, _DTYPES[kind])
+                    continue
+                column = np.frombuffer(values, dtype=_DTYPES[kind])
+                nulls = np.frombuffer(mask, dtype=np.bool_)
+                if nulls.any():
+                    column = np.ma.MaskedArray(column, nulls)
+            arrays[name] = column
+        return arrays
+
+    def to_arrow(self):
+        ''' Return the columns as a pyarrow.RecordBatch '''
+        import numpy as np
+        import pyarrow as pa
+        arrays = []
+        length = len(self)
+        for field, kind, values, mask, buffer in zip(
+            self.fields, self.kinds, self.values, self.masks, self.buffers
+        ):
+            nulls = np.frombuffer(mask, dtype=np.bool_) if length else np.empty(0, np.bool_)
+            null_count = int(nulls.sum())
+            validity = pa.py_buffer(np.packbits(~nulls, bitorder='little')) if null_count else None
+            if kind == KIND_OBJECT:
+                arrays.append(pa.array(values, type=arrow_type(field, kind), from_pandas=False))
+            elif kind == KIND_BYTES:
+                arrays.append(pa.Array.from_buffers(
+                    arrow_type(field, kind), length,
+                    [validity, pa.py_buffer(values), pa.py_buffer(buffer)], null_count
+                ))
+            elif not length:
+                arrays.append(pa.array([], type=arrow_type(field, kind)))
+            else:
+                data = values
+                if kind == KIND_DATE:
+                    data = np.frombuffer(values, dtype=np.int64).astype(np.int32)
+                arrays.append(pa.Array.from_buffers(
+                    arrow_type(field, kind), length, [validity, pa.py_buffer(data)], null_count
+                ))
+        return pa.RecordBatch.from_arrays(arrays, self.names)
+
+
+def arrow_type(field, kind):
+    ''' Return the pyarrow type of a column, None to infer it from the values '''
+    import pyarrow as pa
+    if kind == KIND_INT:
+        return pa.int64()
+    elif kind == KIND_UINT:
+        return pa.uint64()
+    elif kind == KIND_FLOAT:
+        return pa.float64()
+    elif kind == KIND_DATETIME:
+        return pa.timestamp('us')
+    elif kind == KIND_DATE:
+        return pa.date32()
+    elif kind == KIND_BYTES:
+        if field.charset == 'binary' and field.type_code != FIELD_TYPE.JSON:
+            return pa.large_binary()
+        return pa.large_string()
+    elif field.type_code in (FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL):
+        # the length counts the sign and the decimal point
+        precision = field.length - (1 if field.scale else 0) - (0 if field.flags & FLAG.UNSIGNED else 1)
+        precision = max(precision, field.scale, 1)
+        if precision <= 38:
+            return pa.decimal128(precision, field.scale)
+        return pa.decimal256(min(precision, 76), field.scale)
+    elif field.type_code == FIELD_TYPE.TIME:
+        return pa.duration('us')
+    elif field.type_code in TEXT_TYPES and field.charset is not None:
+        if field.charset == 'binary' and field.type_code != FIELD_TYPE.JSON:
+            return pa.binary()
+        return pa.string()
+    return None
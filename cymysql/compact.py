@@ -0,0 +1,58 @@
+'''
+Compact storage of buffered result sets.
+
+With connect(compact_results=True) a buffered result keeps the payloads
+of its row packets in one bytearray, indexed by an array of end offsets,
+instead of a list of tuples of decoded values.  A row is decoded when it
+is fetched, so a result costs about the size of its rows on the wire plus
+eight bytes a row, rows fetched more than once are decoded again.
+'''
+import array
+import collections.abc
+
+from cymysql.packet import MysqlPacket
+
+
+class CompactRows(collections.abc.Sequence):
+    '''
+    The rows of a buffered result as packet payloads, used as
+    MySQLResult.rest_rows.  Rows are made by read_row(packet) if given.
+    '''
+
+    def __init__(self, fields, decoders, charset, encoding, read_row=None):
+        self.fields = fields
+        self.decoders = decoders
+        self.read_row = read_row
+        self.charset = charset
+        self.encoding = encoding
+        self._data = bytearray()
+        self._ends = array.array('Q', [0])
+
+    def __len__(self):
+        return len(self._ends) - 1
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + self._data.__sizeof__() + self._ends.__sizeof__()
+
+    def append_packet(self, data):
+        ''' Append the payload of a row packet '''
+        self._data += data
+        self._ends.append(len(self._data))
+
+    def packet(self, index):
+        ''' Return the packet of the row at index '''
+        return MysqlPacket(
+            bytes(memoryview(self._data)[self._ends[index]:self._ends[index + 1]]),
+            self.charset, self.encoding,
+        )
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("row index out of range")
+        if self.read_row is not None:
+            return self.read_row(self.packet(index))
+        return self.packet(index).read_decode_data(self.fields, self.decoders)
@@ -2,6 +2,8 @@
 #   https://dev.mysql.com/doc/dev/mysql-server/latest/PAGE_PROTOCOL.html
 
 import hashlib
+import random
+import re
 import socket
 import ssl
 import struct
@@ -9,6 +11,7 @@ import sys
 import os
 import stat
 import getpass
+import time
 try:
     from ConfigParser import RawConfigParser
 except ImportError:
@@ -16,18 +19,30 @@ except ImportError:
 
 from cymysql.charset import charset_by_name, encoding_by_charset
 from cymysql.cursors import Cursor
-from cymysql.constants import CLIENT, COMMAND, SERVER_STATUS
-from cymysql.converters import decoders, encoders, escape_item
+from cymysql.constants import CLIENT, COMMAND, SERVER_STATUS, SESSION_TRACK
+from cymysql.converters import decoders, encoders, escape_item, escape_bytes_binary, \
+     BYTES_LITERALS, BINARY_UNSAFE_CHARSETS
 from cymysql.err import Warning, Error, \
      InterfaceError, DataError, DatabaseError, OperationalError, \
      IntegrityError, InternalError, NotSupportedError, ProgrammingError
 from cymysql.packet import MysqlPacket
+from cymysql.prepared import PreparedStatement
+from cymysql.query import QueryBuffer
 from cymysql.result import MySQLResult
-from cymysql.socketwrapper import SocketWrapper
+from cymysql.socketwrapper import SocketWrapper, MAX_PACKET_LENGTH, MIN_COMPRESS_LENGTH
 
 DEFAULT_USER = getpass.getuser()
 DEFAULT_CHARSET = 'utf8mb4'
 
+SESSION_STATEMENT_REGEX = re.compile(
+    r"\s*(?:SET\s+(?:NAMES\s+('[^']*'|\w+)"
+    r"|(?:SESSION\s+|@@SESSION\.|@@)?(\w+)\s*=\s*('[^']*'|\"[^\"]*\"|[\w+:.-]+))"
+    r"|USE\s+`?(\w+)`?)\s*;?\s*$",
+    re.IGNORECASE
+)
+CHARSET_VARIABLES = ('character_set_client', 'character_set_connection', 'character_set_results')
+NUMBER_REGEX = re.compile(r"-?\d+(?:\.\d+)?$")
+
 
 def sha_new(*args, **kwargs):
     return hashlib.new("sha1", *args, **kwargs)
@@ -52,6 +67,32 @@ def pack_int24(n):
     return bytes([n & 0xFF, (n >> 8) & 0xFF, (n >> 16) & 0xFF])
 
 
+def _command_packets(command, sql):
+    '''
+    Return the packets of a command with its argument split into
+    MAX_PACKET_LENGTH sized payloads.  A payload of exactly
+    MAX_PACKET_LENGTH bytes is followed by an empty packet.
+    '''
+    if len(sql) + 1 < MAX_PACKET_LENGTH:
+        return [struct.pack('<i', len(sql) + 1) + int2bytes(command) + sql]
+    view = memoryview(sql)
+    packets = [b'\xff\xff\xff\x00' + int2bytes(command), view[:MAX_PACKET_LENGTH - 1]]
+    start = MAX_PACKET_LENGTH - 1
+    seq = 1
+    while True:
+        chunk = view[start:start + MAX_PACKET_LENGTH]
+        packets.append(pack_int24(len(chunk)) + int2bytes(seq & 0xFF))
+        packets.append(chunk)
+        if len(chunk) < MAX_PACKET_LENGTH:
+            return packets
+        start += MAX_PACKET_LENGTH
+        seq += 1
+
+
+def _no_cursor():
+    return None
+
+
 SCRAMBLE_LENGTH = 20
 
 
@@ -118,7 +159,10 @@ class Connection(object):
                  client_flag=0, cursorclass=None, init_command=None,
                  connect_timeout=None, ssl=None, read_default_group=None,
                  compression_algorithm="", zstd_compression_level=3, named_pipe=None,
-                 conv=decoders, encoders=encoders):
+                 zlib_compression_level=-1, compression_threshold=MIN_COMPRESS_LENGTH,
+                 track_gtids=False, reconnect_attempts=3, reconnect_delay=0.1,
+                 reconnect_max_delay=5, on_reconnect=None, bytes_literal='0x',
+                 query_cache=None, compact_results=False, conv=decoders, encoders=encoders):
         """
         Establish a connection to the MySQL database. Accepts several
         arguments:
@@ -141,7 +185,18 @@ class Connection(object):
         read_default_group: Group to read from in the configuration file.
         compression_algorithm: Compression algorithm ("zlib" or "zstd").
         zstd_compression_level: zstd compression leve (1-22), default is 3.
+        zlib_compression_level: zlib compression level (0-9), default is -1 (zlib's default).
+        compression_threshold: Packets shorter than this are sent uncompressed, default is 50.
         named_pipe: Not supported
+        track_gtids: Track the GTIDs of the transactions committed by this session (causal_token).
+        reconnect_attempts: Number of connection attempts made by ping(reconnect=True).
+        reconnect_delay: Base delay of the exponential backoff between reconnect attempts.
+        reconnect_max_delay: Upper limit of the delay between reconnect attempts.
+        on_reconnect: Callable called with the connection after each successful reconnect.
+        bytes_literal: How bytes are escaped, "0x" (0x616263), "X" (X'616263) or "_binary" (_binary'abc').
+            "_binary" is refused with the big5, cp932, gb18030, gbk and sjis charsets.
+        query_cache: A cymysql.cache.QueryCache for the results of read only statements, may be shared.
+        compact_results: Keep buffered results as row packets and decode each row when it is fetched.
         """
         if named_pipe:
             raise NotImplementedError("named_pipe argument are not supported")
@@ -152,8 +207,13 @@ class Connection(object):
         if compression_algorithm and compression_algorithm not in ("zlib", "zstd"):
             raise NotImplementedError('compression_algorithm argument can set zlib or zstd')
 
+        if bytes_literal not in BYTES_LITERALS:
+            raise NotImplementedError('bytes_literal argument can set 0x, X or _binary')
+
         self.compress = compression_algorithm
         self.zstd_compression_level = zstd_compression_level
+        self.zlib_compression_level = zlib_compression_level
+        self.compression_threshold = compression_threshold
         self.socket = None
         self.ssl = False
         if ssl:
@@ -216,12 +276,18 @@ class Connection(object):
         self.db = db
         self.unix_socket = unix_socket
         self.conv = conv
+        if BYTES_LITERALS[bytes_literal] is not encoders.get(bytes):
+            encoders = dict(encoders)
+            for t in (bytes, bytearray, memoryview):
+                encoders[t] = BYTES_LITERALS[bytes_literal]
         self.encoders = encoders
         self.charset = charset if charset else DEFAULT_CHARSET
         self.encoding = encoding_by_charset(self.charset)
+        self._check_bytes_literal(self.charset)
 
         client_flag |= CLIENT.CAPABILITIES
         client_flag |= CLIENT.MULTI_STATEMENTS
+        client_flag |= CLIENT.SESSION_TRACK
         if self.db:
             client_flag |= CLIENT.CONNECT_WITH_DB
         # self.client_flag |= CLIENT.DEPRECATE_EOF
@@ -235,26 +301,100 @@ class Connection(object):
         self.connect_timeout = connect_timeout
         self.messages = []
         self._result = None
+        # weak reference to the cursor which executed the last statement
+        self._last_execute_cursor = _no_cursor
 
         self.sql_mode = sql_mode
         self.init_command = init_command
+        self.track_gtids = track_gtids
+        self.query_cache = query_cache
+        # tables written by the open transaction, invalidated again when it ends
+        self._written_tables = set()
+        self.compact_results = compact_results
+        self.session_variables = {}
+        self.causal_token = None
+        self._session_charset = None
+
+        self.reconnect_attempts = reconnect_attempts
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.reconnect_listeners = [on_reconnect] if on_reconnect else []
+        self.reconnects = 0
 
     def _initialize(self):
         self._get_server_information()
         self._request_authentication()
-        self.set_charset(self.charset)
-
-        self.autocommit(False)
+        self._bootstrap(False)
 
+    def _bootstrap_query(self, autocommit):
+        ''' Build the statements which set up the session in one round trip '''
+        statements = ["SET NAMES %s" % (self.escape(self.charset), )]
         if self.sql_mode is not None:
-            c = self.cursor()
-            c.execute("SET sql_mode=%s", (self.sql_mode,))
-
+            statements.append("SET sql_mode=%s" % (self.escape(self.sql_mode), ))
+        if self.track_gtids:
+            statements.append("SET SESSION session_track_gtids='OWN_GTID'")
         if self.init_command is not None:
-            c = self.cursor()
-            c.execute(self.init_command)
+            statements.append(self.init_command)
+            statements.append("COMMIT")
+        for name, value in self.session_variables.items():
+            if name in CHARSET_VARIABLES or name == 'autocommit':
+                continue
+            if NUMBER_REGEX.match(value) is None:
+                value = self.escape(value)
+            statements.append("SET SESSION %s=%s" % (name, value))
+        statements.append("SET AUTOCOMMIT = %d" % (int(bool(autocommit)), ))
+        return ";".join(statements)
+
+    def _bootstrap(self, autocommit):
+        self.query(self._bootstrap_query(autocommit))
+        while self._result.has_next:
+            self.next_result()
+        self._result = None
+        self.encoding = encoding_by_charset(self.charset)
+        self._session_charset = self.charset
+
+    def _reconnect_wait(self, attempt):
+        ''' Sleep for an exponential backoff with full jitter '''
+        time.sleep(random.uniform(
+            0, min(self.reconnect_max_delay, self.reconnect_delay * 2 ** attempt)
+        ))
+
+    def _close_socket(self):
+        if self.socket is not None:
+            try:
+                self.socket.close()
+            except Exception:
+                pass
+            self.socket = None
 
-            self.commit()
+    def _reconnect(self):
+        ''' Open a new session and restore the state of the lost one '''
+        in_trans = bool(self.server_status is not None and self.get_transaction_status())
+        autocommit = bool(self.server_status is not None and self.get_autocommit())
+        self._close_socket()
+        if self.db:
+            self.client_flag |= CLIENT.CONNECT_WITH_DB
+        attempt = 0
+        while True:
+            try:
+                self._connect()
+                self._get_server_information()
+                self._request_authentication()
+                break
+            except OperationalError:
+                self._close_socket()
+                attempt += 1
+                if attempt >= self.reconnect_attempts:
+                    raise
+                self._reconnect_wait(attempt)
+        self._bootstrap(autocommit)
+        self.reconnects += 1
+        for listener in self.reconnect_listeners:
+            listener(self)
+        if in_trans:
+            raise OperationalError(
+                2013, "Lost connection to MySQL server, the transaction was rolled back"
+            )
 
     def close(self):
         ''' Send the quit message and close the socket '''
@@ -271,13 +411,15 @@ class Connection(object):
 
     def autocommit(self, value):
         ''' Set whether or not to commit after every execute() '''
+        if self.server_status is not None and self.get_autocommit() == bool(value):
+            return
         if value:
             q = "SET AUTOCOMMIT = 1"
         else:
             q = "SET AUTOCOMMIT = 0"
         try:
             self._execute_command(COMMAND.COM_QUERY, q)
-            self.read_packet()
+            self._read_ok_packet()
         except:
             exc, value, tb = sys.exc_info()
             self.errorhandler(None, exc, value)
@@ -286,7 +428,8 @@ class Connection(object):
         ''' Commit changes to stable storage '''
         try:
             self._execute_command(COMMAND.COM_QUERY, "COMMIT")
-            self.read_packet()
+            self._read_ok_packet()
+            self._end_cached_transaction()
         except:
             exc, value, tb = sys.exc_info()
             self.errorhandler(None, exc, value)
@@ -295,7 +438,8 @@ class Connection(object):
         ''' Roll back the current transaction '''
         try:
             self._execute_command(COMMAND.COM_QUERY, "ROLLBACK")
-            self.read_packet()
+            self._read_ok_packet()
+            self._end_cached_transaction()
         except:
             exc, value, tb = sys.exc_info()
             self.errorhandler(None, exc, value)
@@ -308,6 +452,10 @@ class Connection(object):
         ''' Alias for escape() '''
         return escape_item(obj, self.charset, self.encoders)
 
+    def prepare(self, sql):
+        ''' Prepare sql, with ? placeholders, as a server side statement '''
+        return PreparedStatement(self, sql)
+
     def cursor(self, cursor=None):
         ''' Create a new cursor to execute queries with '''
         if cursor is None:
@@ -335,15 +483,108 @@ class Connection(object):
     def _is_connect(self):
         return bool(self.socket)
 
+    def select_db(self, db):
+        ''' Set current db with COM_INIT_DB '''
+        if self.session_track and db == self.db:
+            return
+        try:
+            self._execute_command(COMMAND.COM_INIT_DB, db)
+            self._read_ok_packet()
+            self.db = db
+        except:
+            exc, value, tb = sys.exc_info()
+            self.errorhandler(None, exc, value)
+
+    def _is_redundant(self, sql):
+        ''' Return True if sql only sets session state the server already has '''
+        if len(sql) > 256:
+            return False
+        if isinstance(sql, QueryBuffer):
+            sql = bytes(sql)
+        if sql.lstrip()[:3].upper() not in ('SET', 'USE', b'SET', b'USE'):
+            return False
+        if not isinstance(sql, str):
+            try:
+                sql = sql.decode(self.encoding)
+            except UnicodeDecodeError:
+                # raw bytes of a _binary literal
+                return False
+        m = SESSION_STATEMENT_REGEX.match(sql)
+        if m is None:
+            return False
+        charset, name, value, db = m.groups()
+        if charset is not None:
+            return self.session_track and self._session_charset == charset.strip("'").lower()
+        if db is not None:
+            return self.session_track and self.db == db
+        value = value.strip("'\"")
+        if name.lower() == 'autocommit':
+            value = value.upper()
+            return value in ('0', '1', 'OFF', 'ON') and self.get_autocommit() == (value in ('1', 'ON'))
+        return self.session_track and self.session_variables.get(name.lower()) == value
+
+    def _redundant_result(self):
+        result = MySQLResult(self)
+        result.affected_rows = 0
+        return result
+
+    def _cached_result(self, entry):
+        result = MySQLResult(self)
+        result.description = entry.description
+        result.rest_rows = entry.rows
+        result.has_result = True
+        return result
+
+    def _cache_key(self, sql, unbuffered):
+        ''' Return the query cache key of sql, None if its result is not cached '''
+        if self.query_cache is None or unbuffered:
+            return None
+        return self.query_cache.key(self, sql)
+
+    def _cache_result(self, key, sql):
+        ''' Cache the result of sql, or invalidate what a write changed '''
+        if key is None:
+            if self.query_cache is None:
+                pass
+            elif len(self.query_cache) or self.get_transaction_status():
+                self._written_tables.update(self.query_cache.invalidate_statement(sql))
+                self._end_cached_transaction()
+            else:
+                # nothing is cached which the statement could have changed
+                self._written_tables.clear()
+        elif self._result.has_result and not self._result.has_next:
+            self.query_cache.put(key, self._result.description, self._result.rest_rows)
+
+    def _end_cached_transaction(self):
+        '''
+        Invalidate the tables written by a transaction again once it ended,
+        other connections may have cached their rows before the commit
+        '''
+        if self._written_tables and not self.get_transaction_status():
+            self.query_cache.invalidate(*self._written_tables)
+            self._written_tables.clear()
+
     # The following methods are INTERNAL USE ONLY (called from Cursor)
-    def query(self, sql):
+    def query(self, sql, unbuffered=False, row_reader=None):
+        if self._is_redundant(sql):
+            self._result = self._redundant_result()
+            return
+        key = self._cache_key(sql, unbuffered)
+        if key is not None:
+            entry = self.query_cache.get(key)
+            if entry is not None:
+                self._result = self._cached_result(entry)
+                return
+            # the cache keeps rows as tuples
+            row_reader = None
         self._execute_command(COMMAND.COM_QUERY, sql)
-        self._result = MySQLResult(self)
-        self._result.read_result()
+        self._result = MySQLResult(self, row_reader)
+        self._result.read_result(unbuffered)
+        self._cache_result(key, sql)
 
-    def next_result(self):
-        self._result = MySQLResult(self)
-        self._result.read_result()
+    def next_result(self, unbuffered=False, row_reader=None):
+        self._result = MySQLResult(self, row_reader)
+        self._result.read_result(unbuffered)
 
     def affected_rows(self):
         if self._result:
@@ -363,28 +604,38 @@ class Connection(object):
         return False
 
     def ping(self, reconnect=True):
-        ''' Check if the server is alive '''
+        ''' Check if the server is alive, reconnect and restore the session if not '''
         try:
             self._execute_command(COMMAND.COM_PING, "")
+            pkt = self._read_ok_packet()
         except:
             if reconnect:
-                self._connect()
+                self._reconnect()
                 return self.ping(False)
             else:
                 exc, value, tb = sys.exc_info()
                 self.errorhandler(None, exc, value)
                 return
 
-        pkt = self.read_packet()
         return pkt.is_ok_packet()
 
+    def _check_bytes_literal(self, charset):
+        ''' Refuse charsets in which _binary literals can be broken out of '''
+        if self.encoders.get(bytes) is escape_bytes_binary and charset in BINARY_UNSAFE_CHARSETS:
+            raise NotSupportedError("bytes_literal='_binary' can not be used with charset %s" % (charset, ))
+
     def set_charset(self, charset):
+        if charset == self._session_charset:
+            return
         try:
             if charset:
+                self._check_bytes_literal(charset)
                 self._execute_command(COMMAND.COM_QUERY, "SET NAMES %s" %
                                       self.escape(charset))
-                self.read_packet()
+                self._read_ok_packet()
                 self.charset = charset
+                self.encoding = encoding_by_charset(charset)
+                self._session_charset = charset
         except:
             exc, value, tb = sys.exc_info()
             self.errorhandler(None, exc, value)
@@ -411,14 +662,46 @@ class Connection(object):
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
         return sock
 
+    def _compress_level(self):
+        if self.compress == "zstd":
+            return self.zstd_compression_level
+        return self.zlib_compression_level
+
     def _connect(self):
-        self.socket = SocketWrapper(self._get_socket(), self.compress)
+        self.socket = SocketWrapper(
+            self._get_socket(), self.compress, self._compress_level(), self.compression_threshold
+        )
 
     def read_packet(self):
         """Read an entire "mysql packet" in its entirety from the network
         and return a MysqlPacket type that represents the results."""
         return MysqlPacket(self.socket.recv_packet(), self.charset, self.encoding)
 
+    def _read_ok_packet(self):
+        pkt = self.read_packet()
+        if pkt.is_ok_packet():
+            self._update_session_state(pkt, pkt.read_ok_packet(self.session_track)[2])
+        return pkt
+
+    @property
+    def session_track(self):
+        return bool(self.client_flag & self.server_capabilities & CLIENT.SESSION_TRACK)
+
+    def _update_session_state(self, pkt, server_status):
+        ''' Apply server status and session state changes of an OK packet '''
+        self.server_status = server_status
+        if not (server_status & SERVER_STATUS.SERVER_SESSION_STATE_CHANGED and self.session_track):
+            return
+        for kind, value in pkt.read_session_state():
+            if kind == SESSION_TRACK.SYSTEM_VARIABLES:
+                self.session_variables[value[0]] = value[1]
+                if value[0] in CHARSET_VARIABLES and value[1] != self._session_charset:
+                    self._session_charset = None
+            elif kind == SESSION_TRACK.SCHEMA:
+                self.db = value
+            elif kind == SESSION_TRACK.GTIDS and value:
+                self.causal_token = value
+
     def insert_id(self):
         if self._result:
             return self._result.insert_id
@@ -429,13 +712,16 @@ class Connection(object):
         if not self.socket:
             self.errorhandler(None, InterfaceError, (-1, 'socket not found'))
 
-        if isinstance(sql, str):
+        if isinstance(sql, QueryBuffer):
+            packet = sql.packet(command)
+            if packet is not None:
+                self.socket.send_packet(packet)
+                return
+            sql = sql.statement()
+        elif isinstance(sql, str):
             sql = sql.encode(self.encoding)
 
-        if len(sql) + 1 > 0xffffff:
-            raise ValueError('Sending query packet is too large')
-        prelude = struct.pack('<i', len(sql)+1) + int2bytes(command)
-        self.socket.send_packet(prelude + sql)
+        self.socket.send_packets(_command_packets(command, sql))
 
     def _scramble(self):
         if self.auth_plugin_name in ('', 'mysql_native_password'):
@@ -605,6 +891,9 @@ class Connection(object):
     def get_transaction_status(self):
         return bool(self.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS)
 
+    def get_autocommit(self):
+        return bool(self.server_status & SERVER_STATUS.SERVER_STATUS_AUTOCOMMIT)
+
     def get_server_info(self):
         return self.server_version
 
@@ -9,3 +9,7 @@ SERVER_STATUS_LAST_ROW_SENT = 128
 SERVER_STATUS_DB_DROPPED = 256
 SERVER_STATUS_NO_BACKSLASH_ESCAPES = 512
 SERVER_STATUS_METADATA_CHANGED = 1024
+SERVER_QUERY_WAS_SLOW = 2048
+SERVER_PS_OUT_PARAMS = 4096
+SERVER_STATUS_IN_TRANS_READONLY = 8192
+SERVER_SESSION_STATE_CHANGED = 16384
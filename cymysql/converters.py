@@ -3,23 +3,54 @@ import datetime
 import time
 import decimal
 
+from cymysql.charset import encoding_by_charset
 from cymysql.constants import FIELD_TYPE
 
 ESCAPE_REGEX = re.compile(r"[\0\n\r\032\'\"\\]")
 ESCAPE_MAP = {'\0': '\\0', '\n': '\\n', '\r': '\\r', '\032': '\\Z',
               '\'': '\\\'', '"': '\\"', '\\': '\\\\'}
 
+# str.translate() table, indexed by code point.  translate() is faster than
+# ESCAPE_REGEX on ASCII text only, it is 4-6 times slower on other text
+# (20k calls on 160 CJK characters: 0.28s against 0.04s for the regex)
+ESCAPE_TABLE = [chr(i) for i in range(128)]
+for _c, _escaped in ESCAPE_MAP.items():
+    ESCAPE_TABLE[ord(_c)] = _escaped
+del _c, _escaped
 
-def escape_dict(val, charset):
-    return dict([(k, escape_item(v, charset)) for k, v in val.items()])
+# charsets with multibyte characters whose trailing byte can be a backslash,
+# which would swallow the backslash escaping a quote after a raw 0x80-0xff
+# byte of a _binary literal
+BINARY_UNSAFE_CHARSETS = frozenset(['big5', 'cp932', 'gb18030', 'gbk', 'sjis'])
 
 
-def escape_sequence(val, charset):
-    return "(" + ",".join([escape_item(v, charset) for v in val]) + ")"
+def _join_escaped(items, charset, prefix='', suffix=''):
+    ''' Join escaped items, as bytes if there are _binary literals among them '''
+    for item in items:
+        if isinstance(item, bytes):
+            encoding = encoding_by_charset(charset)
+            return prefix.encode(encoding) + b','.join([
+                item if isinstance(item, bytes) else item.encode(encoding) for item in items
+            ]) + suffix.encode(encoding)
+    return prefix + ','.join(items) + suffix
 
 
-def escape_set(val, charset):
-    return ",".join([escape_item(v, charset) for v in val])
+def _escape_items(val, charset, encoders):
+    if encoders is None:
+        return [escape_item(v, charset) for v in val]
+    return [escape_item(v, charset, encoders) for v in val]
+
+
+def escape_dict(val, charset, encoders=None):
+    return dict(zip(val.keys(), _escape_items(val.values(), charset, encoders)))
+
+
+def escape_sequence(val, charset, encoders=None):
+    return _join_escaped(_escape_items(val, charset, encoders), charset, "(", ")")
+
+
+def escape_set(val, charset, encoders=None):
+    return _join_escaped(_escape_items(val, charset, encoders), charset)
 
 
 def escape_bool(value):
@@ -37,15 +68,40 @@ def escape_float(value):
     return ('%.15g' % value)
 
 
+def _escape_match(match):
+    return ESCAPE_MAP[match.group(0)]
+
+
 def escape_string(value):
-    return ("'%s'" % ESCAPE_REGEX.sub(
-            lambda match: ESCAPE_MAP.get(match.group(0)), value))
+    if value.isascii():
+        return "'" + value.translate(ESCAPE_TABLE) + "'"
+    return "'" + ESCAPE_REGEX.sub(_escape_match, value) + "'"
 
 
 def escape_bytes(value):
     if len(value) == 0:
         return "''"
-    return '0x' + ''.join([('0'+hex(c)[2:])[-2:] for c in value])
+    return '0x' + value.hex()
+
+
+def escape_bytes_x(value):
+    return "X'" + value.hex() + "'"
+
+
+def escape_bytes_binary(value):
+    # bytes, the raw bytes 0x80-0xff are not text of the connection charset
+    value = (
+        bytes(value).replace(b'\\', b'\\\\').replace(b"'", b"\\'").replace(b'"', b'\\"')
+        .replace(b'\0', b'\\0').replace(b'\n', b'\\n').replace(b'\r', b'\\r').replace(b'\032', b'\\Z')
+    )
+    return b"_binary'" + value + b"'"
+
+
+BYTES_LITERALS = {
+    '0x': escape_bytes,
+    'X': escape_bytes_x,
+    '_binary': escape_bytes_binary,
+}
 
 
 def escape_None(value):
@@ -328,7 +384,9 @@ decoders = {
 }
 
 encoders = {
-        bytes:escape_bytes,
+        bytes: escape_bytes,
+        bytearray: escape_bytes,
+        memoryview: escape_bytes,
         bool: escape_bool,
         int: escape_int,
         float: escape_float,
@@ -354,12 +412,14 @@ except ImportError:
 
 
 def escape_item(val, charset, encoders=encoders):
-    if type(val) in [tuple, list, set]:
-        return escape_sequence(val, charset)
-    if type(val) is dict:
-        return escape_dict(val, charset)
     f = encoders.get(type(val))
     if f is None:
-        val = str(val)
-        f = escape_string
+        if type(val) in (tuple, list, set):
+            f = escape_sequence
+        elif type(val) is dict:
+            f = escape_dict
+        else:
+            return escape_string(str(val))
+    if f is escape_sequence or f is escape_dict or f is escape_set:
+        return f(val, charset, encoders)
     return f(val)
@@ -7,12 +7,32 @@ from cymysql.err import (
     DatabaseError, OperationalError, IntegrityError, InternalError,
     NotSupportedError, ProgrammingError
 )
+from cymysql.columnar import Columns, DescriptionField
+from cymysql.jsonrows import JsonRows
+from cymysql.query import build_query, QueryBuffer
+from cymysql.rows import (
+    LazyRow, RowLayout, RowMapping, dict_row_reader, lazy_row_reader, row_mapping_reader,
+    namedtuple_row_reader, namedtuple_row_type, RowPlan, row_plan_reader,
+)
+
+
+def _statement_bytes(query):
+    if isinstance(query, QueryBuffer):
+        return bytes(query)
+    return query
 
 
 class Cursor(object):
     '''
     This is the object you use to interact with the database.
     '''
+    _unbuffered = False
+    # row_reader(fields, decoders, encoding) of the results, None for tuples
+    _row_reader = None
+    # the statements as sent, a QueryBuffer is only copied to bytes when read
+    _executed_query = None
+    _last_query = None
+
     def __init__(self, connection):
         '''
         Do not create an instance of a Cursor yourself. Call
@@ -24,6 +44,7 @@ class Cursor(object):
         self.messages = []
         self._result = None
         self._rowcount = None
+        self._weakref = weakref.ref(self)
 
     def __enter__(self):
         return self
@@ -56,6 +77,22 @@ class Cursor(object):
     def lastrowid(self):
         return self._result.insert_id if self._result else None
 
+    @property
+    def _executed(self):
+        return _statement_bytes(self._executed_query)
+
+    @_executed.setter
+    def _executed(self, query):
+        self._executed_query = query
+
+    @property
+    def _last_executed(self):
+        return _statement_bytes(self._last_query)
+
+    @_last_executed.setter
+    def _last_executed(self, query):
+        self._last_query = query
+
     def close(self):
         '''
         Closing a cursor just exhausts all remaining data.
@@ -76,7 +113,7 @@ class Cursor(object):
         return self.connection
 
     def _check_executed(self):
-        if not self._executed:
+        if not self._executed_query:
             self.errorhandler(ProgrammingError, (-1, "execute() first"))
 
     def _flush(self):
@@ -91,14 +128,14 @@ class Cursor(object):
 
     def nextset(self):
         ''' Get the next query set '''
-        if self._executed:
+        if self._executed_query:
             self.fetchall()
         del self.messages[:]
 
         if not self._result or not self._result.has_next:
             return None
         connection = self._get_db()
-        connection.next_result()
+        connection.next_result(self._unbuffered, self._row_reader)
         self._do_get_result()
         return True
 
@@ -107,26 +144,14 @@ class Cursor(object):
         self._rowcount = None
 
         conn = self._get_db()
-        if hasattr(conn, '_last_execute_cursor') and not conn._last_execute_cursor() is None:
-            conn._last_execute_cursor()._flush()
+        last = conn._last_execute_cursor()
+        if last is not None:
+            last._flush()
 
-        encoding = conn.encoding
         del self.messages[:]
 
-        if not isinstance(query, str):
-            query = query.decode(encoding)
-
         if args is not None:
-            if isinstance(args, (tuple, list)):
-                escaped_args = tuple(conn.escape(arg) for arg in args)
-            elif isinstance(args, dict):
-                escaped_args = dict((key, conn.escape(val)) for (key, val) in args.items())
-            else:
-                # If it's not a dictionary let's try escaping it anyways.
-                # Worst case it will throw a Value error
-                escaped_args = conn.escape(args)
-
-            query = query % escaped_args
+            query = build_query(query, args, conn.escape, conn.encoding)
 
         try:
             self._query(query)
@@ -136,8 +161,9 @@ class Cursor(object):
             self.messages.append((exc, value))
             self.errorhandler(exc, value)
 
-        self._executed = query
-        conn._last_execute_cursor = weakref.ref(self)
+        self._executed_query = self._last_query
+        if last is not self:
+            conn._last_execute_cursor = self._weakref
 
     def executemany(self, query, args):
         ''' Run several data against one query '''
@@ -182,9 +208,12 @@ class Cursor(object):
         """
         conn = self._get_db()
         for index, arg in enumerate(args):
-            q = "SET @_%s_%d=%s" % (procname, index, conn.escape(arg))
-            if not isinstance(q, str):
-                q = q.decode(conn.encoding)
+            q = "SET @_%s_%d=" % (procname, index)
+            value = conn.escape(arg)
+            if isinstance(value, bytes):
+                q = q.encode(conn.encoding) + value
+            else:
+                q += value
             self._query(q)
             self.nextset()
 
@@ -214,7 +243,7 @@ class Cursor(object):
         result = []
         for i in range(size):
             r = self._result.fetchone()
-            if not r:
+            if r is None:
                 break
             result.append(r)
         return result
@@ -227,16 +256,85 @@ class Cursor(object):
         result = []
 
         r = self._result.fetchone()
-        while r:
+        while r is not None:
             result.append(r)
             r = self._result.fetchone()
 
         return result
 
+    def _columns(self, raw_text=False):
+        conn = self._get_db()
+        fields = self._result.fields
+        if fields is None:
+            # results of the query cache have no field packets
+            fields = [DescriptionField(column) for column in self.description]
+        return Columns(fields, conn.conv, conn.encoding, raw_text)
+
+    def fetchmany_numpy(self, size=None):
+        ''' Fetch several rows as a dict of NumPy arrays, see cymysql.columnar '''
+        self._check_executed()
+        if self._result is None or not self._result.has_result:
+            return None
+        columns = self._columns()
+        self._result.fetch_columns(columns, size or self.arraysize)
+        return columns.to_numpy()
+
+    def fetch_numpy(self):
+        ''' Fetch all the rows as a dict of NumPy arrays, see cymysql.columnar '''
+        self._check_executed()
+        if self._result is None or not self._result.has_result:
+            return None
+        columns = self._columns()
+        self._result.fetch_columns(columns)
+        return columns.to_numpy()
+
+    def fetch_arrow_batches(self, batch_size=65536):
+        '''
+        Yield the rest of the rows as pyarrow.RecordBatch objects of up
+        to batch_size rows, see cymysql.columnar
+        '''
+        self._check_executed()
+        if self._result is None or not self._result.has_result:
+            return
+        while True:
+            columns = self._columns(True)
+            if not self._result.fetch_columns(columns, batch_size):
+                break
+            yield columns.to_arrow()
+
+    def _json_rows(self, objects):
+        # results of the query cache have no fields
+        return JsonRows(self.description, self._result.fields, objects)
+
+    def fetch_json(self, objects=True):
+        '''
+        Fetch all the rows as UTF-8 JSON, an array of objects or of arrays,
+        see cymysql.jsonrows
+        '''
+        self._check_executed()
+        if self._result is None or not self._result.has_result:
+            return None
+        rows = self._json_rows(objects)
+        self._result.fetch_json(rows)
+        return rows.take(True)
+
+    def stream_json(self, batch_size=1000, objects=True):
+        '''
+        Yield the rest of the rows as pieces of a UTF-8 JSON array of up
+        to batch_size rows, see cymysql.jsonrows
+        '''
+        self._check_executed()
+        if self._result is None or not self._result.has_result:
+            return
+        rows = self._json_rows(objects)
+        while self._result.fetch_json(rows, batch_size):
+            yield rows.take()
+        yield rows.take(True)
+
     def _query(self, q):
         conn = self._get_db()
-        self._last_executed = q
-        conn.query(q)
+        self._last_query = q
+        conn.query(q, self._unbuffered, self._row_reader)
         self._do_get_result()
 
     def _do_get_result(self):
@@ -257,6 +355,7 @@ class Cursor(object):
 
 class DictCursor(Cursor):
     """A cursor which returns results as a dictionary"""
+    _row_reader = staticmethod(dict_row_reader)
 
     def execute(self, query, args=None):
         result = super(DictCursor, self).execute(query, args)
@@ -264,6 +363,12 @@ class DictCursor(Cursor):
             self._fields = [field[0] for field in self.description]
         return result
 
+    def _dict_rows(self, rows):
+        # rows of the query cache are tuples
+        if rows and type(rows[0]) is not dict:
+            return tuple([dict(zip(self._fields, r)) for r in rows])
+        return tuple(rows)
+
     def fetchone(self):
         ''' Fetch the next row '''
         self._check_executed()
@@ -272,21 +377,215 @@ class DictCursor(Cursor):
         r = super(DictCursor, self).fetchone()
         if not r:
             return None
-        return dict(zip(self._fields, r))
+        if type(r) is not dict:
+            return dict(zip(self._fields, r))
+        return r
 
     def fetchmany(self, size=None):
         ''' Fetch several rows '''
         self._check_executed()
         if self._result is None:
             return None
-        result = [dict(zip(self._fields, r)) for r in super(DictCursor, self).fetchmany(size)]
-        return tuple(result)
+        return self._dict_rows(super(DictCursor, self).fetchmany(size))
 
     def fetchall(self):
         ''' Fetch all the rows '''
         self._check_executed()
         if self._result is None:
             return None
-        return tuple([
-            dict(zip(self._fields, r)) for r in super(DictCursor, self).fetchall()
-        ])
+        return self._dict_rows(super(DictCursor, self).fetchall())
+
+
+class SSCursor(Cursor):
+    '''
+    An unbuffered cursor.  Rows are read from the server as they are
+    fetched, the connection can not run other statements until the
+    result is read to the end.
+    '''
+    _unbuffered = True
+
+
+class SSDictCursor(DictCursor):
+    """An unbuffered cursor which returns results as a dictionary"""
+    _unbuffered = True
+
+
+class LazyRowCursor(Cursor):
+    """
+    A cursor which returns rows as cymysql.rows.LazyRow, decoding a column
+    when it is first read
+    """
+    _row_reader = staticmethod(lazy_row_reader)
+
+    def _do_get_result(self):
+        super(LazyRowCursor, self)._do_get_result()
+        self._layout = None
+
+    def _lazy_row(self, row):
+        # rows of the query cache are tuples of decoded values
+        if row is None or isinstance(row, LazyRow):
+            return row
+        if self._layout is None:
+            self._layout = RowLayout([field[0] for field in self.description])
+        return LazyRow.from_values(self._layout, row)
+
+    def fetchone(self):
+        ''' Fetch the next row '''
+        return self._lazy_row(super(LazyRowCursor, self).fetchone())
+
+    def fetchmany(self, size=None):
+        ''' Fetch several rows '''
+        rows = super(LazyRowCursor, self).fetchmany(size)
+        if rows is None:
+            return None
+        return [self._lazy_row(r) for r in rows]
+
+    def fetchall(self):
+        ''' Fetch all the rows '''
+        rows = super(LazyRowCursor, self).fetchall()
+        if rows is None:
+            return None
+        return [self._lazy_row(r) for r in rows]
+
+
+class SSLazyRowCursor(LazyRowCursor):
+    """An unbuffered cursor which returns rows as cymysql.rows.LazyRow"""
+    _unbuffered = True
+
+
+class RowMappingCursor(Cursor):
+    """
+    A cursor which returns rows as cymysql.rows.RowMapping, read only
+    mappings sharing the column names of the result
+    """
+    _row_reader = staticmethod(row_mapping_reader)
+
+    def _do_get_result(self):
+        super(RowMappingCursor, self)._do_get_result()
+        self._layout = None
+
+    def _mapping(self, row):
+        # rows of the query cache are tuples
+        if row is None or isinstance(row, RowMapping):
+            return row
+        if self._layout is None:
+            self._layout = RowLayout([field[0] for field in self.description])
+        return RowMapping(self._layout, row)
+
+    def fetchone(self):
+        ''' Fetch the next row '''
+        return self._mapping(super(RowMappingCursor, self).fetchone())
+
+    def fetchmany(self, size=None):
+        ''' Fetch several rows '''
+        rows = super(RowMappingCursor, self).fetchmany(size)
+        if rows is None:
+            return None
+        return [self._mapping(r) for r in rows]
+
+    def fetchall(self):
+        ''' Fetch all the rows '''
+        rows = super(RowMappingCursor, self).fetchall()
+        if rows is None:
+            return None
+        return [self._mapping(r) for r in rows]
+
+
+class SSRowMappingCursor(RowMappingCursor):
+    """An unbuffered cursor which returns rows as cymysql.rows.RowMapping"""
+    _unbuffered = True
+
+
+class NamedTupleCursor(Cursor):
+    """
+    A cursor which returns rows as namedtuples, of a type made once per
+    tuple of column names, see cymysql.rows.namedtuple_row_type
+    """
+    _row_reader = staticmethod(namedtuple_row_reader)
+
+    def _named(self, rows):
+        # rows of the query cache are plain tuples
+        if rows and type(rows[0]) is tuple:
+            make = namedtuple_row_type(tuple([field[0] for field in self.description]))._make
+            return [make(r) for r in rows]
+        return rows
+
+    def fetchone(self):
+        ''' Fetch the next row '''
+        r = super(NamedTupleCursor, self).fetchone()
+        if type(r) is tuple:
+            return self._named([r])[0]
+        return r
+
+    def fetchmany(self, size=None):
+        ''' Fetch several rows '''
+        return self._named(super(NamedTupleCursor, self).fetchmany(size))
+
+    def fetchall(self):
+        ''' Fetch all the rows '''
+        return self._named(super(NamedTupleCursor, self).fetchall())
+
+
+class SSNamedTupleCursor(NamedTupleCursor):
+    """An unbuffered cursor which returns rows as namedtuples"""
+    _unbuffered = True
+
+
+class TypedCursor(Cursor):
+    """
+    A cursor which builds rows with the row_factory given to execute(),
+    called with the columns matching its parameters by name, see
+    cymysql.rows.RowPlan.  The factory and converters are kept for later
+    queries, without a factory rows are tuples.
+    """
+    row_factory = None
+    converters = None
+
+    def execute(self, query, args=None, row_factory=None, converters=None):
+        ''' Execute a query, building its rows with row_factory '''
+        if row_factory is not None:
+            self.row_factory = row_factory
+            self.converters = converters
+            self._row_reader = row_plan_reader(row_factory, converters)
+        return super(TypedCursor, self).execute(query, args)
+
+    def _do_get_result(self):
+        super(TypedCursor, self)._do_get_result()
+        self._plan = None
+        plan = self._result.read_row
+        if isinstance(plan, RowPlan) and plan.missing:
+            # read the rows of an unbuffered result, ready for the next query
+            self._result.read_rest_rowdata_packet()
+            self.errorhandler(ProgrammingError, (-1, "no column for %s of %r" % (
+                ', '.join(plan.missing), self.row_factory
+            )))
+
+    def _typed(self, rows):
+        # rows of the query cache are tuples
+        if self.row_factory is None or not rows or isinstance(self._result.read_row, RowPlan):
+            return rows
+        if self._plan is None:
+            self._plan = RowPlan(
+                self.row_factory, [field[0] for field in self.description], None, self.converters
+            )
+        return [self._plan.make(r) for r in rows]
+
+    def fetchone(self):
+        ''' Fetch the next row '''
+        r = super(TypedCursor, self).fetchone()
+        if r is None:
+            return None
+        return self._typed([r])[0]
+
+    def fetchmany(self, size=None):
+        ''' Fetch several rows '''
+        return self._typed(super(TypedCursor, self).fetchmany(size))
+
+    def fetchall(self):
+        ''' Fetch all the rows '''
+        return self._typed(super(TypedCursor, self).fetchall())
+
+
+class SSTypedCursor(TypedCursor):
+    """An unbuffered cursor which builds rows with a row_factory"""
+    _unbuffered = True
@@ -0,0 +1,396 @@
+'''
+Stream the result of a cursor to CSV, TSV or Parquet files.
+
+    cur = conn.cursor(SSCursor)
+    cur.execute("SELECT * FROM orders")
+    export_csv(cur, "orders.csv.gz")
+
+export_csv and export_tsv read the row packets of unbuffered cursors
+and format the cells in batches of batch_size rows, without making
+Python objects of them, so memory stays bounded whatever the size of
+the result.  Buffered rows have been decoded at execute() and are
+formatted from their values.
+
+CSV follows RFC 4180: cells holding the delimiter, quotes or line
+breaks, and empty strings, are quoted, NULL is an empty cell.  TSV
+follows LOAD DATA INFILE: NULL is \\N, and backslashes, tabs, line
+breaks and NUL characters are escaped with a backslash.  Binary columns
+are written as base64.  Files are gzip or zstd compressed with
+compression='gzip' or 'zstd', or when their name ends with .gz or .zst.
+zstd needs pyzstd, installed with the zstd extra.
+
+export_parquet writes the result as Parquet through pyarrow, from
+Cursor.fetch_arrow_batches.
+
+parallel_export splits a table on the range of a key column and exports
+each part to its own shard over its own connection, so that large tables
+are not bound by the one core formatting the rows of a connection:
+
+    parallel_export("orders", "id", "orders-{shard}.csv.gz", workers=8,
+                    host="db", user="export", passwd="...", db="shop")
+
+The connections read one consistent snapshot of the table: they start
+their transactions while the table is locked for reading by another
+connection, which needs the LOCK TABLES privilege.
+'''
+import base64
+import concurrent.futures
+import datetime
+import decimal
+import queue
+
+from cymysql.connections import Connection
+from cymysql.constants import FIELD_TYPE
+from cymysql.cursors import SSCursor
+from cymysql.jsonrows import format_time
+
+CELL_RAW = 0
+CELL_TEXT = 1
+CELL_RECODE = 2
+CELL_BASE64 = 3
+
+RAW_TYPES = frozenset([
+    FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL, FIELD_TYPE.TINY, FIELD_TYPE.SHORT,
+    FIELD_TYPE.LONG, FIELD_TYPE.INT24, FIELD_TYPE.LONGLONG, FIELD_TYPE.YEAR,
+    FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE, FIELD_TYPE.NULL, FIELD_TYPE.TIMESTAMP,
+    FIELD_TYPE.DATE, FIELD_TYPE.TIME, FIELD_TYPE.DATETIME, FIELD_TYPE.NEWDATE,
+])
+BINARY_TYPES = frozenset([FIELD_TYPE.BIT, FIELD_TYPE.GEOMETRY, FIELD_TYPE.VECTOR])
+
+
+def cell_kind(type_code, field=None):
+    ''' Return the CELL_* a cell of a column is written as '''
+    if type_code in RAW_TYPES:
+        return CELL_RAW
+    elif type_code in BINARY_TYPES:
+        return CELL_BASE64
+    elif field is not None and type_code != FIELD_TYPE.JSON:
+        if field.charset == 'binary':
+            return CELL_BASE64
+        elif field.encoding not in ('utf8', 'ascii'):
+            return CELL_RECODE
+    return CELL_TEXT
+
+
+class DelimitedRows(object):
+    '''
+    The buffer the rows of a result are written to as CSV, or TSV if
+    tsv is set, one line per row.
+    '''
+
+    def __init__(self, description, fields=None, delimiter=',', tsv=False):
+        self.buffer = bytearray()
+        self.rows = 0
+        self.delimiter = ord(delimiter)
+        self.tsv = tsv
+        self.kinds = [
+            cell_kind(column[1], field)
+            for column, field in zip(description, fields or [None] * len(description))
+        ]
+        self.encodings = [
+            field.encoding if kind == CELL_RECODE else None
+            for kind, field in zip(self.kinds, fields or [None] * len(description))
+        ]
+
+    def quote(self, text):
+        ''' Return the cell of the str text '''
+        if self.tsv:
+            return (
+                text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+                .replace('\r', '\\r').replace('\0', '\\0')
+            )
+        delimiter = chr(self.delimiter)
+        if not text or delimiter in text or '"' in text or '\n' in text or '\r' in text:
+            return '"' + text.replace('"', '""') + '"'
+        return text
+
+    def append_header(self, names):
+        ''' Append a line of the column names '''
+        self.buffer += chr(self.delimiter).join([self.quote(name) for name in names]).encode('utf8')
+        self.buffer += b'\n'
+
+    def append_row(self, row):
+        ''' Append a row of decoded values '''
+        cells = []
+        for value, kind in zip(row, self.kinds):
+            if value is None:
+                cells.append('\\N' if self.tsv else '')
+            elif isinstance(value, (bytes, bytearray)):
+                cells.append(base64.b64encode(value).decode('ascii'))
+            elif isinstance(value, (int, decimal.Decimal)):
+                cells.append(str(value))
+            elif isinstance(value, float):
+                cells.append(repr(value))
+            elif isinstance(value, datetime.datetime):
+                cells.append(value.isoformat(' '))
+            elif isinstance(value, datetime.date):
+                cells.append(value.isoformat())
+            elif isinstance(value, datetime.timedelta):
+                cells.append(format_time(value))
+            elif isinstance(value, (set, frozenset)):
+                cells.append(self.quote(','.join(sorted(value))))
+            else:
+                cells.append(self.quote(str(value)))
+        self.buffer += chr(self.delimiter).join(cells).encode('utf8')
+        self.buffer += b'\n'
+        self.rows += 1
+
+    def take(self):
+        ''' Return what was written and empty the buffer '''
+        data = bytes(self.buffer)
+        del self.buffer[:]
+        return data
+
+
+def _open(file, compression):
+    '''
+    Return a binary file object writing to file, a path or a binary file
+    object, and whether it is to be closed
+    '''
+    if compression is None and isinstance(file, str):
+        if file.endswith('.gz'):
+            compression = 'gzip'
+        elif file.endswith('.zst'):
+            compression = 'zstd'
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(file, 'wb'), True
+    elif compression == 'zstd':
+        import pyzstd
+        return pyzstd.ZstdFile(file, 'wb'), True
+    elif compression is not None:
+        raise ValueError("unknown compression %r" % (compression, ))
+    if isinstance(file, str):
+        return open(file, 'wb'), True
+    return file, False
+
+
+def _export(cursor, file, rows, header, compression, batch_size):
+    cursor._check_executed()
+    result = cursor._result
+    if result is None or not result.has_result:
+        return 0
+    out, close = _open(file, compression)
+    try:
+        if header:
+            rows.append_header([column[0] for column in cursor.description])
+        while result.fetch_delimited(rows, batch_size):
+            out.write(rows.take())
+        out.write(rows.take())
+    finally:
+        if close:
+            out.close()
+    return rows.rows
+
+
+def export_csv(cursor, file, delimiter=',', header=True, compression=None, batch_size=10000):
+    '''
+    Write the rest of the rows of cursor as CSV to file, a path or a
+    binary file object, return the number of rows
+    '''
+    if cursor.description is None:
+        return 0
+    rows = DelimitedRows(cursor.description, cursor._result.fields, delimiter)
+    return _export(cursor, file, rows, header, compression, batch_size)
+
+
+def export_tsv(cursor, file, header=True, compression=None, batch_size=10000):
+    '''
+    Write the rest of the rows of cursor as TSV to file, a path or a
+    binary file object, return the number of rows
+    '''
+    if cursor.description is None:
+        return 0
+    rows = DelimitedRows(cursor.description, cursor._result.fields, '\t', True)
+    return _export(cursor, file, rows, header, compression, batch_size)
+
+
+def export_parquet(cursor, file, compression='snappy', batch_size=65536):
+    '''
+    Write the rest of the rows of cursor as Parquet to file, a path or a
+    binary file object, return the number of rows
+    '''
+    import pyarrow.parquet as pq
+    cursor._check_executed()
+    if cursor._result is None or not cursor._result.has_result:
+        return 0
+    n = 0
+    writer = None
+    try:
+        for batch in cursor.fetch_arrow_batches(batch_size):
+            if writer is None:
+                writer = pq.ParquetWriter(file, batch.schema, compression=compression)
+            writer.write_batch(batch)
+            n += batch.num_rows
+        if writer is None:
+            batch = cursor._columns(True).to_arrow()
+            writer = pq.ParquetWriter(file, batch.schema, compression=compression)
+    finally:
+        if writer is not None:
+            writer.close()
+    return n
+
+
+_EXPORTS = {'csv': export_csv, 'tsv': export_tsv, 'parquet': export_parquet}
+
+
+def _quote_name(name):
+    return '.'.join(['`%s`' % (part.replace('`', '``'), ) for part in name.split('.')])
+
+
+def _connect(kwargs):
+    conn = Connection(**kwargs)
+    conn._connect()
+    conn._initialize()
+    return conn
+
+
+def _split(cursor, table, key, parts):
+    '''
+    Return the values of key splitting the rows of table in up to parts
+    ranges of about the same size, in ascending order
+    '''
+    cursor.execute("SELECT MIN(%s), MAX(%s) FROM %s" % (key, key, table))
+    low, high = cursor.fetchone()
+    if low is None or low == high:
+        return []
+    if isinstance(low, int) and isinstance(high, int):
+        bounds = [low + (high - low + 1) * i // parts for i in range(1, parts)]
+    else:
+        # not arithmetic, pick the keys at the offsets of the boundaries
+        cursor.execute("SELECT COUNT(*) FROM %s" % (table, ))
+        count = cursor.fetchone()[0]
+        bounds = []
+        for i in range(1, parts):
+            cursor.execute(
+                "SELECT %s FROM %s WHERE %s IS NOT NULL ORDER BY %s LIMIT 1 OFFSET %d"
+                % (key, table, key, key, count * i // parts)
+            )
+            row = cursor.fetchone()
+            if row is not None:
+                bounds.append(row[0])
+    return sorted(set(bound for bound in bounds if bound > low))
+
+
+def _ranges(key, bounds):
+    '''
+    Return the WHERE clauses and arguments of the ranges between bounds,
+    the first one holds the NULL keys
+    '''
+    if not bounds:
+        return [("", ())]
+    ranges = [(" WHERE %s IS NULL OR %s < %%s" % (key, key), (bounds[0], ))]
+    for low, high in zip(bounds, bounds[1:]):
+        ranges.append((" WHERE %s >= %%s AND %s < %%s" % (key, key), (low, high)))
+    ranges.append((" WHERE %s >= %%s" % (key, ), (bounds[-1], )))
+    return ranges
+
+
+def _export_chunk(kwargs, query, args, file, format, options, ready):
+    '''
+    Export the rows of query in a transaction of its own connection,
+    putting in ready once the snapshot it reads is taken
+    '''
+    try:
+        conn = _connect(kwargs)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+        except:
+            conn.close()
+            raise
+    finally:
+        ready.put(None)
+    try:
+        cursor = conn.cursor(SSCursor)
+        cursor.execute(query, args)
+        n = _EXPORTS[format](cursor, file, **options)
+        conn.rollback()
+        return n
+    finally:
+        conn.close()
+
+
+def _wait_ready(futures, ready, interval=0.1):
+    '''
+    Wait until each of futures put in ready, or one of them failed, which
+    may be before it ran, like when its arguments do not pickle
+    '''
+    started = 0
+    while started < len(futures):
+        try:
+            ready.get(timeout=interval)
+            started += 1
+        except queue.Empty:
+            if any(future.done() and (future.cancelled() or future.exception()) for future in futures):
+                return
+
+
+def parallel_export(table, key_column, file, workers=4, format='csv', columns=None,
+                    compression=None, batch_size=None, processes=False, lock=True, **kwargs):
+    '''
+    Export table to up to workers shards, each holding a range of the
+    values of key_column, return the number of rows of each shard.
+
+    file is the path of the shards with a {shard} field for their index,
+    format is 'csv', 'tsv' or 'parquet', with the compression and
+    batch_size of export_csv, export_tsv and export_parquet.  columns is
+    the list of the columns exported, all of them by default.  The rows
+    with a NULL key go to the first shard.  The shards are exported in
+    threads, or in processes if processes is set, each over its own
+    connection opened with the other keyword arguments, which are those
+    of connect().  Unless lock is unset, the table is locked for reading
+    until all the connections have started a transaction, so they all
+    read the same snapshot of it.
+    '''
+    if format not in _EXPORTS:
+        raise ValueError("unknown format %r" % (format, ))
+    if file.format(shard=0) == file.format(shard=1):
+        raise ValueError("file has no {shard} field: %r" % (file, ))
+    options = {}
+    if compression is not None:
+        options['compression'] = compression
+    if batch_size is not None:
+        options['batch_size'] = batch_size
+    table = _quote_name(table)
+    key = _quote_name(key_column)
+    if columns is None:
+        select = "SELECT * FROM %s" % (table, )
+    else:
+        select = "SELECT %s FROM %s" % (', '.join([_quote_name(c) for c in columns]), table)
+    # the query cache would answer the workers from outside of the snapshot
+    kwargs['query_cache'] = None
+
+    conn = _connect(kwargs)
+    manager = None
+    try:
+        cursor = conn.cursor()
+        if lock:
+            cursor.execute("LOCK TABLES %s READ" % (table, ))
+        ranges = _ranges(key, _split(cursor, table, key, workers))
+        if processes:
+            import multiprocessing
+            manager = multiprocessing.Manager()
+            ready = manager.Queue()
+            executor = concurrent.futures.ProcessPoolExecutor(len(ranges))
+        else:
+            ready = queue.Queue()
+            executor = concurrent.futures.ThreadPoolExecutor(len(ranges))
+        with executor:
+            futures = [
+                executor.submit(
+                    _export_chunk, kwargs, select + where, args, file.format(shard=i), format, options, ready
+                )
+                for i, (where, args) in enumerate(ranges)
+            ]
+            try:
+                _wait_ready(futures, ready)
+            finally:
+                if lock:
+                    cursor.execute("UNLOCK TABLES")
+            return [future.result() for future in futures]
+    finally:
+        if manager is not None:
+            manager.shutdown()
+        conn.close()
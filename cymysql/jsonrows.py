@@ -0,0 +1,146 @@
+'''
+Write results as UTF-8 JSON straight from the row packets.
+
+Cursor.fetch_json() returns the rest of the rows as a JSON array of
+objects keyed by column name, or of arrays with objects=False, and
+Cursor.stream_json(batch_size) yields the same document in pieces of
+batch_size rows:
+
+    cur = conn.cursor(SSCursor)
+    cur.execute("SELECT id, name, price FROM items")
+    for chunk in cur.stream_json(1000):
+        response.write(chunk)
+
+Numeric columns are written as they are sent by the server, JSON columns
+verbatim, text and temporal columns as JSON strings and binary columns
+as base64 strings.  Unbuffered cursors and compact_results connections
+format the cells without making Python objects of them.  Buffered rows
+have been decoded at execute() and are encoded from their values.
+'''
+import base64
+import datetime
+import decimal
+import json
+
+from cymysql.constants import FIELD_TYPE
+
+JSON_RAW = 0
+JSON_STRING = 1
+JSON_TEXT = 2
+JSON_BASE64 = 3
+
+RAW_TYPES = frozenset([
+    FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL, FIELD_TYPE.TINY, FIELD_TYPE.SHORT,
+    FIELD_TYPE.LONG, FIELD_TYPE.INT24, FIELD_TYPE.LONGLONG, FIELD_TYPE.YEAR,
+    FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE, FIELD_TYPE.NULL, FIELD_TYPE.JSON,
+])
+BINARY_TYPES = frozenset([FIELD_TYPE.BIT, FIELD_TYPE.GEOMETRY, FIELD_TYPE.VECTOR])
+TEXT_TYPES = frozenset([
+    FIELD_TYPE.VARCHAR, FIELD_TYPE.ENUM, FIELD_TYPE.SET,
+    FIELD_TYPE.TINY_BLOB, FIELD_TYPE.MEDIUM_BLOB, FIELD_TYPE.LONG_BLOB, FIELD_TYPE.BLOB,
+    FIELD_TYPE.VAR_STRING, FIELD_TYPE.STRING,
+])
+
+
+def json_kind(type_code, field=None):
+    ''' Return the JSON_* a cell of a column is written as '''
+    if type_code in RAW_TYPES:
+        return JSON_RAW
+    elif type_code in BINARY_TYPES:
+        return JSON_BASE64
+    elif type_code in TEXT_TYPES and field is not None:
+        if field.charset == 'binary':
+            return JSON_BASE64
+        elif field.encoding not in ('utf8', 'ascii'):
+            return JSON_TEXT
+    return JSON_STRING
+
+
+def format_time(value):
+    ''' Format a timedelta as MySQL writes TIME values '''
+    micros = (value.days * 86400 + value.seconds) * 1000000 + value.microseconds
+    sign = '-' if micros < 0 else ''
+    seconds, micros = divmod(abs(micros), 1000000)
+    text = '%s%02d:%02d:%02d' % (sign, seconds // 3600, seconds // 60 % 60, seconds % 60)
+    if micros:
+        text += '.%06d' % micros
+    return text
+
+
+class JsonRows(object):
+    '''
+    The buffer rows of a result are written to as a JSON array.  The
+    cells of each column are preceded by prefixes, '{"name":' or '['
+    for the first column and ',"name":' or ',' for the others, each row
+    is closed by suffix.
+    '''
+
+    def __init__(self, description, fields=None, objects=True):
+        self.buffer = bytearray(b'[')
+        self.rows = 0
+        self.kinds = [
+            json_kind(column[1], field)
+            for column, field in zip(description, fields or [None] * len(description))
+        ]
+        self.encodings = [
+            field.encoding if kind == JSON_TEXT else None
+            for kind, field in zip(self.kinds, fields or [None] * len(description))
+        ]
+        if objects:
+            self.prefixes = [
+                (',' if i else '{').encode() + json.dumps(column[0], ensure_ascii=False).encode('utf8') + b':'
+                for i, column in enumerate(description)
+            ]
+            self.suffix = b'}'
+        else:
+            self.prefixes = [b',' if i else b'[' for i in range(len(description))]
+            self.suffix = b']'
+
+    def append_row(self, row):
+        ''' Append a row of decoded values '''
+        if self.rows:
+            self.buffer += b','
+        for value, kind, prefix in zip(row, self.kinds, self.prefixes):
+            self.buffer += prefix
+            self.buffer += self._encode(value, kind)
+        self.buffer += self.suffix
+        self.rows += 1
+
+    def _encode(self, value, kind):
+        if value is None:
+            return b'null'
+        if isinstance(value, (bytes, bytearray)):
+            if kind == JSON_RAW:
+                return bytes(value)
+            return b'"' + base64.b64encode(value) + b'"'
+        if isinstance(value, bool):
+            return b'true' if value else b'false'
+        if isinstance(value, (int, decimal.Decimal)):
+            return str(value).encode('ascii')
+        if isinstance(value, float):
+            return repr(value).encode('ascii')
+        if kind == JSON_RAW and isinstance(value, str):
+            # JSON columns
+            return value.encode('utf8')
+        if isinstance(value, datetime.datetime):
+            value = value.isoformat(' ')
+        elif isinstance(value, (datetime.date, datetime.time)):
+            value = value.isoformat()
+        elif isinstance(value, datetime.timedelta):
+            value = format_time(value)
+        elif isinstance(value, (set, frozenset)):
+            value = ','.join(sorted(value))
+        elif not isinstance(value, str):
+            value = str(value)
+        return json.dumps(value, ensure_ascii=False).encode('utf8')
+
+    def take(self, last=False):
+        '''
+        Return what was written and empty the buffer, closing the array
+        if last
+        '''
+        if last:
+            self.buffer += b']'
+        data = bytes(self.buffer)
+        del self.buffer[:]
+        return data
@@ -1,14 +1,32 @@
 # Python implementation of the MySQL client-server protocol
 #   https://dev.mysql.com/doc/dev/mysql-server/latest/PAGE_PROTOCOL.html
 
+import array
+import base64
+import json
 import struct
 from cymysql.err import raise_mysql_exception
-from cymysql.constants import SERVER_STATUS, FLAG
+from cymysql.constants import SERVER_STATUS, FLAG, SESSION_TRACK
 from cymysql.converters import convert_characters, convert_json
 from cymysql.charset import charset_by_id, encoding_by_charset
 
 FIELD_TYPE_VAR_STRING = 253
 
+# column kinds of cymysql.columnar
+KIND_OBJECT = 0
+KIND_FLOAT = 3
+KIND_DATE = 5
+KIND_BYTES = 6
+
+# cell kinds of cymysql.jsonrows
+JSON_RAW = 0
+JSON_BASE64 = 3
+
+# cell kinds of cymysql.export
+CELL_RAW = 0
+CELL_TEXT = 1
+CELL_BASE64 = 3
+
 UNSIGNED_CHAR_COLUMN = 251
 UNSIGNED_SHORT_COLUMN = 252
 UNSIGNED_INT24_COLUMN = 253
@@ -33,6 +51,31 @@ def unpack_uint64(n):
     return struct.unpack('<Q', n)[0]
 
 
+def days_from_civil(year, month, day):
+    """Days from 1970-01-01 to a date of the proleptic Gregorian calendar."""
+    year -= month <= 2
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    return era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+
+
+def parse_temporal(value, kind):
+    """Return the days (KIND_DATE) or microseconds since the epoch of a
+    DATE or DATETIME value in text form, None for a zero date."""
+    month, day = int(value[5:7]), int(value[8:10])
+    if not month or not day:
+        return None
+    days = days_from_civil(int(value[:4]), month, day)
+    if kind == KIND_DATE:
+        return days
+    seconds = days * 86400
+    if len(value) > 10:
+        seconds += int(value[11:13]) * 3600 + int(value[14:16]) * 60 + int(value[17:19])
+    usec = value[20:26]
+    return seconds * 1000000 + (int(usec.ljust(6, b'0')) if usec else 0)
+
+
 class MysqlPacket(object):
     """Representation of a MySQL response packet.  Reads in the packet
     from the network socket, removes packet header and provides an interface
@@ -69,8 +112,9 @@ class MysqlPacket(object):
 
         (Subsequent read() or peek() will return errors.)
         """
+        data = self.__data[self.__position:]
         self.__position = -1  # ensure no subsequent read() or peek()
-        return self.__data[self.__position:]
+        return data
 
     def read_length_coded_binary(self):
         """Read a 'Length Coded Binary' number from the data buffer.
@@ -114,6 +158,136 @@ class MysqlPacket(object):
             ]
         ])
 
+    def read_decode_dict(self, keys, decoders):
+        """Read a row as a dict of keys, decoders are the functions of
+        the value only of cymysql.columnar.column_decoder, None to keep
+        the bytes."""
+        row = {}
+        for key, decoder in zip(keys, decoders):
+            value = self._read_length_coded_string()
+            if value is not None and decoder is not None:
+                value = decoder(value)
+            row[key] = value
+        return row
+
+    def read_decode_tuple(self, decoders, row_type=tuple):
+        """Read a row as a row_type, a tuple or a subclass of it,
+        decoders as for read_decode_dict."""
+        values = []
+        for decoder in decoders:
+            value = self._read_length_coded_string()
+            if value is not None and decoder is not None:
+                value = decoder(value)
+            values.append(value)
+        return tuple.__new__(row_type, values)
+
+    def read_decode_call(self, decoders, slots, keys, factory, keywords):
+        """Read a row into the arguments of factory and return its
+        result.  slots give the index in keys of the argument of each cell,
+        -1 to skip the cell, keys are the names of the arguments passed as
+        keywords if keywords is set, decoders as for read_decode_dict."""
+        args = [None] * len(keys)
+        for decoder, slot in zip(decoders, slots):
+            value = self._read_length_coded_string()
+            if slot < 0:
+                continue
+            if value is not None and decoder is not None:
+                value = decoder(value)
+            args[slot] = value
+        if keywords:
+            return factory(**dict(zip(keys, args)))
+        return factory(*args)
+
+    def read_cell_offsets(self, count):
+        """Skip the next count cells, return an array of the start and
+        length of each, -1 for the length of NULL."""
+        cells = array.array('q')
+        for i in range(count):
+            length = self.read_length_coded_binary()
+            cells.append(self.__position)
+            if length is None:
+                cells.append(-1)
+            else:
+                cells.append(length)
+                self.__position += length
+        return cells
+
+    def read_columns(self, kinds, values, masks, decoders, buffers):
+        """Append the cells of a row to the column buffers of cymysql.columnar."""
+        for kind, column, mask, decoder, buffer in zip(kinds, values, masks, decoders, buffers):
+            value = self._read_length_coded_string()
+            if kind == KIND_BYTES:
+                if value is not None:
+                    buffer += value
+                column.append(len(buffer))
+                mask.append(value is None)
+                continue
+            if value is not None:
+                if kind == KIND_OBJECT:
+                    value = decoder(value)
+                elif kind < KIND_FLOAT:
+                    value = int(value)
+                elif kind == KIND_FLOAT:
+                    value = float(value)
+                else:
+                    value = parse_temporal(value, kind)
+            if value is None:
+                column.append(None if kind == KIND_OBJECT else 0)
+                mask.append(1)
+            else:
+                column.append(value)
+                mask.append(0)
+
+    def read_json(self, buffer, kinds, prefixes, suffix, encodings, comma):
+        """Append the row as JSON to buffer, after a comma if comma is
+        set, see cymysql.jsonrows."""
+        if comma:
+            buffer += b','
+        for kind, prefix, encoding in zip(kinds, prefixes, encodings):
+            buffer += prefix
+            value = self._read_length_coded_string()
+            if value is None:
+                buffer += b'null'
+            elif kind == JSON_RAW:
+                buffer += value
+            elif kind == JSON_BASE64:
+                buffer += b'"' + base64.b64encode(value) + b'"'
+            else:
+                buffer += json.dumps(value.decode(encoding or 'utf8'), ensure_ascii=False).encode('utf8')
+        buffer += suffix
+
+    def read_delimited(self, buffer, kinds, encodings, delimiter, tsv):
+        """Append the row as a CSV line to buffer, or TSV if tsv is set,
+        see cymysql.export."""
+        separator = bytes([delimiter])
+        for i, (kind, encoding) in enumerate(zip(kinds, encodings)):
+            if i:
+                buffer += separator
+            value = self._read_length_coded_string()
+            if value is None:
+                if tsv:
+                    buffer += b'\\N'
+            elif kind == CELL_RAW:
+                buffer += value
+            elif kind == CELL_BASE64:
+                buffer += base64.b64encode(value)
+            else:
+                if kind != CELL_TEXT:
+                    value = value.decode(encoding).encode('utf8')
+                if tsv:
+                    buffer += (
+                        value.replace(b'\\', b'\\\\').replace(b'\t', b'\\t').replace(b'\n', b'\\n')
+                        .replace(b'\r', b'\\r').replace(b'\0', b'\\0')
+                    )
+                elif (
+                    not value or delimiter in value or b'"' in value
+                    or b'\n' in value or b'\r' in value
+                ):
+                    buffer += b'"' + value.replace(b'"', b'""') + b'"'
+                else:
+                    buffer += value
+        buffer += b'\n'
+
     def is_ok_packet(self):
         return self.__data[0] == 0
 
@@ -121,21 +295,57 @@ class MysqlPacket(object):
         return self.__data[0] == 0xfe
 
     def is_eof_and_status(self):
-        if self.__data[0] != 0xfe:
+        if self.__data[0] != 0xfe or len(self.__data) >= 9:
             return False, 0, 0
+        self._skip(1)
         return True, unpack_uint16(self._read(2)), unpack_uint16(self._read(2))
 
-    def read_ok_packet(self):
+    def read_ok_packet(self, session_track=False):
         self._skip(1)  # field_count (always '0')
         affected_rows = self.read_length_coded_binary()
         insert_id = self.read_length_coded_binary()
         server_status = unpack_uint16(self._read(2))
         warning_count = unpack_uint16(self._read(2))
-        message = self._read_all()
+        if session_track:
+            if self.__position < len(self.__data):
+                message = self._read_length_coded_string()
+            else:
+                message = b''
+        else:
+            message = self._read_all()
         return (None if affected_rows < 0 else affected_rows,
                 None if insert_id < 0 else insert_id,
                 server_status, warning_count, message)
 
+    def read_session_state(self):
+        """Read the session state changes following the OK packet's info.
+
+        Returns a list of (type, value) tuples. System variables are
+        (name, value) tuples, schema and GTIDs are strings and the other
+        trackers are returned as bytes.
+        """
+        state = []
+        if self.__position < 0 or self.__position >= len(self.__data):
+            return state
+        end = self.read_length_coded_binary() + self.__position
+        while self.__position < end:
+            kind = ord(self._read(1))
+            length = self.read_length_coded_binary()
+            entry_end = self.__position + length
+            if kind == SESSION_TRACK.SYSTEM_VARIABLES:
+                name = self._read_length_coded_string().decode('utf-8')
+                value = self._read_length_coded_string().decode('utf-8')
+                state.append((kind, (name, value)))
+            elif kind == SESSION_TRACK.SCHEMA:
+                state.append((kind, self._read_length_coded_string().decode('utf-8')))
+            elif kind == SESSION_TRACK.GTIDS:
+                self._skip(1)   # encoding specification
+                state.append((kind, self._read_length_coded_string().decode('ascii')))
+            else:
+                state.append((kind, self._read(length)))
+            self.__position = entry_end
+        return state
+
 
 class FieldDescriptorPacket(MysqlPacket):
     """A MysqlPacket that represents a specific column's metadata in the result.
@@ -3,11 +3,17 @@
 
 import sys
 import struct
+from binascii import b2a_base64
 from cymysql.err import raise_mysql_exception, OperationalError
-from cymysql.constants import SERVER_STATUS, FLAG
+from cymysql.constants import SERVER_STATUS, FLAG, SESSION_TRACK
 from cymysql.converters import convert_characters, convert_json
 from cymysql.charset import charset_by_id, encoding_by_charset
 from libc.stdint cimport uint16_t, uint32_t
+from libc.stdlib cimport strtod
+from libc.string cimport memcpy
+from cpython cimport array
+import array
+from cpython.bytearray cimport PyByteArray_AS_STRING, PyByteArray_GET_SIZE, PyByteArray_Resize
 
 
 cdef int FIELD_TYPE_VAR_STRING = 253
@@ -19,6 +25,32 @@ cdef int UNSIGNED_INT64_COLUMN = 254
 
 cdef int SERVER_MORE_RESULTS_EXISTS = SERVER_STATUS.SERVER_MORE_RESULTS_EXISTS
 
+cdef array.array _cell_offsets = array.array('q')
+
+# column kinds of cymysql.columnar
+cdef enum:
+    KIND_OBJECT = 0
+    KIND_INT = 1
+    KIND_UINT = 2
+    KIND_FLOAT = 3
+    KIND_DATETIME = 4
+    KIND_DATE = 5
+    KIND_BYTES = 6
+
+# cell kinds of cymysql.jsonrows
+cdef enum:
+    JSON_RAW = 0
+    JSON_STRING = 1
+    JSON_TEXT = 2
+    JSON_BASE64 = 3
+
+# cell kinds of cymysql.export
+cdef enum:
+    CELL_RAW = 0
+    CELL_TEXT = 1
+    CELL_RECODE = 2
+    CELL_BASE64 = 3
+
 
 cdef uint16_t unpack_uint16(bytes s):
     cdef unsigned char* n = s
@@ -35,10 +67,149 @@ cdef uint32_t unpack_uint32(bytes s):
     return n[0] + (n[1] << 8) + (n[2] << 16) + (n[3] << 24)
 
 
+cdef long long days_from_civil(long long year, long long month, long long day):
+    """Days from 1970-01-01 to a date of the proleptic Gregorian calendar."""
+    cdef long long era, yoe, doy
+    year -= month <= 2
+    era = (year if year >= 0 else year - 399) // 400
+    yoe = year - era * 400
+    doy = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    return era * 146097 + yoe * 365 + yoe // 4 - yoe // 100 + doy - 719468
+
+
+cdef inline long long _digits(const unsigned char* p, int n):
+    cdef long long v = 0
+    cdef int i
+    for i in range(n):
+        v = v * 10 + (p[i] - 48)
+    return v
+
+
+cdef bint parse_temporal(const unsigned char* p, int length, int kind, long long* out):
+    """Store the days (KIND_DATE) or microseconds since the epoch of a
+    DATE or DATETIME value in text form, return False for a zero date."""
+    cdef long long month, day, seconds, usec = 0
+    cdef int i
+    if length < 10:
+        return False
+    month = _digits(p + 5, 2)
+    day = _digits(p + 8, 2)
+    if month == 0 or day == 0:
+        return False
+    out[0] = days_from_civil(_digits(p, 4), month, day)
+    if kind == KIND_DATE:
+        return True
+    seconds = out[0] * 86400
+    if length >= 19:
+        seconds += _digits(p + 11, 2) * 3600 + _digits(p + 14, 2) * 60 + _digits(p + 17, 2)
+    for i in range(20, 26):
+        usec = usec * 10 + (p[i] - 48 if i < length else 0)
+    out[0] = seconds * 1000000 + usec
+    return True
+
+
 cdef long long unpack_uint64(bytes n):
     return struct.unpack('<Q', n)[0]
 
 
+cdef const char* _HEX_DIGITS = b"0123456789abcdef"
+cdef const char* _ESCAPES = b"btn?fr"
+
+
+cdef inline void _append(bytearray buffer, const unsigned char* p, Py_ssize_t n) except *:
+    cdef Py_ssize_t size = PyByteArray_GET_SIZE(buffer)
+    PyByteArray_Resize(buffer, size + n)
+    memcpy(PyByteArray_AS_STRING(buffer) + size, p, n)
+
+
+cdef void _append_json_string(bytearray buffer, const unsigned char* p, Py_ssize_t n) except *:
+    """Append the UTF-8 text p as a JSON string, escaped as json.dumps does."""
+    cdef Py_ssize_t i, extra = 0, size = PyByteArray_GET_SIZE(buffer)
+    cdef unsigned char c
+    cdef char* out
+    for i in range(n):
+        c = p[i]
+        if c == 34 or c == 92 or c == 8 or c == 9 or c == 10 or c == 12 or c == 13:
+            extra += 1
+        elif c < 32:
+            extra += 5
+    PyByteArray_Resize(buffer, size + n + extra + 2)
+    out = PyByteArray_AS_STRING(buffer) + size
+    out[0] = 34
+    out += 1
+    if not extra:
+        memcpy(out, p, n)
+        out += n
+    else:
+        for i in range(n):
+            c = p[i]
+            if c == 34 or c == 92:
+                out[0] = 92
+                out[1] = c
+                out += 2
+            elif c >= 32:
+                out[0] = c
+                out += 1
+            elif c == 8 or c == 9 or c == 10 or c == 12 or c == 13:
+                out[0] = 92
+                out[1] = _ESCAPES[c - 8]
+                out += 2
+            else:
+                out[0] = 92
+                out[1] = 117
+                out[2] = 48
+                out[3] = 48
+                out[4] = _HEX_DIGITS[c >> 4]
+                out[5] = _HEX_DIGITS[c & 15]
+                out += 6
+    out[0] = 34
+
+
+cdef void _append_delimited(bytearray buffer, const unsigned char* p, Py_ssize_t n,
+                            unsigned char delimiter, bint tsv) except *:
+    """Append the UTF-8 text p as a CSV cell, quoted if needed, or as a
+    TSV cell with backslash escapes."""
+    cdef Py_ssize_t i, extra = 0, size = PyByteArray_GET_SIZE(buffer)
+    cdef unsigned char c
+    cdef bint quote = not tsv and n == 0
+    cdef char* out
+    for i in range(n):
+        c = p[i]
+        if tsv:
+            if c == 92 or c == 9 or c == 10 or c == 13 or c == 0:
+                extra += 1
+        elif c == 34:
+            extra += 1
+            quote = True
+        elif c == delimiter or c == 10 or c == 13:
+            quote = True
+    if quote:
+        extra += 2
+    PyByteArray_Resize(buffer, size + n + extra)
+    out = PyByteArray_AS_STRING(buffer) + size
+    if not extra:
+        memcpy(out, p, n)
+        return
+    if quote:
+        out[0] = 34
+        out += 1
+    for i in range(n):
+        c = p[i]
+        if tsv and (c == 92 or c == 9 or c == 10 or c == 13 or c == 0):
+            out[0] = 92
+            out[1] = 92 if c == 92 else 116 if c == 9 else 110 if c == 10 else 114 if c == 13 else 48
+            out += 2
+        elif not tsv and c == 34:
+            out[0] = 34
+            out[1] = 34
+            out += 2
+        else:
+            out[0] = c
+            out += 1
+    if quote:
+        out[0] = 34
+
+
 cdef class MysqlPacket(object):
     """Representation of a MySQL response packet.  Reads in the packet
     from the network socket, removes packet header and provides an interface
@@ -79,8 +250,9 @@ cdef class MysqlPacket(object):
 
         (Subsequent read() or peek() will return errors.)
         """
+        data = self.__data[self.__position:]
         self.__position = -1  # ensure no subsequent read() or peek()
-        return self.__data[self.__position:]
+        return data
 
     cdef int read_length_coded_binary(self):
         """Read a 'Length Coded Binary' number from the data buffer.
@@ -125,6 +297,214 @@ cdef class MysqlPacket(object):
             ]
         ])
 
+    cpdef dict read_decode_dict(self, tuple keys, list decoders):
+        """Read a row as a dict of keys, decoders are the functions of
+        the value only of cymysql.columnar.column_decoder, None to keep
+        the bytes."""
+        cdef dict row = {}
+        cdef Py_ssize_t i
+        cdef object value, decoder
+        for i in range(len(keys)):
+            value = self._read_length_coded_string()
+            if value is not None:
+                decoder = decoders[i]
+                if decoder is not None:
+                    value = decoder(value)
+            row[keys[i]] = value
+        return row
+
+    cpdef read_decode_tuple(self, list decoders, type row_type=tuple):
+        """Read a row as a row_type, a tuple or a subclass of it,
+        decoders as for read_decode_dict."""
+        cdef Py_ssize_t i, n = len(decoders)
+        cdef list values = [None] * n
+        cdef object value, decoder
+        for i in range(n):
+            value = self._read_length_coded_string()
+            if value is not None:
+                decoder = decoders[i]
+                if decoder is not None:
+                    value = decoder(value)
+            values[i] = value
+        if row_type is tuple:
+            return tuple(values)
+        return tuple.__new__(row_type, values)
+
+    cpdef read_decode_call(self, list decoders, list slots, tuple keys, factory, bint keywords):
+        """Read a row into the arguments of factory and return its
+        result.  slots give the index in keys of the argument of each cell,
+        -1 to skip the cell, keys are the names of the arguments passed as
+        keywords if keywords is set, decoders as for read_decode_dict."""
+        cdef Py_ssize_t i, slot, n = len(decoders)
+        cdef int length
+        cdef list args = [None] * len(keys)
+        cdef dict kwargs
+        cdef object value, decoder
+        for i in range(n):
+            slot = slots[i]
+            if slot < 0:
+                length = self.read_length_coded_binary()
+                if length > 0:
+                    self.__position += length
+                continue
+            value = self._read_length_coded_string()
+            if value is not None:
+                decoder = decoders[i]
+                if decoder is not None:
+                    value = decoder(value)
+            args[slot] = value
+        if keywords:
+            kwargs = {}
+            for i in range(len(keys)):
+                kwargs[keys[i]] = args[i]
+            return factory(**kwargs)
+        return factory(*args)
+
+    cpdef read_cell_offsets(self, int count):
+        """Skip the next count cells, return an array of the start and
+        length of each, -1 for the length of NULL."""
+        cdef array.array cells = array.clone(_cell_offsets, 2 * count, False)
+        cdef int i, length
+        for i in range(count):
+            length = self.read_length_coded_binary()
+            cells.data.as_longlongs[2 * i] = self.__position
+            cells.data.as_longlongs[2 * i + 1] = length
+            if length > 0:
+                self.__position += length
+        return cells
+
+    cpdef read_columns(self, list kinds, list values, list masks, list decoders, list buffers):
+        """Append the cells of a row to the column buffers of cymysql.columnar."""
+        cdef int i, j, kind, length, n
+        cdef const unsigned char* data = self.__data
+        cdef const unsigned char* p
+        cdef array.array column, mask
+        cdef long long v
+        cdef unsigned long long u
+        cdef char buf[64]
+        cdef bint negative, valid
+        cdef bytearray buffer
+        cdef Py_ssize_t size
+        for i in range(len(kinds)):
+            kind = kinds[i]
+            mask = masks[i]
+            n = len(mask)
+            array.resize_smart(mask, n + 1)
+            length = self.read_length_coded_binary()
+            if kind == KIND_OBJECT:
+                if length < 0:
+                    values[i].append(None)
+                else:
+                    values[i].append(decoders[i](self._read(length)))
+                mask.data.as_schars[n] = length < 0
+                continue
+            column = values[i]
+            if kind == KIND_BYTES:
+                buffer = buffers[i]
+                size = PyByteArray_GET_SIZE(buffer)
+                if length > 0:
+                    PyByteArray_Resize(buffer, size + length)
+                    memcpy(PyByteArray_AS_STRING(buffer) + size, data + self.__position, length)
+                    self.__position += length
+                    size += length
+                array.resize_smart(column, n + 2)
+                column.data.as_longlongs[n + 1] = size
+                mask.data.as_schars[n] = length < 0
+                continue
+            array.resize_smart(column, n + 1)
+            valid = length >= 0
+            if valid:
+                p = data + self.__position
+                self.__position += length
+                if kind == KIND_INT:
+                    negative = length > 0 and p[0] == 45
+                    v = _digits(p + negative, length - negative)
+                    column.data.as_longlongs[n] = -v if negative else v
+                elif kind == KIND_UINT:
+                    u = 0
+                    for j in range(length):
+                        u = u * 10 + (p[j] - 48)
+                    column.data.as_ulonglongs[n] = u
+                elif kind == KIND_FLOAT:
+                    if length < 64:
+                        memcpy(buf, p, length)
+                        buf[length] = 0
+                        column.data.as_doubles[n] = strtod(buf, NULL)
+                    else:
+                        column.data.as_doubles[n] = float(self.__data[self.__position - length:self.__position])
+                else:
+                    v = 0
+                    valid = parse_temporal(p, length, kind, &v)
+                    column.data.as_longlongs[n] = v if valid else 0
+            else:
+                column.data.as_longlongs[n] = 0
+            mask.data.as_schars[n] = not valid
+
+    cpdef read_json(self, bytearray buffer, list kinds, list prefixes, bytes suffix, list encodings, bint comma):
+        """Append the row as JSON to buffer, after a comma if comma is
+        set, see cymysql.jsonrows."""
+        cdef Py_ssize_t i
+        cdef int kind, length
+        cdef const unsigned char* data = self.__data
+        cdef const unsigned char* p
+        cdef bytes text
+        if comma:
+            _append(buffer, <const unsigned char*>b",", 1)
+        for i in range(len(kinds)):
+            text = prefixes[i]
+            _append(buffer, text, len(text))
+            length = self.read_length_coded_binary()
+            if length < 0:
+                _append(buffer, <const unsigned char*>b"null", 4)
+                continue
+            kind = kinds[i]
+            p = data + self.__position
+            self.__position += length
+            if kind == JSON_RAW:
+                _append(buffer, p, length)
+            elif kind == JSON_STRING:
+                _append_json_string(buffer, p, length)
+            elif kind == JSON_TEXT:
+                text = self.__data[self.__position - length:self.__position].decode(encodings[i]).encode('utf8')
+                _append_json_string(buffer, text, len(text))
+            else:
+                text = b2a_base64(self.__data[self.__position - length:self.__position], newline=False)
+                _append(buffer, <const unsigned char*>b'"', 1)
+                _append(buffer, text, len(text))
+                _append(buffer, <const unsigned char*>b'"', 1)
+        _append(buffer, suffix, len(suffix))
+
+    cpdef read_delimited(self, bytearray buffer, list kinds, list encodings, unsigned char delimiter, bint tsv):
+        """Append the row as a CSV line to buffer, or TSV if tsv is set,
+        see cymysql.export."""
+        cdef Py_ssize_t i
+        cdef int kind, length
+        cdef const unsigned char* data = self.__data
+        cdef const unsigned char* p
+        cdef bytes text
+        for i in range(len(kinds)):
+            if i:
+                _append(buffer, &delimiter, 1)
+            length = self.read_length_coded_binary()
+            if length < 0:
+                if tsv:
+                    _append(buffer, <const unsigned char*>b"\\N", 2)
+                continue
+            kind = kinds[i]
+            p = data + self.__position
+            self.__position += length
+            if kind == CELL_RAW:
+                _append(buffer, p, length)
+            elif kind == CELL_TEXT:
+                _append_delimited(buffer, p, length, delimiter, tsv)
+            elif kind == CELL_RECODE:
+                text = self.__data[self.__position - length:self.__position].decode(encodings[i]).encode('utf8')
+                _append_delimited(buffer, text, len(text), delimiter, tsv)
+            else:
+                text = b2a_base64(self.__data[self.__position - length:self.__position], newline=False)
+                _append(buffer, text, len(text))
+        _append(buffer, <const unsigned char*>b"\n", 1)
+
     cpdef is_ok_packet(self):
         return (<unsigned char>(self.__data[0])) == 0
 
@@ -132,11 +512,12 @@ cdef class MysqlPacket(object):
         return (<unsigned char>(self.__data[0])) == 0xfe
 
     cpdef is_eof_and_status(self):
-        if (<unsigned char>(self.__data[0])) != 0xfe:
+        if (<unsigned char>(self.__data[0])) != 0xfe or len(self.__data) >= 9:
            return False, 0, 0
+        self._skip(1)
         return True, unpack_uint16(self._read(2)), unpack_uint16(self._read(2))
 
-    cpdef read_ok_packet(self):
+    cpdef read_ok_packet(self, bint session_track=False):
         cdef int affected_rows, insert_id, server_status, warning_count
         cdef message
         self._skip(1)  # field_count (always '0')
@@ -144,11 +525,47 @@ cdef class MysqlPacket(object):
         insert_id = self.read_length_coded_binary()
         server_status = unpack_uint16(self._read(2))
         warning_count = unpack_uint16(self._read(2))
-        message = self._read_all()
+        if session_track:
+            if self.__position < len(self.__data):
+                message = self._read_length_coded_string()
+            else:
+                message = b''
+        else:
+            message = self._read_all()
         return (None if affected_rows < 0 else affected_rows,
                 None if insert_id < 0 else insert_id,
                 server_status, warning_count, message)
 
+    cpdef read_session_state(self):
+        """Read the session state changes following the OK packet's info.
+
+        Returns a list of (type, value) tuples. System variables are
+        (name, value) tuples, schema and GTIDs are strings and the other
+        trackers are returned as bytes.
+        """
+        cdef int kind, length, end, entry_end
+        cdef list state = []
+        if self.__position < 0 or self.__position >= len(self.__data):
+            return state
+        end = self.read_length_coded_binary() + self.__position
+        while self.__position < end:
+            kind = self._read(1)[0]
+            length = self.read_length_coded_binary()
+            entry_end = self.__position + length
+            if kind == SESSION_TRACK.SYSTEM_VARIABLES:
+                name = self._read_length_coded_string().decode('utf-8')
+                value = self._read_length_coded_string().decode('utf-8')
+                state.append((kind, (name, value)))
+            elif kind == SESSION_TRACK.SCHEMA:
+                state.append((kind, self._read_length_coded_string().decode('utf-8')))
+            elif kind == SESSION_TRACK.GTIDS:
+                self._skip(1)   # encoding specification
+                state.append((kind, self._read_length_coded_string().decode('ascii')))
+            else:
+                state.append((kind, self._read(length)))
+            self.__position = entry_end
+        return state
+
     cpdef read_auth_switch_request(self):
         cdef int i, j
         cdef data, plugin_name
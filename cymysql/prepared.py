@@ -0,0 +1,430 @@
+'''
+Server side prepared statements.
+
+Parameters are sent in the binary protocol instead of being escaped into
+the query text.  Parameters which are file like objects, iterators of
+chunks, or bytes of long_data_threshold bytes or more are streamed to the
+server with COM_STMT_SEND_LONG_DATA in pieces of long_data_chunk_size
+bytes, so uploading a large value needs memory for one piece only.
+
+    stmt = conn.prepare("INSERT INTO media (name, data) VALUES (?, ?)")
+    with open("movie.mp4", "rb") as f:
+        stmt.execute(("movie.mp4", f))
+    stmt.close()
+
+PreparedCursor takes the usual %s placeholders and keeps one prepared
+statement for each of its last max_statements queries, executemany()
+executes it for each set of parameters.
+'''
+import collections
+import collections.abc
+import datetime
+import decimal
+import re
+import struct
+import sys
+
+from cymysql.constants import COMMAND, FIELD_TYPE, FLAG
+from cymysql.converters import convert_characters, convert_json
+from cymysql.cursors import Cursor
+from cymysql.err import ProgrammingError
+from cymysql.packet import MysqlPacket, FieldDescriptorPacket
+from cymysql.result import MySQLResult, SERVER_MORE_RESULTS_EXISTS
+
+UNSIGNED_PARAM = 0x80
+PLACEHOLDER_REGEX = re.compile(r'%[%s]')
+CURSOR_TYPE_NO_CURSOR = 0
+
+_SIGNED = {
+    FIELD_TYPE.TINY: struct.Struct('<b'),
+    FIELD_TYPE.SHORT: struct.Struct('<h'),
+    FIELD_TYPE.YEAR: struct.Struct('<h'),
+    FIELD_TYPE.INT24: struct.Struct('<i'),
+    FIELD_TYPE.LONG: struct.Struct('<i'),
+    FIELD_TYPE.LONGLONG: struct.Struct('<q'),
+    FIELD_TYPE.FLOAT: struct.Struct('<f'),
+    FIELD_TYPE.DOUBLE: struct.Struct('<d'),
+}
+_UNSIGNED = {
+    FIELD_TYPE.TINY: struct.Struct('<B'),
+    FIELD_TYPE.SHORT: struct.Struct('<H'),
+    FIELD_TYPE.YEAR: struct.Struct('<H'),
+    FIELD_TYPE.INT24: struct.Struct('<I'),
+    FIELD_TYPE.LONG: struct.Struct('<I'),
+    FIELD_TYPE.LONGLONG: struct.Struct('<Q'),
+    FIELD_TYPE.FLOAT: struct.Struct('<f'),
+    FIELD_TYPE.DOUBLE: struct.Struct('<d'),
+}
+_DATE_TYPES = (FIELD_TYPE.DATE, FIELD_TYPE.DATETIME, FIELD_TYPE.TIMESTAMP)
+
+
+def _lenenc(n):
+    if n < 251:
+        return bytes([n])
+    elif n < 1 << 16:
+        return b'\xfc' + struct.pack('<H', n)
+    elif n < 1 << 24:
+        return b'\xfd' + struct.pack('<I', n)[:3]
+    return b'\xfe' + struct.pack('<Q', n)
+
+
+def _read_lenenc(data, pos):
+    c = data[pos]
+    if c < 251:
+        return c, pos + 1
+    elif c == 252:
+        return data[pos + 1] + (data[pos + 2] << 8), pos + 3
+    elif c == 253:
+        return int.from_bytes(data[pos + 1:pos + 4], 'little'), pos + 4
+    return int.from_bytes(data[pos + 1:pos + 9], 'little'), pos + 9
+
+
+def _is_long_data(value, threshold):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value) >= threshold
+    return hasattr(value, 'read') or hasattr(value, '__next__')
+
+
+def _encode_param(value, encoding):
+    ''' Return (type, unsigned flag, binary value) of a parameter '''
+    if isinstance(value, bool):
+        return FIELD_TYPE.TINY, 0, struct.pack('<b', value)
+    elif isinstance(value, int):
+        if -(1 << 63) <= value < (1 << 63):
+            return FIELD_TYPE.LONGLONG, 0, struct.pack('<q', value)
+        elif 0 <= value < (1 << 64):
+            return FIELD_TYPE.LONGLONG, UNSIGNED_PARAM, struct.pack('<Q', value)
+        value = str(value).encode('ascii')
+        return FIELD_TYPE.NEWDECIMAL, 0, _lenenc(len(value)) + value
+    elif isinstance(value, float):
+        return FIELD_TYPE.DOUBLE, 0, struct.pack('<d', value)
+    elif isinstance(value, decimal.Decimal):
+        value = str(value).encode('ascii')
+        return FIELD_TYPE.NEWDECIMAL, 0, _lenenc(len(value)) + value
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        return FIELD_TYPE.BLOB, 0, _lenenc(len(value)) + bytes(value)
+    elif isinstance(value, datetime.datetime):
+        return FIELD_TYPE.DATETIME, 0, struct.pack(
+            '<BHBBBBBI', 11, value.year, value.month, value.day,
+            value.hour, value.minute, value.second, value.microsecond
+        )
+    elif isinstance(value, datetime.date):
+        return FIELD_TYPE.DATE, 0, struct.pack('<BHBB', 4, value.year, value.month, value.day)
+    elif isinstance(value, datetime.timedelta):
+        negative = value < datetime.timedelta(0)
+        if negative:
+            value = -value
+        return FIELD_TYPE.TIME, 0, struct.pack(
+            '<BBIBBBI', 12, negative, value.days, value.seconds // 3600,
+            value.seconds // 60 % 60, value.seconds % 60, value.microseconds
+        )
+    elif isinstance(value, datetime.time):
+        return FIELD_TYPE.TIME, 0, struct.pack(
+            '<BBIBBBI', 12, 0, 0, value.hour, value.minute, value.second, value.microsecond
+        )
+    value = str(value).encode(encoding)
+    return FIELD_TYPE.VAR_STRING, 0, _lenenc(len(value)) + value
+
+
+def _decode_datetime(type_code, data):
+    try:
+        if not data:
+            return None
+        year, month, day = struct.unpack_from('<HBB', data)
+        if type_code == FIELD_TYPE.DATE:
+            return datetime.date(year, month, day)
+        hour = minute = second = microsecond = 0
+        if len(data) >= 7:
+            hour, minute, second = data[4], data[5], data[6]
+        if len(data) >= 11:
+            microsecond = struct.unpack_from('<I', data, 7)[0]
+        return datetime.datetime(year, month, day, hour, minute, second, microsecond)
+    except ValueError:
+        return None
+
+
+def _decode_time(data):
+    if not data:
+        return datetime.timedelta(0)
+    negative, days, hour, minute, second = struct.unpack_from('<BIBBB', data)
+    microsecond = struct.unpack_from('<I', data, 8)[0] if len(data) >= 12 else 0
+    value = datetime.timedelta(
+        days=days, hours=hour, minutes=minute, seconds=second, microseconds=microsecond
+    )
+    return -value if negative else value
+
+
+class BinaryResult(MySQLResult):
+    '''
+    The result of a prepared statement, rows are sent in the binary
+    protocol.  Fixed size numbers, dates and times are decoded directly,
+    other values with the decoders of the connection.
+    '''
+
+    def _packet(self, data):
+        return MysqlPacket(data, self.connection.charset, self.connection.encoding)
+
+    def read_result(self, unbuffered=False):
+        first_packet = self._packet(self.connection.socket.recv_packet())
+        if first_packet.is_ok_packet():
+            (self.affected_rows, self.insert_id,
+                server_status, self.warning_count,
+                self.message) = first_packet.read_ok_packet(self.connection.session_track)
+            self.connection._update_session_state(first_packet, server_status)
+            self.has_next = (server_status & SERVER_MORE_RESULTS_EXISTS)
+            self.has_result = False
+            return
+        field_count = ord(first_packet.read(1))
+        self.fields = [
+            FieldDescriptorPacket(
+                self.connection.socket.recv_packet(),
+                self.connection.charset,
+                self.connection.encoding,
+            )
+            for i in range(field_count)
+        ]
+        eof_packet = self._packet(self.connection.socket.recv_packet())
+        assert eof_packet.is_eof_packet(), 'Protocol error, expecting EOF'
+        self.description = tuple([field.description() for field in self.fields])
+
+        rows = []
+        while True:
+            data = self.connection.socket.recv_packet()
+            if data[0] == 0xfe and len(data) < 9:
+                is_eof, warning_count, server_status = self._packet(data).is_eof_and_status()
+                self.warning_count = warning_count
+                self.connection.server_status = server_status
+                self.has_next = (server_status & SERVER_MORE_RESULTS_EXISTS)
+                break
+            if data[0] == 0xff:
+                self._packet(data)
+            rows.append(self._decode_row(data))
+        self.rest_rows = rows
+        self.has_result = True
+
+    def _decode_row(self, data):
+        decoders = self.connection.conv
+        encoding = self.connection.encoding
+        pos = 1 + (len(self.fields) + 9) // 8
+        row = []
+        for i, field in enumerate(self.fields):
+            bit = i + 2
+            if data[1 + (bit >> 3)] & (1 << (bit & 7)):
+                row.append(None)
+                continue
+            type_code = field.type_code
+            fixed = (_UNSIGNED if field.flags & FLAG.UNSIGNED else _SIGNED).get(type_code)
+            if fixed is not None:
+                row.append(fixed.unpack_from(data, pos)[0])
+                pos += fixed.size
+            elif type_code in _DATE_TYPES:
+                end = pos + 1 + data[pos]
+                row.append(_decode_datetime(type_code, data[pos + 1:end]))
+                pos = end
+            elif type_code == FIELD_TYPE.TIME:
+                end = pos + 1 + data[pos]
+                row.append(_decode_time(data[pos + 1:end]))
+                pos = end
+            else:
+                length, pos = _read_lenenc(data, pos)
+                value = data[pos:pos + length]
+                pos += length
+                decoder = decoders.get(type_code)
+                if decoder in (convert_characters, convert_json):
+                    value = decoder(value, encoding, field)
+                elif decoder is not None:
+                    value = decoder(value)
+                row.append(value)
+        return tuple(row)
+
+
+class PreparedStatement(object):
+    '''
+    A statement prepared on the server, use Connection.prepare() to
+    create one.  Placeholders are question marks.
+    '''
+    long_data_threshold = 1 << 20
+    long_data_chunk_size = 1 << 20
+
+    def __init__(self, connection, sql):
+        self.connection = connection
+        self.sql = sql
+        connection._execute_command(COMMAND.COM_STMT_PREPARE, sql)
+        data = connection.read_packet().get_all_data()
+        self.statement_id, self.column_count, self.param_count = struct.unpack_from('<IHH', data, 1)
+        self.params = self._read_fields(self.param_count)
+        self.columns = self._read_fields(self.column_count)
+
+    def _read_fields(self, count):
+        if not count:
+            return []
+        conn = self.connection
+        fields = [
+            FieldDescriptorPacket(conn.socket.recv_packet(), conn.charset, conn.encoding)
+            for i in range(count)
+        ]
+        assert conn.read_packet().is_eof_packet(), 'Protocol error, expecting EOF'
+        return fields
+
+    def _iter_chunks(self, value):
+        chunk_size = self.long_data_chunk_size
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            view = memoryview(value)
+            for i in range(0, len(view), chunk_size):
+                yield view[i:i + chunk_size]
+        elif hasattr(value, 'read'):
+            while True:
+                chunk = value.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        else:
+            for chunk in value:
+                yield chunk
+
+    def _send_long_data(self, index, value):
+        conn = self.connection
+        prefix = struct.pack('<IH', self.statement_id, index)
+        sent = False
+        for chunk in self._iter_chunks(value):
+            if isinstance(chunk, str):
+                chunk = chunk.encode(conn.encoding)
+            if chunk or not sent:
+                conn._execute_command(COMMAND.COM_STMT_SEND_LONG_DATA, prefix + chunk)
+                sent = True
+        if not sent:
+            # an empty value has to be sent too, the server expects no value
+            # in COM_STMT_EXECUTE for this parameter
+            conn._execute_command(COMMAND.COM_STMT_SEND_LONG_DATA, prefix)
+
+    def _execute_packet(self, args, long_data):
+        encoding = self.connection.encoding
+        null_bitmap = bytearray((len(args) + 7) // 8)
+        types = []
+        values = []
+        for i, value in enumerate(args):
+            if i in long_data:
+                types.append(struct.pack('<BB', FIELD_TYPE.LONG_BLOB, 0))
+            elif value is None:
+                null_bitmap[i >> 3] |= 1 << (i & 7)
+                types.append(struct.pack('<BB', FIELD_TYPE.NULL, 0))
+            else:
+                type_code, flag, data = _encode_param(value, encoding)
+                types.append(struct.pack('<BB', type_code, flag))
+                values.append(data)
+        packet = [struct.pack('<IBI', self.statement_id, CURSOR_TYPE_NO_CURSOR, 1)]
+        if args:
+            packet.append(bytes(null_bitmap))
+            packet.append(b'\x01')
+            packet.extend(types)
+            packet.extend(values)
+        return b''.join(packet)
+
+    def execute(self, args=()):
+        ''' Execute the statement with args and return its result '''
+        conn = self.connection
+        if isinstance(args, collections.abc.Mapping):
+            raise ProgrammingError("Prepared statements take a sequence of parameters, not a mapping")
+        args = tuple(args or ())
+        if len(args) != self.param_count:
+            raise ProgrammingError(
+                "Statement takes %d parameters, %d given" % (self.param_count, len(args))
+            )
+        long_data = set()
+        for i, value in enumerate(args):
+            if _is_long_data(value, self.long_data_threshold):
+                self._send_long_data(i, value)
+                long_data.add(i)
+        conn._execute_command(COMMAND.COM_STMT_EXECUTE, self._execute_packet(args, long_data))
+        conn._result = BinaryResult(conn)
+        conn._result.read_result()
+        conn._cache_result(None, self.sql)
+        return conn._result
+
+    def next_result(self):
+        conn = self.connection
+        conn._result = BinaryResult(conn)
+        conn._result.read_result()
+        return conn._result
+
+    def reset(self):
+        ''' Discard long data sent for the next execution '''
+        self.connection._execute_command(COMMAND.COM_STMT_RESET, struct.pack('<I', self.statement_id))
+        self.connection._read_ok_packet()
+
+    def close(self):
+        ''' Deallocate the statement on the server '''
+        conn = self.connection
+        if conn is None:
+            return
+        self.connection = None
+        if conn.socket is not None:
+            conn._execute_command(COMMAND.COM_STMT_CLOSE, struct.pack('<I', self.statement_id))
+
+
+class PreparedCursor(Cursor):
+    '''
+    A cursor which executes statements as server side prepared
+    statements.  Queries use the %s placeholders of the other cursors,
+    each query is prepared once per cursor and the statements of the
+    last max_statements queries are kept.
+    '''
+    max_statements = 64
+
+    def __init__(self, connection):
+        super(PreparedCursor, self).__init__(connection)
+        self._statements = collections.OrderedDict()
+        self._statement = None
+
+    def _prepare(self, query):
+        stmt = self._statements.get(query)
+        if stmt is not None:
+            self._statements.move_to_end(query)
+            return stmt
+        sql = PLACEHOLDER_REGEX.sub(lambda m: '?' if m.group() == '%s' else '%', query)
+        stmt = self._statements[query] = self._get_db().prepare(sql)
+        while len(self._statements) > self.max_statements:
+            self._statements.popitem(last=False)[1].close()
+        return stmt
+
+    def execute(self, query, args=None):
+        ''' Execute a query '''
+        self._rowcount = None
+        conn = self._get_db()
+        last = conn._last_execute_cursor()
+        if last is not None:
+            last._flush()
+        del self.messages[:]
+        if not isinstance(query, str):
+            query = query.decode(conn.encoding)
+
+        try:
+            self._statement = self._prepare(query)
+            self._result = self._statement.execute(args)
+        except:
+            exc, value, tb = sys.exc_info()
+            del tb
+            self.messages.append((exc, value))
+            self.errorhandler(exc, value)
+
+        self._executed = query
+        if last is not self:
+            conn._last_execute_cursor = self._weakref
+
+    def nextset(self):
+        ''' Get the next query set '''
+        if self._executed_query:
+            self.fetchall()
+        del self.messages[:]
+
+        if not self._result or not self._result.has_next:
+            return None
+        self._result = self._statement.next_result()
+        return True
+
+    def close(self):
+        if self.connection:
+            super(PreparedCursor, self).close()
+        for stmt in self._statements.values():
+            stmt.close()
+        self._statements = collections.OrderedDict()
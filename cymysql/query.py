@@ -0,0 +1,149 @@
+'''
+Assemble statements from %s style queries and their arguments as bytes.
+
+A query is encoded once and turned into a bytes template with positional
+%s conversions only.  The escaped and encoded arguments are formatted
+into it together with the packet header, whose length is known from the
+lengths of the arguments, so a statement is copied once and sent as it is.
+
+Parsed templates of the last QUERY_CACHE_SIZE distinct queries are kept,
+so executing a query again only escapes the arguments and formats them.
+'''
+import functools
+import re
+import struct
+
+from cymysql.constants import COMMAND
+from cymysql.socketwrapper import MAX_PACKET_LENGTH
+
+# packet length, sequence id and command byte
+HEADER_LENGTH = 5
+
+PLACEHOLDER_REGEX = re.compile(rb'%(?:\(([^)]*)\))?s|%%|%')
+
+QUERY_CACHE_SIZE = 512
+# longer queries, usually generated multi row INSERTs, are not cached
+MAX_CACHED_QUERY_LENGTH = 1 << 16
+
+
+class QueryBuffer(object):
+    '''
+    A COM_QUERY packet, the statement preceded by its packet header.
+    '''
+    __slots__ = ('data', )
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data) - HEADER_LENGTH
+
+    def __bytes__(self):
+        return self.data[HEADER_LENGTH:]
+
+    def statement(self):
+        return memoryview(self.data)[HEADER_LENGTH:]
+
+    def packet(self, command):
+        ''' Return the packet, None if it has to be split or is another command '''
+        if len(self.data) - 4 >= MAX_PACKET_LENGTH or self.data[4] != command:
+            return None
+        return self.data
+
+
+def _parse_query(query, encoding):
+    '''
+    Return (template, literal_length, count, names) for a query.
+    template takes the packet header and the count arguments, names are
+    the keys of %(name)s placeholders or None for %s ones.  Return None
+    if the query has other conversions than %s, %(name)s and %%.
+    '''
+    if isinstance(query, str):
+        query = query.encode(encoding)
+    count = query.count(b'%s')
+    if b'%%' not in query and b'%(' not in query and query.count(b'%') == count:
+        return b'%s' + query, len(query) - 2 * count, count, None
+
+    names = []
+
+    def placeholder(m):
+        if m.group(0) == b'%%':
+            return b'%%'
+        elif m.group(0) == b'%':
+            raise ValueError
+        names.append(m.group(1))
+        return b'%s'
+
+    try:
+        template = b'%s' + PLACEHOLDER_REGEX.sub(placeholder, query)
+    except ValueError:
+        return None
+    count = len(names)
+    if names.count(None) == count:
+        names = None
+    elif None in names:
+        return None
+    else:
+        names = tuple(name.decode(encoding) for name in names)
+    return template, len(template % ((b'', ) * (count + 1))), count, names
+
+
+_cached_parse_query = functools.lru_cache(QUERY_CACHE_SIZE)(_parse_query)
+
+
+def parse_query(query, encoding):
+    ''' Parse query, using the cached template of a query executed before '''
+    if not isinstance(query, (str, bytes)):
+        query = bytes(query)
+    if len(query) > MAX_CACHED_QUERY_LENGTH:
+        return _parse_query(query, encoding)
+    return _cached_parse_query(query, encoding)
+
+
+def _encode(literal, encoding):
+    ''' Encode an escaped literal, bytes ones are _binary literals '''
+    if isinstance(literal, bytes):
+        return literal
+    return literal.encode(encoding)
+
+
+def _format(query, args, escape, encoding):
+    ''' Interpolate with the % operator, for queries parse_query() does not take '''
+    if isinstance(args, (tuple, list)):
+        args = tuple(_encode(escape(arg), encoding) for arg in args)
+    elif isinstance(args, dict):
+        args = dict(
+            (key.encode(encoding), _encode(escape(val), encoding))
+            for (key, val) in args.items()
+        )
+    else:
+        args = _encode(escape(args), encoding)
+    query = query % args
+    return QueryBuffer(struct.pack('<IB', len(query) + 1, COMMAND.COM_QUERY) + query)
+
+
+def build_query(query, args, escape, encoding):
+    '''
+    Return a QueryBuffer with the arguments escaped by escape() in place
+    of the placeholders of query.
+    '''
+    parsed = parse_query(query, encoding)
+    if parsed is not None:
+        template, literal_length, count, names = parsed
+        if names is not None:
+            values = [args[name] for name in names] if isinstance(args, dict) else None
+        elif isinstance(args, (tuple, list)):
+            values = args
+        elif isinstance(args, dict):
+            values = None
+        else:
+            values = (args, )
+        if values is not None and len(values) == count:
+            values = [_encode(escape(value), encoding) for value in values]
+            length = literal_length + sum(map(len, values)) + 1
+            values.insert(0, struct.pack('<IB', length, COMMAND.COM_QUERY))
+            return QueryBuffer(template % tuple(values))
+
+    if isinstance(query, str):
+        query = query.encode(encoding)
+    return _format(query, args, escape, encoding)
@@ -1,4 +1,5 @@
 from cymysql.packet import MysqlPacket, FieldDescriptorPacket
+from cymysql.compact import CompactRows
 
 from cymysql.constants import SERVER_STATUS, FLAG
 
@@ -11,12 +12,17 @@ cdef class MySQLResult(object):
     cdef public object message, description
     cdef public object connection
     cdef public int has_next
-    cdef object first_packet, fields
+    cdef public object fields, row_reader, read_row
+    cdef object first_packet
     cdef int rest_row_index, server_status, warning_count, field_count
 
-    def __init__(self, connection):
+    def __init__(self, connection, row_reader=None):
         from weakref import proxy
         self.connection = proxy(connection)
+        # row_reader(fields, decoders, encoding) returns a function making a row of a packet
+        self.row_reader = row_reader
+        self.read_row = None
+        self.fields = None
         self.affected_rows = None
         self.insert_id = None
         self.server_status = 0
@@ -29,7 +35,7 @@ cdef class MySQLResult(object):
         self.rest_rows = None
         self.rest_row_index = 0
 
-    def read_result(self):
+    def read_result(self, unbuffered=False):
         self.first_packet = MysqlPacket(
             self.connection.socket.recv_packet(),
             self.connection.charset,
@@ -39,21 +45,33 @@ cdef class MySQLResult(object):
         if self.first_packet.is_ok_packet():
             (self.affected_rows, self.insert_id,
                 self.server_status, self.warning_count,
-                self.message) = self.first_packet.read_ok_packet()
+                self.message) = self.first_packet.read_ok_packet(self.connection.session_track)
+            self.connection._update_session_state(self.first_packet, self.server_status)
+            self.has_next = (self.server_status & SERVER_MORE_RESULTS_EXISTS)
             self.has_result = False
         else:
             self.field_count = ord(self.first_packet.read(1))
             self._get_descriptions()
+            if self.row_reader is not None:
+                self.read_row = self.row_reader(self.fields, self.connection.conv, self.connection.encoding)
             self.has_result = True
-            self.read_rest_rowdata_packet()
+            if not unbuffered:
+                self.read_rest_rowdata_packet()
 
     def read_rest_rowdata_packet(self):
         """Read rest rowdata packets for each data row in the result set."""
         cdef int is_eof, warning_count, server_status
+        cdef bint compact
         if (not self.has_result) or (self.rest_rows is not None):
             return
-        rest_rows = []
         decoder = self.connection.conv
+        compact = self.connection.compact_results
+        if compact:
+            rest_rows = CompactRows(
+                self.fields, decoder, self.connection.charset, self.connection.encoding, self.read_row
+            )
+        else:
+            rest_rows = []
         while True:
             packet = MysqlPacket(
                 self.connection.socket.recv_packet(),
@@ -64,9 +82,15 @@ cdef class MySQLResult(object):
             if is_eof:
                 self.warning_count = warning_count
                 self.server_status = server_status
+                self.connection.server_status = server_status
                 self.has_next = (server_status & SERVER_MORE_RESULTS_EXISTS)
                 break
-            rest_rows.append(packet.read_decode_data(self.fields, decoder))
+            if compact:
+                rest_rows.append_packet(packet.get_all_data())
+            elif self.read_row is None:
+                rest_rows.append(packet.read_decode_data(self.fields, decoder))
+            else:
+                rest_rows.append(self.read_row(packet))
         self.rest_rows = rest_rows
         self.rest_row_index = 0
 
@@ -107,11 +131,140 @@ cdef class MySQLResult(object):
             if is_eof:
                 self.warning_count = warning_count
                 self.server_status = server_status
+                self.connection.server_status = server_status
                 self.has_next = (server_status & SERVER_MORE_RESULTS_EXISTS)
                 self.rest_rows = []
                 return None
+            if self.read_row is not None:
+                return self.read_row(packet)
             return packet.read_decode_data(self.fields, self.connection.conv)
         elif len(self.rest_rows) != self.rest_row_index:
             self.rest_row_index += 1
             return self.rest_rows[self.rest_row_index - 1]
         return None
+
+    def fetch_columns(self, columns, size=-1):
+        """Read the next size rows, all if size is negative, into the
+        column buffers of cymysql.columnar, return the number of rows."""
+        cdef int is_eof, warning_count, server_status, n = 0, end, i
+        if not self.has_result:
+            return 0
+        kinds, values, masks = columns.kinds, columns.values, columns.masks
+        decoders, buffers = columns.decoders, columns.buffers
+        if self.rest_rows is not None:
+            end = len(self.rest_rows)
+            if size >= 0:
+                end = min(end, self.rest_row_index + size)
+            if isinstance(self.rest_rows, CompactRows):
+                for i in range(self.rest_row_index, end):
+                    self.rest_rows.packet(i).read_columns(kinds, values, masks, decoders, buffers)
+            else:
+                for row in self.rest_rows[self.rest_row_index:end]:
+                    columns.append_row(row)
+            n = end - self.rest_row_index
+            self.rest_row_index = end
+            return n
+        while n != size:
+            packet = MysqlPacket(
+                self.connection.socket.recv_packet(),
+                self.connection.charset,
+                self.connection.encoding,
+            )
+            is_eof, warning_count, server_status = packet.is_eof_and_status()
+            if is_eof:
+                self.warning_count = warning_count
+                self.server_status = server_status
+                self.connection.server_status = server_status
+                self.has_next = (server_status & SERVER_MORE_RESULTS_EXISTS)
+                self.rest_rows = []
+                break
+            packet.read_columns(kinds, values, masks, decoders, buffers)
+            n += 1
+        return n
+
+    def fetch_json(self, rows, size=-1):
+        """Write the next size rows, all if size is negative, to the
+        cymysql.jsonrows.JsonRows rows, return the number of rows."""
+        cdef int is_eof, warning_count, server_status, n = 0, end, i
+        cdef bint comma
+        if not self.has_result:
+            return 0
+        buffer, kinds, prefixes = rows.buffer, rows.kinds, rows.prefixes
+        suffix, encodings = rows.suffix, rows.encodings
+        if self.rest_rows is not None:
+            end = len(self.rest_rows)
+            if size >= 0:
+                end = min(end, self.rest_row_index + size)
+            if isinstance(self.rest_rows, CompactRows):
+                for i in range(self.rest_row_index, end):
+                    self.rest_rows.packet(i).read_json(
+                        buffer, kinds, prefixes, suffix, encodings, rows.rows > 0
+                    )
+                    rows.rows += 1
+            else:
+                for row in self.rest_rows[self.rest_row_index:end]:
+                    rows.append_row(row)
+            n = end - self.rest_row_index
+            self.rest_row_index = end
+            return n
+        comma = rows.rows > 0
+        while n != size:
+            packet = MysqlPacket(
+                self.connection.socket.recv_packet(),
+                self.connection.charset,
+                self.connection.encoding,
+            )
+            is_eof, warning_count, server_status = packet.is_eof_and_status()
+            if is_eof:
+                self.warning_count = warning_count
+                self.server_status = server_status
+                self.connection.server_status = server_status
+                self.has_next = (server_status & SERVER_MORE_RESULTS_EXISTS)
+                self.rest_rows = []
+                break
+            packet.read_json(buffer, kinds, prefixes, suffix, encodings, comma)
+            comma = True
+            n += 1
+        rows.rows += n
+        return n
+
+    def fetch_delimited(self, rows, size=-1):
+        """Write the next size rows, all if size is negative, to the
+        cymysql.export.DelimitedRows rows, return the number of rows."""
+        cdef int is_eof, warning_count, server_status, n = 0, end, i
+        if not self.has_result:
+            return 0
+        buffer, kinds, encodings = rows.buffer, rows.kinds, rows.encodings
+        delimiter, tsv = rows.delimiter, rows.tsv
+        if self.rest_rows is not None:
+            end = len(self.rest_rows)
+            if size >= 0:
+                end = min(end, self.rest_row_index + size)
+            if isinstance(self.rest_rows, CompactRows):
+                for i in range(self.rest_row_index, end):
+                    self.rest_rows.packet(i).read_delimited(buffer, kinds, encodings, delimiter, tsv)
+                rows.rows += end - self.rest_row_index
+            else:
+                for row in self.rest_rows[self.rest_row_index:end]:
+                    rows.append_row(row)
+            n = end - self.rest_row_index
+            self.rest_row_index = end
+            return n
+        while n != size:
+            packet = MysqlPacket(
+                self.connection.socket.recv_packet(),
+                self.connection.charset,
+                self.connection.encoding,
+            )
+            is_eof, warning_count, server_status = packet.is_eof_and_status()
+            if is_eof:
+                self.warning_count = warning_count
+                self.server_status = server_status
+                self.connection.server_status = server_status
+                self.has_next = (server_status & SERVER_MORE_RESULTS_EXISTS)
+                self.rest_rows = []
+                break
+            packet.read_delimited(buffer, kinds, encodings, delimiter, tsv)
+            n += 1
+        rows.rows += n
+        return n
@@ -0,0 +1,365 @@
+'''
+Read/write splitting across one primary server and its replicas.
+
+Statements are sent to the primary while it has an open transaction or when
+they may modify data. Read only statements issued outside a transaction go
+to a replica chosen by a latency weighted policy, fed from the timings of
+the queries this client runs itself.
+
+    router = Router(
+        {"host": "db-primary"},
+        [{"host": "db-replica1"}, {"host": "db-replica2"}],
+        user="app", passwd="secret", db="app",
+    )
+    cur = router.cursor()
+    cur.execute("SELECT * FROM item WHERE id=%s", (1, ))  # a replica
+    cur.execute("UPDATE item SET n=n+1 WHERE id=%s", (1, ))  # the primary
+    cur.execute("SELECT n FROM item WHERE id=%s", (1, ))  # the primary
+    router.commit()
+
+With causal_reads=True the primary reports the GTID of each transaction it
+commits and a replica waits for that GTID with WAIT_FOR_EXECUTED_GTID_SET()
+before the session's next read, unless it is already known to have it.
+The servers need gtid_mode=ON.
+'''
+import random
+import re
+import time
+
+from cymysql.connections import Connection
+from cymysql.constants import CR
+from cymysql.err import OperationalError
+
+COMMENTS = r"\s*(?:/\*.*?\*/\s*|--[^\n]*\n\s*|#[^\n]*\n\s*)*"
+READ_ONLY_REGEX = re.compile(
+    COMMENTS + r"\(*\s*(?:SELECT|SHOW|DESC|DESCRIBE|EXPLAIN)\b",
+    re.IGNORECASE | re.DOTALL
+)
+SIDE_EFFECT_REGEX = re.compile(
+    r"\bFOR\s+(?:UPDATE|SHARE)\b|\bLOCK\s+IN\s+SHARE\s+MODE\b|\bINTO\b|\bGET_LOCK\s*\(|;\s*\S",
+    re.IGNORECASE
+)
+# reads of the state of the session, which a replica does not share
+SESSION_SHOW_REGEX = re.compile(
+    COMMENTS + r"SHOW\s+(?:SESSION|LOCAL|STATUS|VARIABLES|WARNINGS|ERRORS|PROFILES?|COUNT)\b",
+    re.IGNORECASE | re.DOTALL
+)
+SESSION_REGEX = re.compile(
+    r"@|\b(?:LAST_INSERT_ID|ROW_COUNT|FOUND_ROWS|CONNECTION_ID)\s*\(|\bSQL_CALC_FOUND_ROWS\b",
+    re.IGNORECASE
+)
+LITERAL_REGEX = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`(?:[^`]|``)*`", re.DOTALL)
+
+
+def is_read_only(query):
+    """Return True if query can be sent to a replica.
+
+    Locking reads, SELECT ... INTO and multi statements are treated as
+    writes.  So are reads of the session: user and system variables,
+    LAST_INSERT_ID(), ROW_COUNT(), FOUND_ROWS(), CONNECTION_ID() and SHOW
+    WARNINGS, STATUS or VARIABLES without GLOBAL.  Functions with side
+    effects and temporary tables can not be detected, run such statements
+    inside a transaction so that they reach the primary.
+    """
+    if not isinstance(query, str):
+        query = query.decode('utf-8', 'replace')
+    if READ_ONLY_REGEX.match(query) is None or SESSION_SHOW_REGEX.match(query) is not None:
+        return False
+    if SIDE_EFFECT_REGEX.search(query) is not None:
+        return False
+    return SESSION_REGEX.search(LITERAL_REGEX.sub("''", query)) is None
+
+
+# client errors of a lost connection, the statement did not run
+CONNECTION_ERRORS = frozenset([
+    CR.CR_CONNECTION_ERROR, CR.CR_CONN_HOST_ERROR, CR.CR_SERVER_GONE_ERROR, CR.CR_SERVER_LOST,
+])
+
+
+def is_connection_error(exc):
+    """Return True if exc is a failure of the connection to a server.
+
+    Errors the server returns for a statement, like access denied, a
+    deadlock or max_execution_time, are not.
+    """
+    if isinstance(exc, OperationalError):
+        return bool(exc.args) and exc.args[0] in CONNECTION_ERRORS
+    return isinstance(exc, OSError)
+
+
+class LatencyWeightedPolicy(object):
+    """Choose replicas with a probability inverse to their latency.
+
+    Latency is an exponentially weighted moving average of the query
+    timings recorded by the router.  Replicas without any timing yet get
+    the fastest known latency so that they are tried early.
+    """
+
+    def __init__(self, decay=0.2, failure_penalty=1.0):
+        self.decay = decay
+        self.failure_penalty = failure_penalty
+        self._latency = {}
+
+    def latency(self, node):
+        return self._latency.get(node)
+
+    def record(self, node, elapsed):
+        last = self._latency.get(node)
+        if last is None:
+            self._latency[node] = elapsed
+        else:
+            self._latency[node] = last + (elapsed - last) * self.decay
+
+    def record_failure(self, node):
+        self._latency[node] = max(
+            self._latency.get(node) or 0, self.failure_penalty
+        )
+
+    def choose(self, nodes):
+        if len(nodes) == 1:
+            return nodes[0]
+        known = [self._latency[n] for n in nodes if n in self._latency]
+        default = min(known) if known else 1.0
+        weights = [
+            1.0 / max(self._latency.get(n, default), 1e-6) for n in nodes
+        ]
+        return random.choices(nodes, weights)[0]
+
+
+class RoutingCursor(object):
+    '''
+    A cursor which runs each statement on the connection chosen by a
+    router.  Fetch methods read from the cursor of the last statement.
+    '''
+
+    def __init__(self, router, cursorclass=None):
+        self.router = router
+        self.cursorclass = cursorclass
+        self.arraysize = 1
+        self._cursors = {}
+        self._cursor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc, value, traceback):
+        self.close()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def _get_cursor(self, node, conn):
+        cur = self._cursors.get(node)
+        if cur is None or cur.connection is not conn:
+            cur = conn.cursor(self.cursorclass)
+            self._cursors[node] = cur
+        cur.arraysize = self.arraysize
+        self._cursor = cur
+        return cur
+
+    def _check_executed(self):
+        if self._cursor is None:
+            raise self.router.ProgrammingError(-1, "execute() first")
+
+    @property
+    def connection(self):
+        return self._cursor.connection if self._cursor else None
+
+    @property
+    def description(self):
+        return self._cursor.description if self._cursor else None
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount if self._cursor else -1
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid if self._cursor else None
+
+    def execute(self, query, args=None):
+        return self.router._execute(self, query, args)
+
+    def executemany(self, query, args):
+        node, conn = self.router._primary_node()
+        return self._get_cursor(node, conn).executemany(query, args)
+
+    def callproc(self, procname, args=()):
+        node, conn = self.router._primary_node()
+        return self._get_cursor(node, conn).callproc(procname, args)
+
+    def nextset(self):
+        self._check_executed()
+        return self._cursor.nextset()
+
+    def fetchone(self):
+        self._check_executed()
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=None):
+        self._check_executed()
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        self._check_executed()
+        return self._cursor.fetchall()
+
+    def setinputsizes(self, *args):
+        """Does nothing, required by DB API."""
+
+    def setoutputsizes(self, *args):
+        """Does nothing, required by DB API."""
+
+    def close(self):
+        for cur in self._cursors.values():
+            cur.close()
+        self._cursors = {}
+        self._cursor = None
+
+
+class Router(object):
+    """
+    Route statements between a primary and replica servers.
+
+    primary and each of replicas are dicts of connect() arguments, the
+    other keyword arguments are shared by all of them.  Connections are
+    opened on first use, replica connections run in autocommit mode.
+
+    causal_token is the GTID set the replicas have to wait for with
+    causal_reads.  It can be copied to another Router to carry
+    read-your-writes consistency over to it.
+    """
+
+    def __init__(self, primary, replicas=(), policy=None,
+                 causal_reads=False, gtid_wait_timeout=1, **kwargs):
+        self._primary_kwargs = dict(kwargs, **primary)
+        self._replica_kwargs = [dict(kwargs, **r) for r in replicas]
+        self.policy = policy if policy is not None else LatencyWeightedPolicy()
+        self.causal_reads = causal_reads
+        self.gtid_wait_timeout = gtid_wait_timeout
+        self.causal_token = None
+        if causal_reads:
+            self._primary_kwargs.setdefault('track_gtids', True)
+        self._replica_tokens = {}
+        self._connections = {}
+
+    def _connect(self, kwargs):
+        conn = Connection(**kwargs)
+        conn._connect()
+        conn._initialize()
+        return conn
+
+    def get_connection(self, node):
+        ''' Return the connection of node ("primary" or a replica index) '''
+        conn = self._connections.get(node)
+        if conn is None or conn.closed:
+            if node == 'primary':
+                conn = self._connect(self._primary_kwargs)
+            else:
+                conn = self._connect(self._replica_kwargs[node])
+                conn.autocommit(True)
+            self._connections[node] = conn
+        return conn
+
+    @property
+    def primary(self):
+        return self.get_connection('primary')
+
+    def in_transaction(self):
+        conn = self._connections.get('primary')
+        return bool(conn and not conn.closed and conn.get_transaction_status())
+
+    def choose(self, query):
+        ''' Return the node query should be sent to '''
+        if not self._replica_kwargs or self.in_transaction() or not is_read_only(query):
+            return 'primary'
+        return self.policy.choose(list(range(len(self._replica_kwargs))))
+
+    def _primary_node(self):
+        return 'primary', self.primary
+
+    def _update_causal_token(self):
+        conn = self._connections.get('primary')
+        if conn is not None and conn.causal_token is not None:
+            self.causal_token, conn.causal_token = conn.causal_token, None
+
+    def _wait_for_causal_token(self, node, conn):
+        ''' Wait until the replica has applied causal_token, return False on timeout '''
+        token = self.causal_token
+        if token is None or self._replica_tokens.get(node) == token:
+            return True
+        cur = conn.cursor()
+        cur.execute("SELECT WAIT_FOR_EXECUTED_GTID_SET(%s, %s)", (token, self.gtid_wait_timeout))
+        (timed_out, ) = cur.fetchone()
+        if timed_out:
+            return False
+        self._replica_tokens[node] = token
+        return True
+
+    def _execute(self, cursor, query, args):
+        node = self.choose(query)
+        if node != 'primary':
+            start = time.monotonic()
+            try:
+                conn = self.get_connection(node)
+                if not self.causal_reads or self._wait_for_causal_token(node, conn):
+                    result = cursor._get_cursor(node, conn).execute(query, args)
+                    self.policy.record(node, time.monotonic() - start)
+                    return result
+            except (OperationalError, OSError) as e:
+                if not is_connection_error(e):
+                    raise
+                self.policy.record_failure(node)
+                self._discard(node)
+            node = 'primary'
+        result = cursor._get_cursor(node, self.primary).execute(query, args)
+        self._update_causal_token()
+        return result
+
+    def _discard(self, node):
+        conn = self._connections.pop(node, None)
+        if conn is not None and conn.socket is not None:
+            conn.socket.close()
+            conn.socket = None
+
+    def cursor(self, cursor=None):
+        ''' Create a new cursor which routes statements '''
+        return RoutingCursor(self, cursor)
+
+    def autocommit(self, value):
+        self.primary.autocommit(value)
+
+    def commit(self):
+        if 'primary' in self._connections:
+            self.primary.commit()
+            self._update_causal_token()
+
+    def rollback(self):
+        if 'primary' in self._connections:
+            self.primary.rollback()
+
+    def close(self):
+        for node in list(self._connections):
+            conn = self._connections.pop(node)
+            if not conn.closed:
+                conn.close()
+
+    def __enter__(self):
+        return self.cursor()
+
+    def __exit__(self, exc, value, traceback):
+        if exc:
+            self.rollback()
+        else:
+            self.commit()
+
+    Warning = Connection.Warning
+    Error = Connection.Error
+    InterfaceError = Connection.InterfaceError
+    DatabaseError = Connection.DatabaseError
+    DataError = Connection.DataError
+    OperationalError = Connection.OperationalError
+    IntegrityError = Connection.IntegrityError
+    InternalError = Connection.InternalError
+    ProgrammingError = Connection.ProgrammingError
+    NotSupportedError = Connection.NotSupportedError
@@ -0,0 +1,315 @@
+'''
+Row types other than tuples, made by the row_reader of a cursor.
+
+LazyRowCursor returns LazyRow objects, which keep the row packet and
+decode a column the first time it is read, by position, by name or as an
+attribute:
+
+    cur = conn.cursor(LazyRowCursor)
+    cur.execute("SELECT * FROM orders")
+    for row in cur:
+        total += row.amount
+
+The rows of a result share one RowLayout with the column names, the
+index of each name and the decoders of the columns.
+
+DictCursor reads rows straight into dicts keyed by the interned column
+names.  RowMappingCursor returns RowMapping objects instead, read only
+mappings sharing the names of the result and holding a tuple of values,
+several times smaller than dicts for results of many columns.
+
+NamedTupleCursor returns rows as instances of a namedtuple type made
+once per tuple of column names, with attribute access at the cost and
+size of a tuple.
+
+TypedCursor builds each row by calling a row_factory, a class with
+__slots__, a dataclass or any callable, with the columns matching its
+parameters by name.  A RowPlan made once per result maps the columns to
+the arguments, with optional converters of the values by column name:
+
+    cur = conn.cursor(TypedCursor)
+    cur.execute("SELECT id, name FROM users", row_factory=User)
+    users = cur.fetchall()
+'''
+import collections
+import collections.abc
+import functools
+import inspect
+import sys
+
+from cymysql.columnar import column_decoder
+
+_UNSET = object()
+
+
+class RowLayout(object):
+    '''
+    The names and decoders of the columns of a result.  A name used by
+    several columns refers to the first one.
+    '''
+    __slots__ = ('names', 'index', 'decoders')
+
+    def __init__(self, names, decoders=None):
+        self.names = tuple(names)
+        self.index = {}
+        for i, name in enumerate(self.names):
+            self.index.setdefault(name, i)
+        self.decoders = decoders
+
+    @classmethod
+    def from_fields(cls, fields, decoders, encoding):
+        return cls(
+            [field.name for field in fields],
+            [column_decoder(field, decoders, encoding) for field in fields],
+        )
+
+
+class RowMapping(collections.abc.Mapping):
+    '''
+    A read only mapping of column names to the values of a row, the
+    names are shared by the rows of a result.  It compares equal to the
+    dict of its items.
+    '''
+    __slots__ = ('_layout', '_values')
+
+    def __init__(self, layout, values):
+        self._layout = layout
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._layout.index[key]]
+
+    def __iter__(self):
+        return iter(self._layout.names)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._layout.index
+
+    def values(self):
+        return self._values
+
+    def as_dict(self):
+        return dict(zip(self._layout.names, self._values))
+
+    def __repr__(self):
+        return 'RowMapping(%r)' % (self.as_dict(), )
+
+
+class LazyRow(object):
+    '''
+    A row which decodes a column of its packet when it is first read.
+    It compares equal to the tuple of its values.
+    '''
+    __slots__ = ('_layout', '_packet', '_cells', '_values')
+
+    def __init__(self, layout, packet):
+        self._layout = layout
+        self._packet = packet
+        self._cells = None
+        self._values = [_UNSET] * len(layout.names)
+
+    @classmethod
+    def from_values(cls, layout, values):
+        ''' Make a row of decoded values, as the query cache keeps them '''
+        row = cls.__new__(cls)
+        row._layout = layout
+        row._packet = None
+        row._cells = None
+        row._values = list(values)
+        return row
+
+    def _decode(self, index):
+        if self._cells is None:
+            self._cells = self._packet.read_cell_offsets(len(self._values))
+        start, length = self._cells[2 * index], self._cells[2 * index + 1]
+        if length < 0:
+            value = None
+        else:
+            value = self._layout.decoders[index](self._packet.get_all_data()[start:start + length])
+        self._values[index] = value
+        return value
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self._layout.index[key]
+        elif isinstance(key, slice):
+            return tuple(self[i] for i in range(*key.indices(len(self._values))))
+        value = self._values[key]
+        if value is _UNSET:
+            if key < 0:
+                key += len(self._values)
+            value = self._decode(key)
+        return value
+
+    def __getattr__(self, name):
+        try:
+            index = self._layout.index[name]
+        except KeyError:
+            raise AttributeError(name)
+        return self[index]
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        for i in range(len(self._values)):
+            yield self[i]
+
+    def keys(self):
+        return self._layout.names
+
+    def as_tuple(self):
+        return tuple(self)
+
+    def as_dict(self):
+        return dict(zip(self._layout.names, self))
+
+    def __eq__(self, other):
+        if isinstance(other, LazyRow):
+            other = tuple(other)
+        return tuple(self) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return 'LazyRow(%s)' % (', '.join(
+            '%s=%r' % (name, value) for name, value in zip(self._layout.names, self)
+        ), )
+
+
+def lazy_row_reader(fields, decoders, encoding):
+    ''' A row_reader making LazyRow objects '''
+    layout = RowLayout.from_fields(fields, decoders, encoding)
+    return lambda packet: LazyRow(layout, packet)
+
+
+def dict_row_reader(fields, decoders, encoding):
+    ''' A row_reader making dicts '''
+    keys = tuple([sys.intern(field.name) for field in fields])
+    decoders = [column_decoder(field, decoders, encoding, None) for field in fields]
+    return lambda packet: packet.read_decode_dict(keys, decoders)
+
+
+def row_mapping_reader(fields, decoders, encoding):
+    ''' A row_reader making RowMapping objects '''
+    layout = RowLayout([field.name for field in fields])
+    return lambda packet: RowMapping(layout, packet.read_decode_data(fields, decoders))
+
+
+@functools.lru_cache(maxsize=256)
+def namedtuple_row_type(names):
+    '''
+    Return the namedtuple type of rows of the tuple of column names,
+    names which are not identifiers are renamed to _<index>
+    '''
+    return collections.namedtuple('Row', names, rename=True)
+
+
+def namedtuple_row_reader(fields, decoders, encoding):
+    ''' A row_reader making rows of namedtuple_row_type '''
+    row_type = namedtuple_row_type(tuple([field.name for field in fields]))
+    decoders = [column_decoder(field, decoders, encoding, None) for field in fields]
+    return lambda packet: packet.read_decode_tuple(decoders, row_type)
+
+
+def _compose(converter, decoder):
+    if decoder is None:
+        return converter
+    return lambda value: converter(decoder(value))
+
+
+class RowPlan(object):
+    '''
+    How to build a row with factory from the columns of a result.
+    Columns are passed to the parameters of factory of the same name,
+    positionally if they make the first parameters, as keywords
+    otherwise, and all of them as keywords if factory takes **kwargs.
+    Other columns are skipped.  A factory of unknown signature, or
+    without named parameters, gets the columns positionally in order.
+    converters are applied to the values which are not NULL of the
+    columns they are given for by name.  missing lists the
+    required parameters no column matches.
+    '''
+
+    def __init__(self, factory, names, decoders=None, converters=None):
+        self.factory = factory
+        names = list(names)
+        converters = converters or {}
+        self.converters = [converters.get(name) for name in names]
+        if decoders is None:
+            decoders = [None] * len(names)
+        self.decoders = [
+            decoder if converter is None else _compose(converter, decoder)
+            for decoder, converter in zip(decoders, self.converters)
+        ]
+        self.missing = []
+        try:
+            parameters = list(inspect.signature(factory).parameters.values())
+        except (TypeError, ValueError):
+            parameters = None
+        if parameters is None or all(
+            p.kind in (p.POSITIONAL_ONLY, p.VAR_POSITIONAL) for p in parameters
+        ):
+            self.keys = tuple(names)
+            self.slots = list(range(len(names)))
+            self.keywords = False
+            return
+
+        if any(p.kind == p.VAR_KEYWORD for p in parameters):
+            matched = list(collections.OrderedDict.fromkeys(names))
+        else:
+            accepted = set(p.name for p in parameters if p.kind != p.POSITIONAL_ONLY)
+            matched = [name for name in collections.OrderedDict.fromkeys(names) if name in accepted]
+        self.missing = [
+            p.name for p in parameters
+            if p.default is p.empty and p.kind in (p.POSITIONAL_OR_KEYWORD, p.KEYWORD_ONLY)
+            and p.name not in matched
+        ]
+        positional = [p.name for p in parameters if p.kind == p.POSITIONAL_OR_KEYWORD]
+        if set(positional[:len(matched)]) == set(matched):
+            self.keys = tuple(positional[:len(matched)])
+            self.keywords = False
+        else:
+            self.keys = tuple(matched)
+            self.keywords = True
+        index = dict((key, i) for i, key in enumerate(self.keys))
+        self.slots = []
+        for name in names:
+            # a repeated column name refers to the first column
+            self.slots.append(index.pop(name, -1))
+
+    def __call__(self, packet):
+        if self.missing:
+            # read the rows as tuples, the cursor raises the error
+            return packet.read_decode_tuple(self.decoders)
+        return packet.read_decode_call(self.decoders, self.slots, self.keys, self.factory, self.keywords)
+
+    def make(self, values):
+        ''' Build a row from a tuple of decoded values '''
+        args = [None] * len(self.keys)
+        for value, slot, converter in zip(values, self.slots, self.converters):
+            if slot >= 0:
+                if value is not None and converter is not None:
+                    value = converter(value)
+                args[slot] = value
+        if self.keywords:
+            return self.factory(**dict(zip(self.keys, args)))
+        return self.factory(*args)
+
+
+def row_plan_reader(factory, converters=None):
+    ''' Return a row_reader building rows with factory, see RowPlan '''
+    def reader(fields, decoders, encoding):
+        return RowPlan(
+            factory, [field.name for field in fields],
+            [column_decoder(field, decoders, encoding, None) for field in fields],
+            converters,
+        )
+    return reader
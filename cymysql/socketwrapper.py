@@ -5,6 +5,9 @@ except ImportError:
     pyzstd = None
 from cymysql.err import OperationalError
 
+MAX_PACKET_LENGTH = 0xffffff
+MIN_COMPRESS_LENGTH = 50
+
 
 def pack_int24(n):
     return bytes([n & 0xFF, (n >> 8) & 0xFF, (n >> 16) & 0xFF])
@@ -15,76 +18,150 @@ def unpack_uint24(n):
 
 
 class SocketWrapper():
-    def __init__(self, sock, compress):
+    def __init__(self, sock, compress, compress_level=None, compress_threshold=MIN_COMPRESS_LENGTH):
         self._sock = sock
         self._compress = compress
+        self._compress_threshold = compress_threshold
+        # decompressed data not returned yet starts at _decompressed_pos
         self._decompressed = b''
+        self._decompressed_pos = 0
+        self._compressor = None
+        self._decompressor = None
+        if compress == "zlib":
+            self._compress_level = -1 if compress_level is None else compress_level
+        elif compress == "zstd":
+            self._compress_level = 3 if compress_level is None else compress_level
+            self._compressor = pyzstd.ZstdCompressor(self._compress_level)
+            self._decompressor = pyzstd.EndlessZstdDecompressor()
 
     def recv(self, size):
-        r = b''
-        while size:
-            recv_data = self._sock.recv(size)
-            if not recv_data:
+        recv_data = self._sock.recv(size)
+        if len(recv_data) == size:
+            return recv_data
+        if not recv_data:
+            raise OperationalError(2013, "Lost connection to MySQL server during query")
+        buf = bytearray(size)
+        view = memoryview(buf)
+        pos = len(recv_data)
+        view[:pos] = recv_data
+        while pos < size:
+            n = self._sock.recv_into(view[pos:], size - pos)
+            if not n:
                 raise OperationalError(2013, "Lost connection to MySQL server during query")
-            size -= len(recv_data)
-            r += recv_data
-        return r
+            pos += n
+        return bytes(buf)
 
     def recv_uncompress_packet(self):
         return self.recv(unpack_uint24(self.recv(4)))
 
+    def _decompress_frame(self, header, data):
+        uncompressed_length = unpack_uint24(header[4:])
+        if uncompressed_length == 0:
+            return data
+        if self._compress == "zlib":
+            data = zlib.decompress(data, bufsize=uncompressed_length)
+        elif self._compress == "zstd":
+            data = self._decompressor.decompress(data)
+        if len(data) != uncompressed_length:
+            raise OperationalError(2027, "Malformed packet")
+        return data
+
+    def _recv_compressed_frame(self):
+        header = self.recv(7)
+        return self._decompress_frame(header, self.recv(unpack_uint24(header)))
+
     def _recv_from_decompressed(self, size):
-        if len(self._decompressed) < size:
-            compressed_length = unpack_uint24(self.recv(3))
-            self.recv(1)  # compressed sequence
-            uncompressed_length = unpack_uint24(self.recv(3))
-            data = self.recv(compressed_length)
-            if uncompressed_length != 0:
-                if self._compress == "zlib":
-                    data = zlib.decompress(data)
-                elif self._compress == "zstd":
-                    data = pyzstd.decompress(data)
-                assert len(data) == uncompressed_length
-            self._decompressed += data
-        recv_data, self._decompressed = self._decompressed[:size], self._decompressed[size:]
-        return recv_data
+        pos = self._decompressed_pos
+        available = len(self._decompressed) - pos
+        if available >= size:
+            self._decompressed_pos = pos + size
+            if pos == 0 and size == available:
+                return self._decompressed
+            return self._decompressed[pos:pos + size]
+        # only the requested bytes are copied out of the following frames
+        chunks = [self._decompressed[pos:]]
+        self._decompressed = b''
+        size -= available
+        while True:
+            data = self._recv_compressed_frame()
+            if len(data) >= size:
+                break
+            chunks.append(data)
+            size -= len(data)
+        self._decompressed = data
+        self._decompressed_pos = size
+        chunks.append(data[:size] if size < len(data) else data)
+        return b''.join(chunks)
 
-    def recv_packet(self):
-        """Read entire mysql packet."""
-        recv_data = b''
+    def _recv_payload(self, size):
         if self._compress:
-            ln = unpack_uint24(self._recv_from_decompressed(4))
-            recv_data = self._recv_from_decompressed(ln)
-        else:
-            while True:
-                recv_data += self.recv(unpack_uint24(self.recv(4)))
-                if recv_data[:3] != b'\xff\xff\xff':
-                    break
-        return recv_data
+            return self._recv_from_decompressed(size)
+        return self.recv(size)
+
+    def recv_payload(self, size):
+        """Read size bytes of the (decompressed) packet stream."""
+        return self._recv_payload(size)
+
+    def recv_packet(self):
+        """Read entire mysql packet.
+
+        Payloads split into MAX_PACKET_LENGTH sized packets are joined
+        once after all of them are read.
+        """
+        ln = unpack_uint24(self._recv_payload(4))
+        recv_data = self._recv_payload(ln)
+        if ln < MAX_PACKET_LENGTH:
+            return recv_data
+        chunks = [recv_data]
+        while ln == MAX_PACKET_LENGTH:
+            ln = unpack_uint24(self._recv_payload(4))
+            chunks.append(self._recv_payload(ln))
+        return b''.join(chunks)
 
     def send_uncompress_packet(self, data):
         self._sock.sendall(data)
 
+    def _compress_frame(self, data):
+        if self._compress == "zlib":
+            return zlib.compress(data, self._compress_level)
+        return self._compressor.compress(data, pyzstd.ZstdCompressor.FLUSH_FRAME)
+
+    def _compress_packets(self, data):
+        """Pack data into compressed frames of at most MAX_PACKET_LENGTH bytes each."""
+        frames = []
+        view = memoryview(data)
+        seq = 0
+        start = 0
+        while True:
+            chunk = view[start:start + MAX_PACKET_LENGTH]
+            uncompressed_length = len(chunk)
+            compressed = None
+            if uncompressed_length >= self._compress_threshold:
+                compressed = self._compress_frame(chunk)
+                if len(compressed) >= uncompressed_length:
+                    compressed = None
+            if compressed is None:
+                compressed = chunk
+                uncompressed_length = 0
+            frames.append(
+                pack_int24(len(compressed)) + bytes([seq & 0xFF]) + pack_int24(uncompressed_length)
+            )
+            frames.append(compressed)
+            seq += 1
+            start += MAX_PACKET_LENGTH
+            if start >= len(data):
+                break
+        return b''.join(frames)
+
     def send_packet(self, data):
         if self._compress:
-            uncompressed_length = len(data)
-            if uncompressed_length < 50:
-                compressed = data
-                compressed_length = len(compressed)
-                uncompressed_length = 0
-            else:
-                if self._compress == "zlib":
-                    compressed = zlib.compress(data)
-                elif self._compress == "zstd":
-                    compressed = pyzstd.compress(data)
-                compressed_length = len(compressed)
-                if len(data) < compressed_length:
-                    compressed = data
-                    compressed_length = len(compressed)
-                    uncompressed_length = 0
-            data = pack_int24(compressed_length) + b'\x00' + pack_int24(uncompressed_length) + compressed
+            data = self._compress_packets(data)
         self._sock.sendall(data)
 
+    def send_packets(self, packets):
+        """Send several packets together, in one compressed frame if they fit."""
+        self.send_packet(b''.join(packets))
+
     def setblocking(self, b):
         self._sock.setblocking(b)
 
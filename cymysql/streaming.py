@@ -0,0 +1,269 @@
+'''
+Stream large BLOB and TEXT values to files or callbacks.
+
+StreamingCursor reads rows without buffering the result.  Values of BLOB
+and TEXT columns of blob_threshold bytes or more are not read into memory,
+they are written chunk by chunk, as the packets arrive, to the object
+returned by blob_sink(field, length).  The row holds that object in place
+of the value.
+
+    cur = conn.cursor(StreamingCursor)
+    cur.blob_sink = spool_sink
+    cur.execute("SELECT id, data FROM media")
+    for id, data in cur:
+        shutil.copyfileobj(data, open("%d.bin" % (id, ), "wb"))
+
+A sink is a writable file like object or a callable which is called with
+each chunk.  Objects with a seek() method are rewound once the value is
+written.  Chunks are bytes like objects only valid during the call.
+'''
+import mmap
+import tempfile
+
+from cymysql.constants import COMMAND, FIELD_TYPE
+from cymysql.converters import convert_characters, convert_json
+from cymysql.cursors import SSCursor
+from cymysql.err import OperationalError
+from cymysql.packet import MysqlPacket, FieldDescriptorPacket
+from cymysql.result import MySQLResult, SERVER_MORE_RESULTS_EXISTS
+from cymysql.socketwrapper import MAX_PACKET_LENGTH
+
+BLOB_TYPES = frozenset([
+    FIELD_TYPE.TINY_BLOB, FIELD_TYPE.MEDIUM_BLOB, FIELD_TYPE.LONG_BLOB, FIELD_TYPE.BLOB,
+])
+
+
+def spool_sink(field, length):
+    ''' Write each value to an anonymous temporary file '''
+    return tempfile.TemporaryFile()
+
+
+def mmap_sink(field, length):
+    ''' Write each value to a memory map of an anonymous temporary file '''
+    with tempfile.TemporaryFile() as f:
+        f.truncate(length)
+        return mmap.mmap(f.fileno(), length)
+
+
+def _discard(chunk):
+    pass
+
+
+class PacketReader(object):
+    '''
+    Read the payload of one packet, which may be split into several
+    MAX_PACKET_LENGTH sized packets, in pieces of at most chunk_size bytes.
+    '''
+
+    def __init__(self, socket, chunk_size):
+        self._socket = socket
+        self._chunk_size = chunk_size
+        self._buf = b''
+        self._pos = 0
+        self._remaining = 0     # unread bytes of the current packet
+        self._more = True       # another packet continues the payload
+        self.length = None      # length of the first packet
+
+    def _fill(self):
+        ''' Buffer the next piece of the payload '''
+        while not self._remaining:
+            if not self._more:
+                raise OperationalError(2027, "Malformed packet")
+            ln = self._socket.recv_payload(4)
+            ln = ln[0] + (ln[1] << 8) + (ln[2] << 16)
+            if self.length is None:
+                self.length = ln
+            self._remaining = ln
+            self._more = ln == MAX_PACKET_LENGTH
+            if not ln and not self._more:
+                break
+        n = min(self._remaining, self._chunk_size)
+        self._buf = self._socket.recv_payload(n) if n else b''
+        self._pos = 0
+        self._remaining -= n
+
+    def peek(self):
+        ''' Return the first byte of the payload '''
+        if self.length is None:
+            self._fill()
+        return self._buf[self._pos]
+
+    def read(self, size):
+        pos = self._pos
+        if pos + size <= len(self._buf):
+            self._pos = pos + size
+            return self._buf[pos:pos + size]
+        parts = [self._buf[pos:]]
+        size -= len(self._buf) - pos
+        while size:
+            self._fill()
+            n = min(size, len(self._buf))
+            parts.append(self._buf[:n])
+            self._pos = n
+            size -= n
+        return b''.join(parts)
+
+    def read_all(self):
+        ''' Read the rest of the payload '''
+        parts = [self.read(len(self._buf) - self._pos)]
+        while self._remaining or self._more:
+            self._fill()
+            parts.append(self.read(len(self._buf)))
+        return b''.join(parts)
+
+    def copy(self, size, write):
+        ''' Pass the next size bytes of the payload to write() '''
+        while size:
+            if self._pos == len(self._buf):
+                self._fill()
+            pos = self._pos
+            n = min(size, len(self._buf) - pos)
+            write(memoryview(self._buf)[pos:pos + n])
+            self._pos = pos + n
+            size -= n
+
+    def read_length_coded_binary(self):
+        c = self.read(1)[0]
+        if c == 251:
+            return None
+        elif c == 252:
+            return int.from_bytes(self.read(2), 'little')
+        elif c == 253:
+            return int.from_bytes(self.read(3), 'little')
+        elif c == 254:
+            return int.from_bytes(self.read(8), 'little')
+        return c
+
+    def finish(self):
+        ''' Consume the empty packet which may end the payload '''
+        if self._pos != len(self._buf) or self._remaining:
+            raise OperationalError(2027, "Malformed packet")
+        if self._more:
+            self._fill()
+            self.finish()
+
+
+class StreamingResult(MySQLResult):
+    '''
+    An unbuffered result which hands large BLOB and TEXT values to a sink.
+    '''
+
+    def __init__(self, connection, blob_sink, blob_threshold, chunk_size):
+        super(StreamingResult, self).__init__(connection)
+        self.blob_sink = blob_sink
+        self.blob_threshold = blob_threshold
+        self.chunk_size = chunk_size
+
+    def _packet(self, data):
+        return MysqlPacket(data, self.connection.charset, self.connection.encoding)
+
+    def read_result(self, unbuffered=True):
+        first_packet = self._packet(self.connection.socket.recv_packet())
+        if first_packet.is_ok_packet():
+            (self.affected_rows, self.insert_id,
+                server_status, self.warning_count,
+                self.message) = first_packet.read_ok_packet(self.connection.session_track)
+            self.connection._update_session_state(first_packet, server_status)
+            self.has_next = (server_status & SERVER_MORE_RESULTS_EXISTS)
+            self.has_result = False
+            return
+        field_count = ord(first_packet.read(1))
+        self.fields = [
+            FieldDescriptorPacket(
+                self.connection.socket.recv_packet(),
+                self.connection.charset,
+                self.connection.encoding,
+            )
+            for i in range(field_count)
+        ]
+        eof_packet = self._packet(self.connection.socket.recv_packet())
+        assert eof_packet.is_eof_packet(), 'Protocol error, expecting EOF'
+        self.description = tuple([field.description() for field in self.fields])
+        self.has_result = True
+
+    def _read_row(self, reader, write=None):
+        decoders = self.connection.conv
+        encoding = self.connection.encoding
+        row = []
+        for field in self.fields:
+            length = reader.read_length_coded_binary()
+            if length is None:
+                row.append(None)
+            elif length >= self.blob_threshold and field.type_code in BLOB_TYPES:
+                if write is not None:
+                    reader.copy(length, write)
+                    continue
+                sink = self.blob_sink(field, length)
+                reader.copy(length, getattr(sink, 'write', sink))
+                if hasattr(sink, 'seek'):
+                    sink.seek(0)
+                row.append(sink)
+            else:
+                value = reader.read(length)
+                decoder = decoders.get(field.type_code)
+                if decoder in (convert_characters, convert_json):
+                    row.append(decoder(value, encoding, field))
+                else:
+                    row.append(decoder(value))
+        reader.finish()
+        return tuple(row)
+
+    def _next_row(self, write=None):
+        if not self.has_result or self.rest_rows is not None:
+            return None
+        reader = PacketReader(self.connection.socket, self.chunk_size)
+        first = reader.peek()
+        if first == 0xff or (first == 0xfe and reader.length < 9):
+            packet = self._packet(reader.read_all())
+            is_eof, warning_count, server_status = packet.is_eof_and_status()
+            self.warning_count = warning_count
+            self.connection.server_status = server_status
+            self.has_next = (server_status & SERVER_MORE_RESULTS_EXISTS)
+            self.rest_rows = []
+            return None
+        return self._read_row(reader, write)
+
+    def fetchone(self):
+        return self._next_row()
+
+    def read_rest_rowdata_packet(self):
+        """Skip the rows not fetched yet without calling the sink."""
+        while self._next_row(_discard) is not None:
+            pass
+
+
+class StreamingCursor(SSCursor):
+    '''
+    An unbuffered cursor which writes BLOB and TEXT values of
+    blob_threshold bytes or more to the object returned by
+    blob_sink(field, length) instead of reading them into memory.
+    '''
+    blob_threshold = 1 << 20
+    chunk_size = 1 << 16
+
+    def __init__(self, connection):
+        super(StreamingCursor, self).__init__(connection)
+        self.blob_sink = spool_sink
+
+    def _read_result(self, conn):
+        conn._result = StreamingResult(conn, self.blob_sink, self.blob_threshold, self.chunk_size)
+        conn._result.read_result()
+        self._do_get_result()
+
+    def _query(self, q):
+        conn = self._get_db()
+        self._last_query = q
+        conn._execute_command(COMMAND.COM_QUERY, q)
+        self._read_result(conn)
+        conn._cache_result(None, q)
+
+    def nextset(self):
+        ''' Skip the rest of the current result and get the next one '''
+        if self._result is not None:
+            self._result.read_rest_rowdata_packet()
+        del self.messages[:]
+
+        if not self._result or not self._result.has_next:
+            return None
+        self._read_result(self._get_db())
+        return True
@@ -3,6 +3,11 @@ from cymysql.tests.test_example import * # noqa
 from cymysql.tests.test_basic import * # noqa
 from cymysql.tests.test_DictCursor import * # noqa
 from cymysql.tests.test_async import * # noqa
+from cymysql.tests.test_routing import * # noqa
+from cymysql.tests.test_streaming import * # noqa
+from cymysql.tests.test_prepared import * # noqa
+from cymysql.tests.test_cache import * # noqa
+from cymysql.tests.test_export import * # noqa
 
 
 if __name__ == "__main__":
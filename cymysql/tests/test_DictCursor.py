@@ -60,6 +60,27 @@ class TestDictCursor(base.PyMySQLTestCase):
         finally:
             c.execute("drop table dictcursor")
 
+    def test_RowMappingCursor(self):
+        from cymysql.rows import RowMapping
+        conn = self.connections[0]
+        c = conn.cursor(cymysql.cursors.RowMappingCursor)
+        c.execute("SELECT 1 AS a, 'x' AS b UNION ALL SELECT 2, NULL")
+        rows = c.fetchall()
+        self.assertIsInstance(rows[0], RowMapping)
+        self.assertEqual([{'a': 1, 'b': 'x'}, {'a': 2, 'b': None}], rows)
+        self.assertEqual(['a', 'b'], list(rows[1]))
+        self.assertEqual('x', rows[0]['b'])
+
+    def test_NamedTupleCursor(self):
+        conn = self.connections[0]
+        c = conn.cursor(cymysql.cursors.NamedTupleCursor)
+        c.execute("SELECT 1 AS a, 'x' AS b, 3 AS `c d`")
+        r = c.fetchone()
+        self.assertEqual((1, 'x', 3), r)
+        self.assertEqual((1, 'x', 3), (r.a, r.b, r._2))
+        c.execute("SELECT 2 AS a, 'y' AS b, 4 AS `c d`")
+        self.assertIs(type(r), type(c.fetchone()))
+
 
 __all__ = ["TestDictCursor"]
 
@@ -89,6 +89,37 @@ class AsyncTestCase(base.PyMySQLTestCase):
         loop.run_until_complete(_test_select(loop))
         loop.close()
 
+    def test_pool_release_in_transaction(self):
+        async def _test_release(loop):
+            pool = await cymysql.aio.create_pool(
+                host=self.test_host,
+                user="root",
+                passwd=self.test_passwd,
+                db="mysql",
+                loop=loop,
+            )
+            async with pool.acquire() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("START TRANSACTION")
+                    await cur.execute("SELECT COUNT(*) FROM mysql.user")
+                    await cur.fetchall()
+                self.assertTrue(conn.get_transaction_status())
+            self.assertEqual(pool.freesize, 1)
+            self.assertFalse(conn.closed)
+            self.assertFalse(conn.get_transaction_status())
+
+            await pool.fetchall("SELECT COUNT(*) FROM mysql.user")
+            self.assertEqual(pool.freesize, 1)
+            async with pool.acquire() as other:
+                self.assertIs(other, conn)
+            pool.close()
+            await pool.wait_closed()
+            self.assertTrue(conn.closed)
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(_test_release(loop))
+        loop.close()
+
     def test_dict_cursor(self):
         async def _test_select(loop):
             pool = await cymysql.aio.create_pool(
@@ -163,6 +194,75 @@ class AsyncTestCase(base.PyMySQLTestCase):
 
         asyncio.run(_test_rowcount())
 
+    def test_single_flight(self):
+        async def _test_single_flight():
+            pool = await cymysql.aio.create_pool(
+                host=self.test_host,
+                user="root",
+                passwd=self.test_passwd,
+                db="mysql",
+                maxsize=5,
+                single_flight=True,
+            )
+            results = await asyncio.gather(*[
+                pool.fetchall("SELECT SLEEP(0.1), %s", (42, )) for i in range(20)
+            ])
+            self.assertEqual(results, [[(0, 42)]] * 20)
+            self.assertEqual(pool.single_flight.executions, 1)
+            self.assertEqual(pool.single_flight.coalesced, 19)
+            self.assertEqual(pool.single_flight.in_flight, 0)
+            pool.close()
+            await pool.wait_closed()
+
+        asyncio.run(_test_single_flight())
+
+    def test_loader(self):
+        async def _test_loader():
+            pool = await cymysql.aio.create_pool(
+                host=self.test_host,
+                user="root",
+                passwd=self.test_passwd,
+                db="mysql",
+                maxsize=5,
+            )
+            loader = pool.loader(
+                "SELECT help_topic_id, name FROM help_topic WHERE help_topic_id IN %s",
+                max_batch_size=10,
+            )
+            rows = await asyncio.gather(*[loader.load(i) for i in range(20)] + [loader.load(-1)])
+            self.assertEqual([row[0] for row in rows[:20]], list(range(20)))
+            self.assertIsNone(rows[20])
+            self.assertEqual(loader.batches, 3)
+            pool.close()
+            await pool.wait_closed()
+
+        asyncio.run(_test_loader())
+
+    def test_loader_cancel(self):
+        async def _test_loader_cancel():
+            pool = await cymysql.aio.create_pool(
+                host=self.test_host,
+                user="root",
+                passwd=self.test_passwd,
+                db="mysql",
+                maxsize=1,
+            )
+            loader = pool.loader("SELECT help_topic_id, name FROM help_topic WHERE help_topic_id IN %s")
+            conn = await pool.acquire()
+            future = loader.load(1)
+            await asyncio.sleep(0.1)
+            # the batch waits for the connection when it is cancelled
+            for task in asyncio.all_tasks():
+                if task is not asyncio.current_task():
+                    task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await asyncio.wait_for(future, 5)
+            pool.release(conn)
+            pool.close()
+            await pool.wait_closed()
+
+        asyncio.run(_test_loader_cancel())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -6,6 +6,22 @@ import datetime
 import struct
 import unittest
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+try:
+    import pyzstd
+except ImportError:
+    pyzstd = None
+
+# zstd needs pyzstd
+COMPRESSION_ALGORITHMS = ("zlib", "zstd") if pyzstd else ("zlib", )
+
 
 def int2byte(i):
     return struct.pack("!B", i)
@@ -144,6 +160,40 @@ class TestConversion(base.PyMySQLTestCase):
         finally:
             c.execute("drop table test_big_blob")
 
+    def test_bytes_literal(self):
+        """ test every way of escaping bytes """
+        data = bytes(range(256))
+        for bytes_literal in ('0x', 'X', '_binary'):
+            conn = cymysql.connect(bytes_literal=bytes_literal, **self.databases[0])
+            c = conn.cursor()
+            c.execute("select %s, %s", (data, bytearray(b"'\\")))
+            self.assertEqual((data, b"'\\"), c.fetchone())
+            conn.close()
+
+    def test_executed(self):
+        """ test the statement sent is kept for logging """
+        c = self.connections[0].cursor()
+        c.execute("select %s, %s", (1, "a'b"))
+        self.assertEqual(b"select 1, 'a\\'b'", c._executed)
+        self.assertEqual(c._executed, c._last_executed)
+        c.execute("select 1")
+        self.assertEqual("select 1", c._executed)
+
+    def test_bytes_literal_charset(self):
+        """ test _binary literals are refused where a multibyte character can swallow an escape """
+        params = dict(self.databases[0], bytes_literal='_binary', charset='gbk')
+        self.assertRaises(cymysql.NotSupportedError, cymysql.connect, **params)
+        conn = cymysql.connect(**dict(params, charset='utf8mb4'))
+        self.assertRaises(cymysql.NotSupportedError, conn.set_charset, 'sjis')
+        conn.close()
+
+        conn = cymysql.connect(**dict(self.databases[0], charset='gbk'))
+        c = conn.cursor()
+        self.assertRaises(UnicodeEncodeError, c.execute, "select %s", ("\udcbf' or 1=1 -- ", ))
+        c.execute("select %s, %s", (b"\xbf' or 1=1 -- ", "\u7e17' or 1=1 -- "))
+        self.assertEqual((b"\xbf' or 1=1 -- ", "\u7e17' or 1=1 -- "), c.fetchone())
+        conn.close()
+
     def test_untyped(self):
         """ test conversion of null, empty string """
         conn = self.connections[0]
@@ -215,6 +265,151 @@ class TestCursor(base.PyMySQLTestCase):
         finally:
             c.execute('drop table test_aggregates')
 
+    def test_query_args(self):
+        """ test placeholders and argument types """
+        conn = self.connections[0]
+        c = conn.cursor()
+        c.execute("select %s, '100%%', %s", ('a', 1))
+        self.assertEqual(('a', '100%', 1), c.fetchone())
+        c.execute("select %(b)s, %(a)s, %(b)s", {'a': 1, 'b': 'x'})
+        self.assertEqual(('x', 1, 'x'), c.fetchone())
+        c.execute(b"select %s", 'caf\xe9')
+        self.assertEqual(('caf\xe9', ), c.fetchone())
+        self.assertRaises(TypeError, c.execute, "select %s, %s", (1, ))
+
+    def test_query_cache(self):
+        """ test that a query is parsed once """
+        from cymysql.query import _cached_parse_query
+        c = self.connections[0].cursor()
+        c.execute("select %s + 1", (1, ))
+        hits = _cached_parse_query.cache_info().hits
+        c.execute("select %s + 1", (2, ))
+        self.assertEqual(((3, ), hits + 1), (c.fetchone(), _cached_parse_query.cache_info().hits))
+
+    @unittest.skipUnless(numpy, "numpy is not installed")
+    def test_fetch_numpy(self):
+        """ test fetching columns as NumPy arrays """
+        import numpy as np
+        conn = self.connections[0]
+        query = (
+            "select 1 i, 1.5e0 f, cast('2020-01-02 03:04:05' as datetime) dt, 'a' s"
+            " union all select null, -2.5e0, null, null"
+        )
+        for cursor in (cymysql.cursors.Cursor, cymysql.cursors.SSCursor):
+            c = conn.cursor(cursor)
+            c.execute(query)
+            r = c.fetchmany_numpy(1)
+            self.assertEqual(r["i"].tolist(), [1])
+            self.assertEqual(r["i"].dtype, np.int64)
+            r = c.fetch_numpy()
+            self.assertEqual(r["i"].mask.tolist(), [True])
+            self.assertEqual(r["f"].tolist(), [-2.5])
+            self.assertEqual(r["s"].tolist(), [None])
+            c.execute(query)
+            r = c.fetch_numpy()
+            self.assertEqual(r["dt"][0], np.datetime64("2020-01-02T03:04:05", "us"))
+            self.assertEqual(r["s"].tolist(), ["a", None])
+
+    @unittest.skipUnless(pyarrow, "pyarrow is not installed")
+    def test_fetch_arrow_batches(self):
+        """ test fetching Arrow record batches """
+        import pyarrow as pa
+        conn = self.connections[0]
+        c = conn.cursor(cymysql.cursors.SSCursor)
+        c.execute(
+            "select 1 i, 'a' s, cast(1.25 as decimal(8, 2)) d"
+            " union all select 2, null, null union all select 3, 'c', 2.5"
+        )
+        batches = list(c.fetch_arrow_batches(2))
+        self.assertEqual([b.num_rows for b in batches], [2, 1])
+        self.assertEqual(batches[0].schema.field("i").type, pa.int64())
+        self.assertEqual(batches[0].schema.field("d").type, pa.decimal128(8, 2))
+        self.assertEqual(
+            pa.Table.from_batches(batches).column("s").to_pylist(), ["a", None, "c"]
+        )
+
+    @unittest.skipUnless(numpy and pyarrow, "numpy or pyarrow is not installed")
+    def test_fetch_columns_cached(self):
+        """ test fetching columns of results of the query cache """
+        from cymysql.cache import QueryCache
+        cache = QueryCache()
+        conn = cymysql.connect(query_cache=cache, **self.databases[0])
+        conn.autocommit(True)
+        c = conn.cursor()
+        query = "select 1 i, 'a' s union all select 2, null"
+        for i in range(2):
+            c.execute(query)
+            self.assertEqual(c.fetch_numpy()["i"].tolist(), [1, 2])
+        self.assertEqual(cache.hits, 1)
+        c.execute(query)
+        self.assertEqual(c.fetchmany_numpy(1)["s"].tolist(), ["a"])
+        c.execute(query)
+        batches = list(c.fetch_arrow_batches())
+        self.assertEqual(batches[0].column(1).to_pylist(), ["a", None])
+        conn.close()
+
+    def test_fetch_json(self):
+        """ test rows written as JSON """
+        import json
+        from cymysql.cursors import SSCursor
+        conn = self.connections[0]
+        for cursor in (conn.cursor(), conn.cursor(SSCursor)):
+            cursor.execute("select 1 as a, 'x\"\n' as b, null as c, 2.5 as d union all select 2, 'y', 3, 0.5")
+            self.assertEqual(json.loads(cursor.fetch_json()), [
+                {'a': 1, 'b': 'x"\n', 'c': None, 'd': 2.5}, {'a': 2, 'b': 'y', 'c': 3, 'd': 0.5},
+            ])
+            cursor.execute("select 1 union all select 2 union all select 3")
+            self.assertEqual(json.loads(b''.join(cursor.stream_json(2, objects=False))), [[1], [2], [3]])
+
+    def test_compact_results(self):
+        """ test buffered results kept as row packets """
+        from cymysql.compact import CompactRows
+        conn = cymysql.connect(compact_results=True, **self.databases[0])
+        c = conn.cursor()
+        c.execute("select 1, 'a', null union all select 2, 'b', 2.5 union all select 3, 'c', null")
+        self.assertIsInstance(c._result.rest_rows, CompactRows)
+        self.assertEqual(c.fetchone(), (1, 'a', None))
+        self.assertEqual(c.fetchall(), [(2, 'b', 2.5), (3, 'c', None)])
+        conn.close()
+
+    def test_lazy_row_cursor(self):
+        """ test rows decoding columns when read """
+        from cymysql.cursors import LazyRowCursor
+        from cymysql.rows import LazyRow
+        conn = self.connections[0]
+        c = conn.cursor(LazyRowCursor)
+        c.execute("select 1 as a, 'x' as b, null as c union all select 2, 'y', 2.5")
+        r = c.fetchone()
+        self.assertIsInstance(r, LazyRow)
+        self.assertEqual((r[0], r['b'], r.c, len(r)), (1, 'x', None, 3))
+        self.assertEqual(r, (1, 'x', None))
+        self.assertEqual(c.fetchall(), [(2, 'y', 2.5)])
+
+    def test_typed_cursor(self):
+        """ test rows built by a row_factory """
+        import collections
+        from cymysql.cursors import TypedCursor
+        Point = collections.namedtuple('Point', ['y', 'x'])
+        conn = self.connections[0]
+        c = conn.cursor(TypedCursor)
+        c.execute("select 1 as x, 2 as y, 3 as z", row_factory=Point, converters={'x': str})
+        self.assertEqual(c.fetchall(), [Point(x='1', y=2)])
+        with self.assertRaises(cymysql.ProgrammingError):
+            c.execute("select 1 as x", row_factory=Point)
+
+    def test_ss_typed_cursor_missing_column(self):
+        """ test an unbuffered result without a column of its row_factory is read """
+        import collections
+        from cymysql.cursors import SSTypedCursor
+        Point = collections.namedtuple('Point', ['y', 'x'])
+        conn = self.connections[0]
+        c = conn.cursor(SSTypedCursor)
+        with self.assertRaises(cymysql.ProgrammingError):
+            c.execute("select 1 as x union all select 2", row_factory=Point)
+        c = conn.cursor()
+        c.execute("select 3")
+        self.assertEqual([(3, )], list(c.fetchall()))
+
     def test_single_tuple(self):
         """ test a single tuple """
         conn = self.connections[0]
@@ -274,7 +469,67 @@ class TestCharset(base.PyMySQLTestCase):
         conn.close()
 
 
-__all__ = ["TestConversion", "TestCursor", "TestCharset"]
+class TestSessionTrack(base.PyMySQLTestCase):
+    def test_session_track(self):
+        conn = self.connections[0]
+        self.assertTrue(conn.session_track)
+        c = conn.cursor()
+        c.execute("SET time_zone='+09:00'")
+        self.assertEqual(conn.session_variables.get('time_zone'), '+09:00')
+        c.execute("USE %s" % (self.databases[1]['db'], ))
+        self.assertEqual(conn.db, self.databases[1]['db'])
+
+    def test_select_db(self):
+        conn = self.connections[0]
+        c = conn.cursor()
+        conn.select_db(self.databases[1]['db'])
+        c.execute("SELECT DATABASE()")
+        self.assertEqual(c.fetchone(), (self.databases[1]['db'], ))
+        self.assertTrue(conn._is_redundant("SET NAMES %s" % (conn.charset, )))
+        self.assertTrue(conn._is_redundant("USE %s" % (self.databases[1]['db'], )))
+        self.assertFalse(conn._is_redundant("USE %s" % (self.databases[0]['db'], )))
+        self.assertTrue(conn._is_redundant("SET AUTOCOMMIT = 0"))
+
+    def test_reconnect(self):
+        conn = cymysql.connect(**self.databases[0])
+        reconnected = []
+        conn.reconnect_listeners.append(reconnected.append)
+        c = conn.cursor()
+        c.execute("SET time_zone='+09:00'")
+        c.execute("SELECT CONNECTION_ID()")
+        (thread_id, ) = c.fetchone()
+        self.connections[1].kill(thread_id)
+        self.assertTrue(conn.ping())
+        self.assertEqual(conn.reconnects, 1)
+        self.assertEqual(reconnected, [conn])
+        c.execute("SELECT @@time_zone")
+        self.assertEqual(c.fetchone(), ('+09:00', ))
+        conn.close()
+
+
+class TestCompression(base.PyMySQLTestCase):
+    def test_compression(self):
+        for algorithm in COMPRESSION_ALGORITHMS:
+            conn = cymysql.connect(compression_algorithm=algorithm, **self.databases[0])
+            c = conn.cursor()
+            c.execute("SELECT REPEAT('a', 100000), 1 UNION ALL SELECT REPEAT('b', 10), 2")
+            self.assertEqual(c.fetchall(), [('a' * 100000, 1), ('b' * 10, 2)])
+            c.execute("SELECT %s", ('c' * 100000, ))
+            self.assertEqual(c.fetchone(), ('c' * 100000, ))
+            conn.close()
+
+    def test_large_packet(self):
+        # needs max_allowed_packet >= 64M (the default of MySQL 8.0)
+        data = 'x' * (0xffffff + 10)
+        for algorithm in ("", ) + COMPRESSION_ALGORITHMS:
+            conn = cymysql.connect(compression_algorithm=algorithm, **self.databases[0])
+            c = conn.cursor()
+            c.execute("SELECT LENGTH(%s), %s", (data, data))
+            self.assertEqual(c.fetchone(), (len(data), data))
+            conn.close()
+
+
+__all__ = ["TestConversion", "TestCursor", "TestCharset", "TestSessionTrack", "TestCompression"]
 
 if __name__ == "__main__":
     import unittest
@@ -0,0 +1,161 @@
+import datetime
+import decimal
+import os
+import shutil
+import tempfile
+
+import cymysql
+from cymysql.cache import QueryCache, MappedQueryCache, WRITE_TABLES_REGEX, tables
+from cymysql.prepared import PreparedCursor
+from cymysql.streaming import StreamingCursor
+from cymysql.tests import base
+
+
+class TestQueryCache(base.PyMySQLTestCase):
+    def setUp(self):
+        super(TestQueryCache, self).setUp()
+        self.cache = QueryCache(ttl=60)
+        self.conn = cymysql.connect(query_cache=self.cache, **self.databases[0])
+        c = self.conn.cursor()
+        c.execute("create table test_cache (region varchar(8), total integer)")
+        c.execute("insert into test_cache values ('eu', 1), ('us', 2)")
+        self.conn.commit()
+        # statements run inside a transaction are not cached
+        self.conn.autocommit(True)
+
+    def tearDown(self):
+        c = self.conn.cursor()
+        c.execute("drop table test_cache")
+        self.conn.close()
+        super(TestQueryCache, self).tearDown()
+
+    def test_cache(self):
+        c = self.conn.cursor()
+        query = "select region, sum(total) from test_cache group by region order by region"
+        c.execute(query)
+        rows = c.fetchall()
+        c.execute(query)
+        self.assertEqual(rows, c.fetchall())
+        self.assertEqual(self.cache.hits, 1)
+
+        # a write through the connection invalidates the table
+        c.execute("insert into test_cache values ('eu', 3)")
+        self.assertEqual(len(self.cache), 0)
+        c.execute(query)
+        self.assertEqual(c.fetchall(), [('eu', 4), ('us', 2)])
+        self.conn.commit()
+
+        # writes by other connections need an explicit invalidation
+        other = self.connections[0].cursor()
+        other.execute("delete from test_cache where region = 'us'")
+        self.connections[0].commit()
+        self.cache.invalidate('test_cache')
+        c.execute(query)
+        self.assertEqual(c.fetchall(), [('eu', 4)])
+
+    def test_cache_commit(self):
+        query = "select region, sum(total) from test_cache group by region order by region"
+        other = cymysql.connect(query_cache=self.cache, **self.databases[0])
+        other.autocommit(True)
+        c = self.conn.cursor()
+        c.execute("begin")
+        c.execute("insert into test_cache values ('us', 5)")
+        # another connection caches the rows committed before the insert
+        o = other.cursor()
+        o.execute(query)
+        self.assertEqual(o.fetchall(), [('eu', 1), ('us', 2)])
+        self.assertEqual(len(self.cache), 1)
+        self.conn.commit()
+        o.execute(query)
+        self.assertEqual(o.fetchall(), [('eu', 1), ('us', 7)])
+        other.close()
+
+    def test_cache_prepared(self):
+        query = "select total from test_cache where region = 'eu'"
+        c = self.conn.cursor()
+        c.execute(query)
+        self.assertEqual(c.fetchall(), [(1, )])
+        # writes of prepared and streaming cursors invalidate the table too
+        p = self.conn.cursor(PreparedCursor)
+        p.execute("update test_cache set total = %s where region = 'eu'", (5, ))
+        c.execute(query)
+        self.assertEqual(c.fetchall(), [(5, )])
+        s = self.conn.cursor(StreamingCursor)
+        s.execute("update test_cache set total = 6 where region = 'eu'")
+        c.execute(query)
+        self.assertEqual(c.fetchall(), [(6, )])
+
+    def test_key(self):
+        conn = cymysql.connect(query_cache=self.cache, conv=dict(self.conn.conv), **self.databases[0])
+        key = self.cache.key(self.conn, "select 1 from test_cache")
+        self.assertIsNotNone(key)
+        self.assertNotEqual(key, self.cache.key(conn, "select 1 from test_cache"))
+        conn.close()
+        self.assertEqual(tables("LOAD DATA INFILE 'f' INTO TABLE test_cache", WRITE_TABLES_REGEX), {'test_cache'})
+
+
+class TestMappedQueryCache(base.PyMySQLTestCase):
+    def setUp(self):
+        super(TestMappedQueryCache, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        c = self.connections[0].cursor()
+        c.execute("create table test_mapped_cache (id integer, name varchar(16), amount decimal(8,2), created datetime)")
+        c.execute(
+            "insert into test_mapped_cache values (1, 'a', 1.50, '2020-01-02 03:04:05'), (2, NULL, -2.25, NULL)"
+        )
+        self.connections[0].commit()
+
+    def tearDown(self):
+        c = self.connections[0].cursor()
+        c.execute("drop table test_mapped_cache")
+        shutil.rmtree(self.directory)
+        super(TestMappedQueryCache, self).tearDown()
+
+    def test_mapped_cache(self):
+        query = "select * from test_mapped_cache order by id"
+        expected = [
+            (1, 'a', decimal.Decimal('1.50'), datetime.datetime(2020, 1, 2, 3, 4, 5)),
+            (2, None, decimal.Decimal('-2.25'), None),
+        ]
+        conn = cymysql.connect(query_cache=MappedQueryCache(self.directory), **self.databases[0])
+        conn.autocommit(True)
+        c = conn.cursor()
+        c.execute(query)
+        self.assertEqual(c.fetchall(), expected)
+        conn.close()
+
+        # another cache on the same directory, as in another process
+        cache = MappedQueryCache(self.directory)
+        conn = cymysql.connect(query_cache=cache, **self.databases[0])
+        conn.autocommit(True)
+        c = conn.cursor()
+        c.execute(query)
+        self.assertEqual(c.fetchall(), expected)
+        self.assertEqual(cache.hits, 1)
+
+        c.execute("delete from test_mapped_cache where id = 2")
+        conn.commit()
+        self.assertEqual(len(cache), 0)
+        conn.close()
+
+    def test_mapped_cache_bounds(self):
+        cache = MappedQueryCache(self.directory, max_bytes=4096, max_maps=4)
+        conn = cymysql.connect(query_cache=cache, **self.databases[0])
+        conn.autocommit(True)
+        c = conn.cursor()
+        for i in range(50):
+            for _ in range(2):
+                c.execute("select id, name, %s from test_mapped_cache order by id", (i,))
+                self.assertEqual(len(c.fetchall()), 2)
+        self.assertTrue(len(cache._maps) <= 4)
+        sizes = [os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory)]
+        self.assertTrue(sum(sizes) <= 4096)
+        self.assertEqual(cache._total, sum(sizes))
+        conn.close()
+
+
+__all__ = ["TestQueryCache", "TestMappedQueryCache"]
+
+if __name__ == "__main__":
+    import unittest
+    unittest.main()
@@ -0,0 +1,81 @@
+import csv
+import gzip
+import io
+import os
+import pickle
+import tempfile
+
+from cymysql.cursors import SSCursor
+from cymysql.export import export_csv, export_tsv, parallel_export
+from cymysql.tests import base
+
+
+class TestExport(base.PyMySQLTestCase):
+    def setUp(self):
+        super(TestExport, self).setUp()
+        c = self.connections[0].cursor()
+        c.execute("create table test_export (id integer, name varchar(20), price decimal(6, 2))")
+        c.execute(
+            "insert into test_export values (1, %s, 1.50), (2, %s, NULL), (3, '', 0)",
+            ('plain', 'a, "b"\n')
+        )
+
+    def tearDown(self):
+        c = self.connections[0].cursor()
+        c.execute("drop table test_export")
+        super(TestExport, self).tearDown()
+
+    def test_export_csv(self):
+        c = self.connections[0].cursor(SSCursor)
+        c.execute("select id, name, price from test_export order by id")
+        out = io.BytesIO()
+        self.assertEqual(export_csv(c, out, batch_size=2), 3)
+        self.assertEqual(list(csv.reader(io.StringIO(out.getvalue().decode('utf8')))), [
+            ['id', 'name', 'price'], ['1', 'plain', '1.50'], ['2', 'a, "b"\n', ''], ['3', '', '0.00'],
+        ])
+
+    def test_export_tsv_gzip(self):
+        c = self.connections[0].cursor(SSCursor)
+        c.execute("select id, name, price from test_export order by id")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test_export.tsv.gz')
+            export_tsv(c, path, header=False)
+            with gzip.open(path) as f:
+                self.assertEqual(f.read(), b'1\tplain\t1.50\n2\ta, "b"\\n\t\\N\n3\t\t0.00\n')
+
+    def test_parallel_export(self):
+        conn = self.connections[0]
+        conn.cursor().execute("insert into test_export values (NULL, 'null key', 2)")
+        conn.commit()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test_export-{shard}.tsv')
+            counts = parallel_export(
+                'test_export', 'id', path, workers=2, format='tsv', columns=['id', 'name'],
+                **self.databases[0]
+            )
+            self.assertEqual(counts, [2, 2])
+            shards = []
+            for i in range(len(counts)):
+                with open(path.format(shard=i), 'rb') as f:
+                    shards.append(f.read())
+        self.assertEqual(shards, [
+            b'id\tname\n1\tplain\n\\N\tnull key\n',
+            b'id\tname\n2\ta, "b"\\n\n3\t\n',
+        ])
+
+    def test_parallel_export_failure(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test_export-{shard}.csv')
+            # the workers can not be started, the arguments do not pickle
+            with self.assertRaises((pickle.PicklingError, AttributeError)):
+                parallel_export(
+                    'test_export', 'id', path, workers=2, processes=True,
+                    on_reconnect=lambda conn: None, **self.databases[0]
+                )
+
+
+__all__ = ["TestExport"]
+
+if __name__ == "__main__":
+    import unittest
+    unittest.main()
@@ -0,0 +1,81 @@
+import datetime
+import io
+
+from cymysql.err import ProgrammingError
+from cymysql.prepared import PreparedCursor
+from cymysql.tests import base
+
+
+class TestPrepared(base.PyMySQLTestCase):
+    def setUp(self):
+        super(TestPrepared, self).setUp()
+        c = self.connections[0].cursor()
+        c.execute("create table test_prepared (id integer, data longblob, dt datetime)")
+
+    def tearDown(self):
+        c = self.connections[0].cursor()
+        c.execute("drop table test_prepared")
+        super(TestPrepared, self).tearDown()
+
+    def test_prepare(self):
+        conn = self.connections[0]
+        dt = datetime.datetime(2024, 5, 6, 7, 8, 9)
+        stmt = conn.prepare("insert into test_prepared values (?, ?, ?)")
+        self.assertEqual(stmt.param_count, 3)
+        self.assertEqual(stmt.execute((1, b'abc', dt)).affected_rows, 1)
+        self.assertEqual(stmt.execute((2, None, None)).affected_rows, 1)
+        stmt.close()
+
+        stmt = conn.prepare("select id, data, dt from test_prepared order by id")
+        self.assertEqual(stmt.execute().rest_rows, [(1, b'abc', dt), (2, None, None)])
+        stmt.close()
+
+    def test_long_data(self):
+        conn = self.connections[0]
+        stmt = conn.prepare("insert into test_prepared (id, data) values (?, ?)")
+        stmt.long_data_threshold = stmt.long_data_chunk_size = 1000
+        stmt.execute((1, io.BytesIO(b'a' * 300000)))
+        stmt.execute((2, iter([b'b' * 10, b'c' * 10])))
+        stmt.execute((3, b'd' * 5000))
+        stmt.execute((4, io.BytesIO()))
+        stmt.close()
+
+        c = conn.cursor()
+        c.execute("select id, data from test_prepared order by id")
+        self.assertEqual(c.fetchall(), [
+            (1, b'a' * 300000), (2, b'b' * 10 + b'c' * 10), (3, b'd' * 5000), (4, b''),
+        ])
+
+    def test_prepared_cursor(self):
+        c = self.connections[0].cursor(PreparedCursor)
+        c.executemany(
+            "insert into test_prepared (id, data) values (%s, %s)",
+            [(1, b'x'), (2, io.BytesIO(b'y' * 10))]
+        )
+        self.assertEqual(c.rowcount, 2)
+        c.execute("select id, data from test_prepared where id > %s order by id", (0, ))
+        self.assertEqual(c.fetchall(), [(1, b'x'), (2, b'y' * 10)])
+        c.close()
+
+    def test_prepared_cursor_placeholders(self):
+        c = self.connections[0].cursor(PreparedCursor)
+        c.execute("select 'a%%s' like %s, %s", ('a%s', 'b'))
+        self.assertEqual(c.fetchall(), [(1, 'b')])
+        self.assertRaises(ProgrammingError, c.execute, "select %s", {'a': 1})
+        c.close()
+
+    def test_prepared_cursor_statements(self):
+        c = self.connections[0].cursor(PreparedCursor)
+        c.max_statements = 2
+        for i in range(5):
+            c.execute("select %d, %%s" % i, (i, ))
+            self.assertEqual(c.fetchall(), [(i, i)])
+        self.assertEqual(len(c._statements), 2)
+        c.close()
+
+
+__all__ = ["TestPrepared"]
+
+if __name__ == "__main__":
+    import unittest
+    unittest.main()
@@ -0,0 +1,105 @@
+import asyncio
+import cymysql
+from cymysql.err import OperationalError
+from cymysql.routing import Router, is_connection_error, is_read_only
+from cymysql.aio.routing import AsyncRouter
+from cymysql.tests import base
+
+
+class TestRouting(base.PyMySQLTestCase):
+    def test_is_read_only(self):
+        self.assertTrue(is_read_only("SELECT 1"))
+        self.assertTrue(is_read_only(" /* hint */ select 1"))
+        self.assertFalse(is_read_only("SELECT * FROM t FOR UPDATE"))
+        self.assertFalse(is_read_only("SELECT 1 INTO @a"))
+        self.assertFalse(is_read_only("SELECT 1; DELETE FROM t"))
+        self.assertFalse(is_read_only("INSERT INTO t VALUES (1)"))
+
+    def test_is_read_only_session(self):
+        for query in (
+            "SELECT LAST_INSERT_ID()", "select row_count()", "SELECT FOUND_ROWS()",
+            "SELECT SQL_CALC_FOUND_ROWS * FROM t LIMIT 1", "SELECT CONNECTION_ID()",
+            "SELECT @a", "SELECT @a:=1", "SELECT @@session.sql_mode",
+            "SHOW WARNINGS", "show errors", "SHOW COUNT(*) WARNINGS",
+            "SHOW SESSION STATUS", "SHOW STATUS LIKE 'Handler%'", "/* x */ SHOW VARIABLES",
+            "SHOW LOCAL VARIABLES",
+        ):
+            self.assertFalse(is_read_only(query), query)
+        for query in (
+            "SELECT * FROM users WHERE email = 'a@example.com'", "SELECT `a@b` FROM t",
+            "SELECT 'found_rows()'", "SHOW GLOBAL STATUS", "SHOW TABLES",
+        ):
+            self.assertTrue(is_read_only(query), query)
+
+    def test_router(self):
+        params = self.databases[0]
+        router = Router(params, [params])
+        cur = router.cursor()
+        try:
+            cur.execute("create table test_router (i integer)")
+            router.commit()
+            cur.execute("select count(*) from test_router")
+            self.assertIs(cur.connection, router.get_connection(0))
+            self.assertEqual(cur.fetchone(), (0, ))
+
+            cur.execute("insert into test_router values (1)")
+            self.assertTrue(router.in_transaction())
+            cur.execute("select count(*) from test_router")
+            self.assertIs(cur.connection, router.primary)
+            self.assertEqual(cur.fetchone(), (1, ))
+            router.commit()
+
+            cur.execute("select count(*) from test_router")
+            self.assertIs(cur.connection, router.get_connection(0))
+            self.assertEqual(cur.fetchone(), (1, ))
+            self.assertIsNotNone(router.policy.latency(0))
+        finally:
+            cur.execute("drop table test_router")
+            router.close()
+
+    def test_replica_error(self):
+        self.assertTrue(is_connection_error(OperationalError(2013, "Lost connection")))
+        self.assertTrue(is_connection_error(ConnectionResetError()))
+        self.assertFalse(is_connection_error(OperationalError(1213, "Deadlock found")))
+        params = self.databases[0]
+        router = Router(params, [params])
+        cur = router.cursor()
+        try:
+            cur.execute("select 1")
+            replica = router.get_connection(0)
+            # an error of the statement is not retried on the primary
+            with self.assertRaises(OperationalError):
+                cur.execute("select json_extract('{', '$')")
+            self.assertIs(cur.connection, replica)
+            self.assertIs(router.get_connection(0), replica)
+            self.assertNotIn('primary', router._connections)
+        finally:
+            router.close()
+
+    def test_async_router(self):
+        async def _test_router():
+            params = self.databases[0]
+            primary = await cymysql.aio.create_pool(**params)
+            replica = await cymysql.aio.create_pool(**params)
+            router = AsyncRouter(primary, [replica])
+            async with router.acquire() as conn:
+                cur = conn.cursor()
+                await cur.execute("select 42")
+                self.assertEqual(await cur.fetchone(), (42, ))
+                self.assertFalse(conn.in_transaction())
+                # the rows of an unbuffered cursor are read from the primary
+                cur = conn.cursor(cymysql.aio.AsyncSSCursor)
+                await cur.execute("select 43")
+                self.assertIs(cur.connection, conn._primary)
+                self.assertEqual(await cur.fetchone(), (43, ))
+            router.close()
+            await router.wait_closed()
+
+        asyncio.run(_test_router())
+
+
+__all__ = ["TestRouting"]
+
+if __name__ == "__main__":
+    import unittest
+    unittest.main()
@@ -0,0 +1,55 @@
+from cymysql.cursors import SSCursor
+from cymysql.streaming import StreamingCursor, mmap_sink
+from cymysql.tests import base
+
+
+class TestStreaming(base.PyMySQLTestCase):
+    def setUp(self):
+        super(TestStreaming, self).setUp()
+        c = self.connections[0].cursor()
+        c.execute("create table test_streaming (id integer, data longblob)")
+        c.execute(
+            "insert into test_streaming values (1, %s), (2, %s), (3, NULL)",
+            (b'a' * 10, b'b' * 300000)
+        )
+
+    def tearDown(self):
+        c = self.connections[0].cursor()
+        c.execute("drop table test_streaming")
+        super(TestStreaming, self).tearDown()
+
+    def test_sscursor(self):
+        c = self.connections[0].cursor(SSCursor)
+        c.execute("select id from test_streaming order by id")
+        self.assertEqual(c.fetchone(), (1, ))
+        self.assertEqual(c.fetchall(), [(2, ), (3, )])
+
+    def test_streaming_cursor(self):
+        c = self.connections[0].cursor(StreamingCursor)
+        c.blob_threshold = 1000
+        c.execute("select id, data from test_streaming order by id")
+        rows = c.fetchall()
+        self.assertEqual(rows[0], (1, b'a' * 10))
+        self.assertEqual(rows[1][1].read(), b'b' * 300000)
+        self.assertEqual(rows[2], (3, None))
+
+        chunks = []
+        c.blob_sink = lambda field, length: chunks.append
+        c.execute("select data from test_streaming where id = 2")
+        c.fetchall()
+        self.assertEqual(b''.join(chunks), b'b' * 300000)
+
+        c.blob_sink = mmap_sink
+        c.execute("select data from test_streaming where id = 2")
+        (data, ) = c.fetchone()
+        self.assertEqual(data[:], b'b' * 300000)
+        # unread rows are skipped by the next statement
+        c.execute("select 1")
+        self.assertEqual(c.fetchall(), [(1, )])
+
+
+__all__ = ["TestStreaming"]
+
+if __name__ == "__main__":
+    import unittest
+    unittest.main()